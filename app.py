@@ -2,5 +2,5 @@
 from game_server import create_app
 
 if __name__ == '__main__':
-    app = create_app()
+    app = create_app(ratings_file='ratings.json', archive_dir='archive', snapshot_dir='snapshots')
     app.run()
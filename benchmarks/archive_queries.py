@@ -0,0 +1,64 @@
+"""
+Report the time of aggregate queries over a synthetic game archive.
+
+Run from the root of the project, with the number of games and of distinct players:
+    python -m benchmarks.archive_queries 10000000 1000000
+"""
+import os
+import sys
+import tempfile
+from time import perf_counter
+
+import numpy as np
+
+from game_server.archive import CHUNK_SIZE, ArchiveReader
+
+
+def write_synthetic_archive(directory, game_count, player_count=1000):
+    """
+    Write random games, only the columns the queries read
+
+    :param directory: Archive directory
+    :param game_count: Games to write
+    :param player_count: Distinct player accounts
+    """
+
+    random = np.random.default_rng(0)
+    accounts = np.sort(np.frombuffer(random.bytes(16 * player_count), dtype='S16'))
+    for chunk_number, start in enumerate(range(0, game_count, CHUNK_SIZE), 1):
+        size = min(CHUNK_SIZE, game_count - start)
+        chunk_directory = os.path.join(directory, f'chunk-{chunk_number:08d}')
+        os.makedirs(chunk_directory)
+        # Like write_chunk, a chunk's dictionary only holds the account ids of its own players, sorted
+        used, codes = np.unique(random.integers(0, player_count, 2 * size), return_inverse=True)
+        columns = {
+            'first_column': random.integers(0, 9, size, dtype='i2'),
+            'winner': random.integers(1, 3, size, dtype='i1'),
+            'turns': random.integers(9, 54, size, dtype='u2'),
+            'player_1': codes[:size].astype('i4'),
+            'player_2': codes[size:].astype('i4'),
+            'player_accounts': accounts[used],
+        }
+        for name, column in columns.items():
+            np.save(os.path.join(chunk_directory, f'{name}.npy'), column)
+
+
+def measure(reader, query):
+    """
+    :return: Seconds taken by query
+    :rtype: float
+    """
+
+    start = perf_counter()
+    getattr(reader, query)()
+    return perf_counter() - start
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000000
+    player_count = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    with tempfile.TemporaryDirectory() as archive_dir:
+        write_synthetic_archive(archive_dir, count, player_count)
+        reader = ArchiveReader(archive_dir)
+        for query in ('count', 'win_rate_by_first_column', 'average_game_length_by_player'):
+            print(f'{query}: {measure(reader, query):.2f}s for {count} games of {player_count} players')
@@ -0,0 +1,38 @@
+"""
+Report the speed of exploring the game tree on one board with drop_disc and undo, no board is allocated per node.
+
+Run from the root of the project:
+    python -m benchmarks.board_search 5
+"""
+import sys
+from time import perf_counter
+
+from game_server.game_session import Board, GameSession
+
+
+def count_positions(board, depth):
+    """
+    Count the positions reachable in depth moves, stopping at wins
+
+    :param board: Board explored in place, unchanged on return
+    :rtype: int
+    """
+
+    if depth == 0 or board.check_for_winner():
+        return 1
+    disc = GameSession.DISCS[board.turns % 2]
+    positions = 0
+    for col in board.legal_moves():
+        board.drop_disc(col, disc)
+        positions += count_positions(board, depth - 1)
+        board.undo()
+    return positions
+
+
+if __name__ == '__main__':
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    board = Board(GameSession.DISCS)
+    start = perf_counter()
+    positions = count_positions(board, depth)
+    elapsed = perf_counter() - start
+    print(f'{positions} positions at depth {depth}: {elapsed:.2f}s, {positions / elapsed:.0f} positions/s')
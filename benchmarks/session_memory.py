@@ -0,0 +1,40 @@
+"""
+Report the memory used per game session.
+
+Run from the root of the project:
+    python -m benchmarks.session_memory 100000
+"""
+import sys
+import tracemalloc
+
+from game_server.game_session import GameSession
+
+
+def measure(session_count, players_per_session):
+    """
+    Measure bytes allocated per session
+
+    :param session_count: Sessions to create
+    :param players_per_session: Players to add to each session (0, 1 or 2)
+    :return: Bytes per session
+    :rtype: float
+    """
+
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+
+    sessions = [GameSession() for _ in range(session_count)]
+    for session in sessions:
+        for player_name in ('Kieran', 'John')[:players_per_session]:
+            session.add_player(player_name)
+
+    end, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return (end - start) / len(sessions)
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    for players in range(3):
+        print(f'{players} players: {measure(count, players):.0f} bytes per session')
@@ -0,0 +1,96 @@
+"""
+Report the time to snapshot and restore game sessions, both on their own and through create_app, which also restarts
+the turn deadlines and matchmaking of the restored games and writes a final snapshot on exit. Snapshots written from
+a thread also report the longest a move waited for session_lock meanwhile.
+
+Run from the root of the project:
+    python -m benchmarks.snapshots 1000000
+"""
+import atexit
+import random
+import sys
+import tempfile
+from threading import Event, Thread
+from time import perf_counter
+
+from game_server import create_app
+from game_server.game_session import GameSession, session_lock
+from game_server.snapshots import Snapshotter, load_latest_snapshot
+
+
+def games_in_progress(count, max_turns=30):
+    """
+    :return: Sessions with two players and random moves
+    :rtype: list
+    """
+
+    rng = random.Random(0)
+    game_sessions = []
+    for number in range(count):
+        game_session = GameSession()
+        game_session.add_player(f'player-{number}')
+        game_session.add_player(f'player-{number + 1}')
+        board = game_session.board
+        for turn in range(rng.randrange(max_turns)):
+            board.drop_disc(rng.choice([col for col in range(board.columns) if board.heights[col] < board.rows]),
+                            GameSession.DISCS[turn % 2])
+        game_sessions.append(game_session)
+    return game_sessions
+
+
+def longest_lock_wait(run):
+    """
+    Call run while another thread takes session_lock over and over like moves do
+
+    :return: Longest wait for session_lock in seconds
+    :rtype: float
+    """
+
+    done, waits = Event(), [0.0]
+
+    def move():
+        while not done.is_set():
+            start = perf_counter()
+            with session_lock:
+                waits[0] = max(waits[0], perf_counter() - start)
+            done.wait(0.001)
+
+    mover = Thread(target=move)
+    mover.start()
+    try:
+        run()
+    finally:
+        done.set()
+        mover.join()
+    return waits[0]
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    game_sessions = games_in_progress(count)
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        snapshotter = Snapshotter(snapshot_dir, game_sessions)
+        start = perf_counter()
+        thread = snapshotter.snapshot()
+        print(f'snapshot started: {(perf_counter() - start) * 1000:.1f}ms for {count} sessions')
+        thread.join()
+        print(f'snapshot written: {perf_counter() - start:.2f}s')
+
+        start = perf_counter()
+        wait = longest_lock_wait(lambda: Snapshotter(snapshot_dir, game_sessions, use_fork=False).snapshot().join())
+        print(f'thread snapshot written: {perf_counter() - start:.2f}s, longest move wait {wait * 1000:.1f}ms')
+
+        start = perf_counter()
+        restored = load_latest_snapshot(snapshot_dir)
+        print(f'restore: {perf_counter() - start:.2f}s for {len(restored)} sessions')
+        del restored
+
+        start = perf_counter()
+        app = create_app(snapshot_dir=snapshot_dir, snapshot_interval=3600)
+        print(f'create_app restore: {perf_counter() - start:.2f}s')
+
+        app_snapshotter = app.extensions['snapshotter']
+        atexit.unregister(app_snapshotter.stop)
+        start = perf_counter()
+        wait = longest_lock_wait(app_snapshotter.stop)
+        print(f'final snapshot on exit: {perf_counter() - start:.2f}s, longest move wait {wait * 1000:.1f}ms')
@@ -0,0 +1,37 @@
+"""
+Report the environment steps per second of VectorEnv with random legal moves.
+
+Run from the root of the project:
+    python -m benchmarks.vector_env 16384
+"""
+import sys
+from time import perf_counter
+
+import numpy as np
+
+from game_server.vector_env import VectorEnv
+
+
+def measure(num_envs, steps=200):
+    """
+    :param num_envs: Games stepped together
+    :param steps: Steps to take
+    :return: Game steps per second
+    :rtype: float
+    """
+
+    env = VectorEnv(num_envs)
+    random = np.random.default_rng(0)
+    elapsed = 0
+    for _ in range(steps):
+        moves = np.argmax(random.random((num_envs, env.columns)) * env.legal_moves(), axis=1)
+        start = perf_counter()
+        env.step(moves)
+        elapsed += perf_counter() - start
+
+    return num_envs * steps / elapsed
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 16384
+    print(f'{measure(count):.0f} steps per second with {count} games')
@@ -1,37 +1,154 @@
+import json
 import os
+import random
 import requests
-from retrying import retry
 import time
+from functools import wraps
+from common import wire
 
 HOST = 'http://127.0.0.1:5000'
+# Player tokens issued by the server per player name, so players keep their rating between games
+TOKENS_FILE = os.path.expanduser('~/.connect5_tokens.json')
 API_PREFIX = '{host}/api/v1/'.format(host=HOST)
+MAX_ATTEMPTS = 12
+BASE_RETRY_DELAY = 1
+MAX_RETRY_DELAY = 30
+DEFAULT_POLL_INTERVAL = 5
+# Fraction of the server hint added at random so clients do not poll in lockstep
+HINT_JITTER = 0.25
 
 
-def make_request_to_server(endpoint, method='GET', body=None):
+def make_request_to_server(endpoint, method='GET', body=None, binary=False, player_id=None, player_token=None):
     """
     Send request to Connect_5 server. Note if request fails for conneciton error, error will be raised.
     :param endpoint: Target endpoint
     :param method: Request method
     :param body: Request body
+    :param binary: Use the binary encoding instead of JSON. body must already be encoded.
+    :param player_id: Player id the server rate limits by, the IP address is used if not provided
+    :param player_token: Token identifying a returning player when connecting
     :return: Response
     :rtype: requests.Response
     """
 
     url = os.path.join(API_PREFIX, endpoint)
-    return requests.get(url) if method == 'GET' else requests.post(url, json=body)
+    headers = {'X-Player-Id': player_id} if player_id else {}
+    if player_token:
+        headers['X-Player-Token'] = player_token
+    if binary:
+        headers.update({'Accept': wire.MIMETYPE, 'Content-Type': wire.MIMETYPE})
+        return requests.get(url, headers=headers) if method == 'GET' else requests.post(url, data=body, headers=headers)
+    return requests.get(url, headers=headers) if method == 'GET' else requests.post(url, json=body, headers=headers)
+
+
+def load_player_token(player_name, path=None):
+    """
+    :param path: Tokens file, TOKENS_FILE by default
+    :return: Player token saved for player_name or None
+    :rtype: str or None
+    """
+
+    try:
+        with open(path or TOKENS_FILE) as tokens_file:
+            return json.load(tokens_file).get(player_name)
+    except (OSError, ValueError):
+        return None
+
+
+def save_player_token(player_name, player_token, path=None):
+    """Save the player token of player_name, see load_player_token"""
+    path = path or TOKENS_FILE
+    try:
+        with open(path) as tokens_file:
+            tokens = json.load(tokens_file)
+    except (OSError, ValueError):
+        tokens = {}
+    tokens[player_name] = player_token
+    with open(path, 'w') as tokens_file:
+        json.dump(tokens, tokens_file)
+
+
+def read_poll_hint(res):
+    """
+    Read the server's polling hint from a response
+    :param res: Server response
+    :type res: requests.Response
+    :return: Seconds to wait before polling again or None if the server sent no hint
+    :rtype: float or None
+    """
+
+    try:
+        return float(res.headers.get('X-Poll-Interval') or res.headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+def poll_delay(hint=None):
+    """
+    Delay before the next poll: the server hint (or the default interval) plus jitter
+    :rtype: float
+    """
+
+    return (hint or DEFAULT_POLL_INTERVAL) * (1 + random.uniform(0, HINT_JITTER))
+
+
+def backoff_delay(attempt, hint=None):
+    """
+    Delay before retrying a failed request. Server hints are honoured, otherwise exponential backoff with full jitter
+    so clients that failed together do not retry together.
+
+    :param attempt: Number of the failed attempt, starting at 0
+    :param hint: Server polling hint in seconds
+    :rtype: float
+    """
+
+    if hint:
+        return poll_delay(hint)
+    return random.uniform(0, min(MAX_RETRY_DELAY, BASE_RETRY_DELAY * 2 ** attempt))
+
+
+def retry_with_backoff(method):
+    """
+    Retry a Player method raising an exception up to MAX_ATTEMPTS times, re-raising the last exception.
+    """
+
+    @wraps(method)
+    def wrapper(player, *args, **kwargs):
+        for attempt in range(MAX_ATTEMPTS):
+            player.poll_interval = None
+            try:
+                return method(player, *args, **kwargs)
+            except Exception:
+                if attempt == MAX_ATTEMPTS - 1:
+                    raise
+                time.sleep(backoff_delay(attempt, player.poll_interval))
+
+    return wrapper
+
+
+DEFAULT_COLUMNS = 9
+GAME_OVER_STATES = ('WINNER', 'FORFEIT')
 
 
 class Player:
 
-    def __init__(self, player_name):
+    def __init__(self, player_name, board_config=None, binary=False, player_token=None):
         self.player_name = player_name
+        # Issued by the server on the first connect, identifies the player for ratings
+        self.player_token = player_token
+        self.board_config = board_config or {}
+        self.binary = binary
         self.player_id = None
         self.game_id = None
+        # Last game state received from the server, from polls and drop_disc responses
+        self.game_status = None
         self.game_state = None
         self.disc = None
         self.winner = None
+        self.columns = self.board_config.get('columns', DEFAULT_COLUMNS)
+        self.poll_interval = None
 
-    @retry(retry_on_exception=lambda e: isinstance(e, Exception), wait_fixed=5000, stop_max_attempt_number=12)
+    @retry_with_backoff
     def establish_connection(self):
         """
         Establish connection to Game session. Max attempts is 12
@@ -40,9 +157,16 @@ class Player:
         :rtype: bool
         """
         print('Attempting to connect to server...')
-        res = make_request_to_server(f'connect/{self.player_name}')
+        query = '&'.join(f'{key}={value}' for key, value in self.board_config.items())
+        res = make_request_to_server(f'connect/{self.player_name}' + (f'?{query}' if query else ''),
+                                     player_token=self.player_token)
+        self.poll_interval = read_poll_hint(res)
         if res.status_code == 200:
             response_json = res.json()
+            player_token = response_json.get('player_token')
+            if player_token and player_token != self.player_token:
+                self.player_token = player_token
+                save_player_token(self.player_name, player_token)
             self.game_id = response_json['game_id']
             player = response_json['player']
             self.player_id = player['player_id']
@@ -50,27 +174,28 @@ class Player:
             print('Successfully established connection to server')
             return True
 
-    @retry(retry_on_exception=lambda e: isinstance(e, Exception), wait_fixed=5000, stop_max_attempt_number=12)
+    @retry_with_backoff
     def poll_until_other_player_connected(self):
         """
-        Poll server until opponent found. Max wait time 60 seconds
+        Poll server until opponent found. Max attempts is 12
 
         :return: Opponent found.
         :raises Exception: if opponent not found withing the 60 second time out.
         """
 
         print('Waiting until opponent joins....')
-        res = make_request_to_server(f'opponent/joined/{self.game_id}')
+        res = make_request_to_server(f'opponent/joined/{self.game_id}', player_id=self.player_id)
+        self.poll_interval = read_poll_hint(res)
 
         if res.status_code == 200:
             response_json = res.json()
             if response_json['opponent']:
                 print('Opponent joined.')
                 return True
-        print('Still waiting on opponent. Sleeping for 5 seconds.')
+        print('Still waiting on opponent.')
         raise Exception('No opponent joined within the timeout of 60 seconds.')
 
-    @retry(retry_on_exception=lambda e: isinstance(e, Exception), wait_fixed=5000, stop_max_attempt_number=12)
+    @retry_with_backoff
     def get_game_status(self):
         """
         Query server for game status
@@ -79,13 +204,37 @@ class Player:
         :rtype: dict
         """
         print('Getting game status...')
-        res = make_request_to_server(f'game_status/{self.game_id}')
+        res = make_request_to_server(f'game_status/{self.game_id}', binary=self.binary, player_id=self.player_id)
+        self.poll_interval = read_poll_hint(res)
 
         if res.status_code == 200:
-            return res.json()
+            return self.read_game_state(res)
         else:
             raise Exception(f'Could not read game status: {res.json()["message"]}')
 
+    def read_game_state(self, res):
+        """
+        Decode game state response from JSON or the binary encoding
+        :param res: Successful game state response
+        :type res: requests.Response
+        :return: Game state
+        :rtype: dict
+        """
+
+        return wire.decode_game_state(res.content) if self.binary else res.json()
+
+    def update_game_status(self, game_status):
+        """
+        Update the local game model from a game state received from the server
+        :param game_status: Game state from get_game_status or a drop_disc response
+        :type game_status: dict
+        """
+
+        self.game_status = game_status
+        self.game_state = game_status['state']
+        self.winner = game_status['winner']
+        self.columns = game_status.get('columns', self.columns)
+
     def drop_disc(self, col):
         """
         Drop disc into the specified column
@@ -94,68 +243,88 @@ class Player:
         :return: Json response from server
         """
 
-        drop_disc_body = {'game_id': self.game_id, 'player_id': self.player_id, 'column': col, 'disc': self.disc}
-        res = make_request_to_server('drop_disc', method='POST', body=drop_disc_body)
+        if self.binary:
+            drop_disc_body = wire.encode_drop_request(self.game_id, self.player_id, col, self.disc)
+        else:
+            drop_disc_body = {'game_id': self.game_id, 'player_id': self.player_id, 'column': col, 'disc': self.disc}
+        for attempt in range(MAX_ATTEMPTS):
+            res = make_request_to_server('drop_disc', method='POST', body=drop_disc_body, binary=self.binary,
+                                         player_id=self.player_id)
+            if res.status_code != 429:
+                break
+            # Throttled, the disc was not dropped. Try again once the server allows it.
+            if attempt == MAX_ATTEMPTS - 1:
+                raise Exception(res.json()['message'])
+            time.sleep(backoff_delay(attempt, read_poll_hint(res)))
+
         if res.status_code == 200:
-            response_json = res.json()
-            # Update game state and winner status
-            self.winner = response_json['winner']
-            self.game_state = response_json['state']
+            # The response holds the board after the move, no need to ask for the status again
+            self.poll_interval = read_poll_hint(res)
+            self.update_game_status(self.read_game_state(res))
         elif res.status_code == 400:
             # Most likely a invalid column
             raise Exception(res.json()['message'])
 
     def poll_until_turn(self):
         """
-        Poll game status every 5 seconds until players turn.
-        If opponent does not respond within 60 seconds then player wins.
-        :return: Players turn, false if game state is WINNER or opponent timmed out.
+        Poll game status until players turn, as often as the server hints. After a move the first poll waits for the
+        hint of the drop_disc response.
+        The server forfeits a player who does not take their turn within 60 seconds.
+        :return: Players turn, false if the game is over.
         :rtype: bool
         """
 
         start_time = time.time()
+        # Right after a move the last state already shows the opponent's turn, so wait as hinted before the first poll
+        if (self.game_status is not None and self.game_state not in GAME_OVER_STATES
+                and self.game_status.get('player_turn') != self.player_id):
+            time.sleep(poll_delay(self.poll_interval))
 
         while True:
-            print(f'Waiting for opponent: {round(60 - (time.time() - start_time))} seconds remaining')
+            print(f'Waiting for opponent: {round(time.time() - start_time)} seconds')
             game_status = self.get_game_status()
-            self.game_state = game_status['state']
-            self.winner = game_status['winner']
-            if self.game_state == 'WINNER':
-                # The game has been won
+            self.update_game_status(game_status)
+            if self.game_state in GAME_OVER_STATES:
+                if self.game_state == 'FORFEIT':
+                    print('Opponent took to long to respond. You are the winner.' if self.winner == self.player_id
+                          else 'You took to long to respond and forfeited the game.')
                 return False
             elif game_status['player_turn'] == self.player_id:
                 # Players turn now
                 return True
-            time.sleep(5)
-            if time.time() - start_time > 60:
-                print('Opponent took to long to respond. You are the winner.')
-                self.winner = self.player_id
-                self.game_state = 'WINNER'
-                return False
+            time.sleep(poll_delay(self.poll_interval))
 
     def display_board(self):
         """
-        Display game board
+        Display game board from the last game state received. The server is only asked if none was received yet.
         """
 
-        print(self.get_game_status()['game_board'] + '\n')
+        if self.game_status is None:
+            self.update_game_status(self.get_game_status())
+        board = self.game_status.get('game_board')
+        if board is None:
+            # Binary game states only carry the masks
+            board = wire.render_board(self.game_status['masks'], self.game_status['columns'], self.game_status['rows'])
+        print(board + '\n')
 
 
-def select_column():
+def select_column(columns=DEFAULT_COLUMNS):
     """
     Ask player to select a column.
 
+    :param columns: Number of columns on the board
+    :type columns: int
     :return: Selected column
     :rtype: int
     """
     print('You have 60 seconds to make a more or you lose the game.')
     while True:
         try:
-            column = int(input('Select Column (1-9): ')) - 1
-            if column in range(9):
+            column = int(input(f'Select Column (1-{columns}): ')) - 1
+            if column in range(columns):
                 return column
             else:
-                print(f'Invalid range: {column+1} not in range (1-9)')
+                print(f'Invalid range: {column+1} not in range (1-{columns})')
         except ValueError:
             print('Please enter an integer')
 
@@ -167,7 +336,7 @@ def create_player():
     :rtype: Player
     """
     player_name = input('Input player name: ')
-    return Player(player_name)
+    return Player(player_name, player_token=load_player_token(player_name))
 
 
 def start_game():
@@ -183,21 +352,19 @@ def start_game():
 
         player.poll_until_other_player_connected()
 
-        player.poll_until_turn()
-
         while True:
             if player.poll_until_turn():
                 try:
                     player.display_board()
                     print('Board updated. Your turn.')
-                    column = select_column()
+                    column = select_column(player.columns)
                     player.drop_disc(column)
                     player.display_board()
-                    if player.game_state == 'WINNER':
+                    if player.game_state in GAME_OVER_STATES:
                         break
                 except Exception as e:
                     print('Something went wrong: ' + str(e))
-            elif player.game_state == 'WINNER':
+            elif player.game_state in GAME_OVER_STATES:
                 break
 
         if player.player_id == player.winner:
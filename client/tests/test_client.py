@@ -1,5 +1,9 @@
-from client.player import Player, make_request_to_server, select_column, start_game, create_player
+from client.player import Player, make_request_to_server, select_column, start_game, create_player, \
+    read_poll_hint, backoff_delay, poll_delay, load_player_token, MAX_RETRY_DELAY
+from common import wire
 
+import os
+import tempfile
 import unittest
 from unittest.mock import Mock, patch
 
@@ -15,6 +19,12 @@ class TestPlayer(unittest.TestCase):
         make_request_to_server('some/endpoint')
         mock_get.assert_called()
 
+    @patch('requests.get')
+    def test_make_request_to_server__player_id_header(self, mock_get):
+
+        make_request_to_server('some/endpoint', player_id='123')
+        self.assertEqual({'X-Player-Id': '123'}, mock_get.call_args[1]['headers'])
+
     @patch('requests.post')
     def test_make_request_to_server__post(self, mock_post):
 
@@ -33,6 +43,21 @@ class TestPlayer(unittest.TestCase):
         self.assertEqual(self.player.game_id, '123')
         self.assertEqual(self.player.player_id, '456')
     
+    @patch('builtins.print')
+    @patch('client.player.make_request_to_server')
+    def test_establish_connection__player_token_saved(self, mock_make_request, _):
+        mock_response = Mock(status_code=200)
+        mock_response.json.return_value = {'game_id': '123', 'player': {'player_id': '456', 'disc': 'X'},
+                                           'player_token': 'secret'}
+        mock_make_request.return_value = mock_response
+        tokens_file = os.path.join(tempfile.mkdtemp(), 'tokens.json')
+
+        with patch('client.player.TOKENS_FILE', tokens_file):
+            self.player.establish_connection()
+            self.assertEqual('secret', load_player_token('Kieran'))
+            self.player.establish_connection()
+        self.assertEqual('secret', mock_make_request.call_args[1]['player_token'])
+
     @patch('builtins.print')
     @patch('time.sleep')
     @patch('client.player.make_request_to_server', side_effect=Exception)
@@ -40,6 +65,45 @@ class TestPlayer(unittest.TestCase):
       
         self.assertRaises(Exception, self.player.establish_connection)
 
+    def test_read_poll_hint__poll_interval(self):
+
+        self.assertEqual(2.5, read_poll_hint(Mock(headers={'Retry-After': '3', 'X-Poll-Interval': '2.50'})))
+
+    def test_read_poll_hint__retry_after(self):
+
+        self.assertEqual(3, read_poll_hint(Mock(headers={'Retry-After': '3'})))
+
+    def test_read_poll_hint__no_hint(self):
+
+        self.assertIsNone(read_poll_hint(Mock(headers={})))
+
+    @patch('random.uniform', side_effect=lambda low, high: high)
+    def test_backoff_delay__exponential_without_hint(self, _):
+
+        self.assertEqual([1, 2, 4, 8], [backoff_delay(attempt) for attempt in range(4)])
+        self.assertEqual(MAX_RETRY_DELAY, backoff_delay(10))
+
+    @patch('random.uniform', side_effect=lambda low, high: high)
+    def test_backoff_delay__honours_hint(self, _):
+
+        self.assertEqual(2.5, backoff_delay(10, hint=2))
+
+    @patch('random.uniform', return_value=0)
+    def test_poll_delay__default_interval(self, _):
+
+        self.assertEqual(5, poll_delay())
+
+    @patch('builtins.print')
+    @patch('time.sleep')
+    @patch('client.player.make_request_to_server')
+    def test_poll_until_other_player_connected__sleeps_for_hint(self, mock_make_request, mock_sleep, _):
+        mock_make_request.side_effect = [Mock(status_code=200, headers={'X-Poll-Interval': '4'},
+                                              json=Mock(return_value={'opponent': False})),
+                                         Mock(status_code=200, headers={}, json=Mock(return_value={'opponent': True}))]
+
+        self.assertTrue(self.player.poll_until_other_player_connected())
+        self.assertTrue(4 <= mock_sleep.call_args[0][0] <= 5)
+
     @patch('client.player.make_request_to_server')
     def test_drop_disc__no_winner_after_drop(self, mock_make_request):
         mock_response = Mock(status_code=200)
@@ -59,6 +123,19 @@ class TestPlayer(unittest.TestCase):
         self.assertEqual(self.player.winner , '456')
         self.assertEqual(self.player.game_state, 'WINNER')
     
+    @patch('client.player.make_request_to_server')
+    def test_drop_disc__binary(self, mock_make_request):
+        game_id, player_id = '0f8fad5b-d9cb-469f-a165-70867728950e', '7c9e6679-7425-40de-944b-e07fc1f90ae7'
+        mock_make_request.return_value = Mock(status_code=200, content=wire.pack_game_state(
+            1, 'READY', 9, 6, 5, wire.encode_id(game_id), player_id, None, (1 << 30, 0)))
+        player = Player('Kieran', binary=True)
+        player.game_id, player.player_id, player.disc = game_id, player_id, 'X'
+
+        player.drop_disc(5)
+        mock_make_request.assert_called_with('drop_disc', method='POST', binary=True, player_id=player.player_id,
+                                             body=wire.encode_drop_request(player.game_id, player.player_id, 5, 'X'))
+        self.assertEqual(player.game_state, 'READY')
+
     @patch('client.player.make_request_to_server')
     def test_drop_disc__invalid_column(self, mock_make_request):
         mock_response = Mock(status_code=400)
@@ -69,6 +146,19 @@ class TestPlayer(unittest.TestCase):
 
         self.assertEqual('Invalid column: 5' , str(e.exception))
 
+    @patch('time.sleep')
+    @patch('client.player.make_request_to_server')
+    def test_drop_disc__throttled_retried(self, mock_make_request, mock_sleep):
+        throttled = Mock(status_code=429, headers={'Retry-After': '2'})
+        accepted = Mock(status_code=200)
+        accepted.json.return_value = {'game_id': '123', 'winner': None, 'state': 'READY'}
+        mock_make_request.side_effect = [throttled, accepted]
+
+        self.player.drop_disc(5)
+        self.assertEqual(2, mock_make_request.call_count)
+        self.assertGreaterEqual(mock_sleep.call_args[0][0], 2)
+        self.assertEqual('READY', self.player.game_state)
+
     @patch('builtins.print')
     @patch('client.player.make_request_to_server')
     def test_poll_until_other_player_connected__other_player_joined(self, mock_make_request, _):
@@ -105,22 +195,74 @@ class TestPlayer(unittest.TestCase):
         self.assertEqual(self.player.game_state, 'WINNER')
 
     @patch('time.sleep')
-    @patch('time.time', side_effect=[0, 1, 100])
-    @patch('client.player.Player.get_game_status', return_value={'state': 'PLAYING', 'winner': None, 'player_turn': '456'})
+    @patch('time.time', side_effect=[0, 1, 2, 3])
+    @patch('client.player.Player.get_game_status',
+           side_effect=[{'state': 'READY', 'winner': None, 'player_turn': '456'},
+                        {'state': 'FORFEIT', 'winner': '123', 'player_turn': '456'}])
     @patch('builtins.print')
-    def test_poll_until_turn__opponent_disconnected(self, mock_print, *_):
+    def test_poll_until_turn__opponent_forfeited(self, mock_print, *_):
         self.player.player_id = '123'
         self.assertFalse(self.player.poll_until_turn())
 
         mock_print.assert_called_with('Opponent took to long to respond. You are the winner.')
         self.assertEqual(self.player.player_id, self.player.winner)
+        self.assertEqual(self.player.game_state, 'FORFEIT')
 
-    @patch('client.player.Player.get_game_status', return_value={'game_board': " ['_' '_' '_' '_' '_' '_' '_' '_' '_']\n ['_' '_' '_' '_' '_' '_' '_' '_' '_']\n ['_' '_' '_' '_' '_' '_' '_' '_' '_']\n ['_' '_' '_' '_' '_' '_' '_' '_' '_']\n ['_' '_' '_' '_' '_' '_' '_' '_' '_']\n ['_' '_' '_' '_' '_' '_' '_' '_' '_']\n\n   1   2   3   4   5   6   7   8   9  "})
     @patch('builtins.print')
-    def test_display_board(self, mock_print, _):
+    @patch('time.time', side_effect=[0, 1])
+    @patch('time.sleep')
+    @patch('client.player.make_request_to_server')
+    def test_poll_until_turn__waits_for_drop_disc_hint(self, mock_make_request, mock_sleep, *_):
+        self.player.player_id = '123'
+        dropped = Mock(status_code=200, headers={'X-Poll-Interval': '3'})
+        dropped.json.return_value = {'state': 'READY', 'winner': None, 'player_turn': '456'}
+        polled = Mock(status_code=200, headers={})
+        polled.json.return_value = {'state': 'READY', 'winner': None, 'player_turn': '123'}
+        mock_make_request.side_effect = [dropped, polled]
+        calls = Mock()
+        calls.attach_mock(mock_make_request, 'request')
+        calls.attach_mock(mock_sleep, 'sleep')
+
+        self.player.drop_disc(5)
+        self.assertTrue(self.player.poll_until_turn())
+        self.assertEqual(['request', 'sleep', 'request'], [name for name, _, _ in calls.mock_calls])
+        self.assertTrue(3 <= mock_sleep.call_args[0][0] <= 4)
+
+    @patch('client.player.Player.get_game_status')
+    @patch('builtins.print')
+    def test_display_board__local_game_status(self, mock_print, mock_get_game_status):
+        self.player.game_status = {'game_board': " ['_' '_' '_' '_' '_' '_' '_' '_' '_']\n ['_' '_' '_' '_' '_' '_' '_' '_' '_']\n ['_' '_' '_' '_' '_' '_' '_' '_' '_']\n ['_' '_' '_' '_' '_' '_' '_' '_' '_']\n ['_' '_' '_' '_' '_' '_' '_' '_' '_']\n ['_' '_' '_' '_' '_' '_' '_' '_' '_']\n\n   1   2   3   4   5   6   7   8   9  "}
 
         self.player.display_board()
         mock_print.assert_called_with(" ['_' '_' '_' '_' '_' '_' '_' '_' '_']\n ['_' '_' '_' '_' '_' '_' '_' '_' '_']\n ['_' '_' '_' '_' '_' '_' '_' '_' '_']\n ['_' '_' '_' '_' '_' '_' '_' '_' '_']\n ['_' '_' '_' '_' '_' '_' '_' '_' '_']\n ['_' '_' '_' '_' '_' '_' '_' '_' '_']\n\n   1   2   3   4   5   6   7   8   9  \n")
+        mock_get_game_status.assert_not_called()
+
+    @patch('builtins.print')
+    def test_display_board__binary_game_status(self, mock_print):
+        self.player.game_status = {'masks': (1, 2), 'columns': 2, 'rows': 2}
+
+        self.player.display_board()
+        mock_print.assert_called_with(" ['O' '_']\n ['X' '_']\n\n   1   2  \n")
+
+    @patch('client.player.Player.get_game_status',
+           return_value={'state': 'READY', 'winner': None, 'player_turn': '123', 'game_board': 'board'})
+    @patch('builtins.print')
+    def test_display_board__no_game_status_yet(self, mock_print, _):
+
+        self.player.display_board()
+        mock_print.assert_called_with('board\n')
+        self.assertEqual('READY', self.player.game_state)
+
+    @patch('builtins.print')
+    @patch('client.player.make_request_to_server')
+    def test_drop_disc__then_display_board_without_request(self, mock_make_request, _):
+        mock_response = Mock(status_code=200)
+        mock_response.json.return_value = {'game_id': '123', 'winner': None, 'state': 'READY', 'game_board': 'board'}
+        mock_make_request.return_value = mock_response
+
+        self.player.drop_disc(5)
+        self.player.display_board()
+        self.assertEqual(1, mock_make_request.call_count)
 
     @patch('builtins.print')
     @patch('builtins.input', side_effect=list(range(1, 9)))
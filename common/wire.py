@@ -0,0 +1,135 @@
+"""
+Binary encoding of game state and drop_disc requests, an opt-in alternative to JSON for high frequency clients.
+Selected with the Accept header (responses) or the Content-Type header (drop_disc requests).
+Shared by the client and the server (game_server/wire.py), so it only uses the standard library.
+
+Game state layout (network byte order):
+    version u8 | turns u16 | state u8 | columns u8 | rows u8 | win_length u8 |
+    game_id 16 bytes | player_turn 16 bytes | winner 16 bytes | mask length u16 | player 1 mask | player 2 mask
+Unset ids (no player turn yet, no winner) are sent as 16 zero bytes.
+
+Drop disc layout:
+    version u8 | game_id 16 bytes | player_id 16 bytes | column u16 | disc 1 byte
+"""
+from struct import Struct
+from uuid import UUID
+
+MIMETYPE = 'application/x-connect5'
+VERSION = 1
+STATES = ('WAITING FOR PLAYERS', 'READY', 'WINNER', 'FORFEIT')
+DISCS = ('X', 'O')
+EMPTY = '_'
+
+_GAME_STATE_HEADER = Struct('!BHBBBB16s16s16sH')
+_DROP_DISC = Struct('!B16s16sHc')
+_NO_ID = bytes(16)
+
+
+def encode_id(id_string):
+    """
+    :param id_string: uuid string or None
+    :return: 16 byte uuid
+    :rtype: bytes
+    """
+
+    return UUID(id_string).bytes if id_string else _NO_ID
+
+
+def decode_id(id_bytes):
+    """
+    :param id_bytes: 16 byte uuid
+    :return: uuid string or None if unset
+    :rtype: str or None
+    """
+
+    return str(UUID(bytes=id_bytes)) if id_bytes != _NO_ID else None
+
+
+def pack_game_state(turns, state, columns, rows, win_length, game_uuid, player_turn, winner, masks):
+    """
+    Pack game state.
+
+    :param state: One of STATES
+    :param game_uuid: 16 byte game id
+    :param player_turn: Player id or None
+    :param winner: Player id or None
+    :param masks: Bitmask per player
+    :return: Packed game state
+    :rtype: bytes
+    """
+
+    mask_length = (columns * rows + 7) // 8
+    header = _GAME_STATE_HEADER.pack(VERSION, turns, STATES.index(state), columns, rows, win_length, game_uuid,
+                                     encode_id(player_turn), encode_id(winner), mask_length)
+    return header + b''.join(mask.to_bytes(mask_length, 'big') for mask in masks)
+
+
+def decode_game_state(data):
+    """
+    Unpack game state into the same keys as GameSession.game_details, except players, takeback_requested_by and
+    game_board. The board is sent as masks, render_board draws it when it is displayed.
+
+    :param data: Packed game state
+    :type data: bytes
+    :return: Game details including the decoded board masks
+    :rtype: dict
+    :raises Exception: If the data is not a supported game state.
+    """
+
+    if len(data) < _GAME_STATE_HEADER.size or data[0] != VERSION:
+        raise Exception('Unsupported game state encoding')
+
+    version, turns, state, columns, rows, win_length, game_id, player_turn, winner, mask_length = \
+        _GAME_STATE_HEADER.unpack_from(data)
+    offset = _GAME_STATE_HEADER.size
+    masks = (int.from_bytes(data[offset:offset + mask_length], 'big'),
+             int.from_bytes(data[offset + mask_length:offset + 2 * mask_length], 'big'))
+
+    return {'game_id': decode_id(game_id), 'state': STATES[state], 'player_turn': decode_id(player_turn),
+            'winner': decode_id(winner), 'turns': turns, 'masks': masks, 'columns': columns, 'rows': rows,
+            'win_length': win_length}
+
+
+def render_board(masks, columns, rows):
+    """
+    Draw a board from its masks, the same as str(game_server.game_session.Board)
+    :rtype: str
+    """
+
+    def disc(col, row):
+        bit = col * rows + row
+        return next((disc for disc, mask in zip(DISCS, masks) if mask >> bit & 1), EMPTY)
+
+    board_rows = ('[' + ' '.join(f"'{disc(col, row)}'" for col in range(columns)) + ']'
+                  for row in reversed(range(rows)))
+    column_numbers = ''.join(f'{col:>4}' for col in range(1, columns + 1))
+
+    return ' ' + '\n '.join(board_rows) + '\n\n' + column_numbers + '  '
+
+
+def encode_drop_request(game_id, player_id, column, disc):
+    """
+    Pack drop_disc request.
+    :rtype: bytes
+    """
+
+    return _DROP_DISC.pack(VERSION, encode_id(game_id), encode_id(player_id), column, disc.encode())
+
+
+def decode_drop_request(data):
+    """
+    Unpack drop_disc request into the same keys as the JSON request body.
+
+    :param data: Packed request
+    :type data: bytes
+    :return: Drop disc request
+    :rtype: dict
+    :raises Exception: If the data is not a supported drop request.
+    """
+
+    if len(data) != _DROP_DISC.size or data[0] != VERSION:
+        raise Exception('Unsupported drop_disc encoding')
+
+    _, game_id, player_id, column, disc = _DROP_DISC.unpack(data)
+    return {'game_id': decode_id(game_id), 'player_id': decode_id(player_id), 'column': column,
+            'disc': disc.decode()}
@@ -1,14 +1,46 @@
+import atexit
+from .logs import setup_logging
+from .metrics import registry
+from .ratings import ratings
+from .archive import archive
+from .profiling import register_profiling
+from .sharding import register_shard
+from .snapshots import SNAPSHOT_INTERVAL, Snapshotter, load_latest_snapshot
 
-from flask import Flask, make_response, jsonify
 
-
-def create_app():
+def create_app(ratings_file=None, archive_dir=None, profile_dir=None, profile_sample_rate=0.0, profile_token=None,
+               shard=None, shards=None, snapshot_dir=None, snapshot_interval=SNAPSHOT_INTERVAL):
     """
     Application factory method to create app
+    :param ratings_file: JSON file player ratings are loaded from and saved to on exit
+    :param archive_dir: Directory finished games are archived to
+    :param profile_dir: Directory request profiles and sampler stacks are dumped to, profiling is disabled if None
+    :param profile_sample_rate: Fraction of requests profiled without the X-Profile header
+    :param profile_token: X-Profile value that allows profiling from other hosts than loopback
+    :param shard: Name of this shard when run behind game_server.router
+    :param shards: Names of all shards
+    :param snapshot_dir: Directory game sessions are restored from on start and snapshotted to
+    :param snapshot_interval: Seconds between snapshots
     :return: flask.Flask
     """
+    # Flask is only imported here so the game engine (e.g. game_server.vector_env) can be used without it
+    from flask import Flask, make_response, jsonify, Response
     app = Flask(__name__)
-    from .game import game_blueprint
+    setup_logging()
+    if ratings_file:
+        ratings.load(ratings_file)
+        atexit.register(ratings.save, ratings_file)
+    if archive_dir:
+        archive.open(archive_dir)
+    from .game import game_blueprint, game_sessions, restore_game_sessions
+    if snapshot_dir:
+        restored_sessions = load_latest_snapshot(snapshot_dir)
+        if restored_sessions is not None:
+            restore_game_sessions(restored_sessions)
+        snapshotter = Snapshotter(snapshot_dir, game_sessions, snapshot_interval)
+        snapshotter.start()
+        atexit.register(snapshotter.stop)
+        app.extensions['snapshotter'] = snapshotter
 
     with app.app_context():
         app.register_blueprint(game_blueprint, url_prefix='/api/v1')
@@ -17,4 +49,14 @@ def create_app():
             """Build json response message for 400 errors"""
             return make_response(jsonify({'message': error.description}), 400)
 
+        if profile_dir:
+            register_profiling(app, profile_dir, profile_sample_rate, profile_token)
+        if shard:
+            register_shard(app, shard, shards)
+
+        @app.route('/metrics')
+        def metrics():
+            """Expose server metrics in the Prometheus text format"""
+            return Response(registry.expose(), mimetype='text/plain; version=0.0.4')
+
     return app
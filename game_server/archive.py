@@ -0,0 +1,295 @@
+"""
+Columnar archive of finished games.
+
+The server buffers finished games in memory and a background thread writes every CHUNK_SIZE games to a chunk
+directory holding one .npy file per column. The moves of all games of a chunk are stored back to back in `moves`,
+with `move_offsets` marking where each game starts. Players are identified by their 16 byte account id (zero for
+players without one) and dictionary encoded: `player_accounts` holds the distinct account ids of the chunk, sorted,
+and `player_1`/`player_2` index into it, so grouping by player is a bincount.
+
+Analytics read the archive with ArchiveReader, normally in another process. Columns are memory mapped and only the
+columns a query needs are read, aggregations are vectorized per chunk and merged.
+"""
+import atexit
+import logging
+import os
+from queue import Queue
+from threading import Lock, Thread
+from time import time
+from uuid import UUID
+
+import numpy as np
+
+from .logs import log_event
+
+CHUNK_SIZE = 100000
+OUTCOMES = {'WINNER': 1, 'FORFEIT': 2}
+NO_ACCOUNT = bytes(16)
+
+# Column name: numpy dtype
+COLUMNS = {
+    'game_id': 'S16',
+    'winner': 'i1',  # 1 or 2, the winning player number
+    'outcome': 'i1',  # see OUTCOMES
+    'columns': 'u1',
+    'rows': 'u1',
+    'win_length': 'u1',
+    'turns': 'u2',
+    'first_column': 'i2',  # -1 if no disc was dropped
+    'started_at': 'f8',
+    'duration': 'f4',
+}
+
+
+def game_record(game_session, finished_at):
+    """
+    Extract the archived fields of a finished game
+
+    :param game_session: Game that is over
+    :type game_session: game_server.game_session.GameSession
+    :param finished_at: Time the game finished
+    :return: Column values, player account ids and the moves of the game
+    :rtype: tuple
+    """
+
+    board = game_session.board
+    winner = 1 if game_session.winner == game_session.player_1.player_id else 2
+    started_at = game_session.started_at or finished_at
+    values = (game_session.game_uuid, winner, OUTCOMES[game_session.state], board.columns, board.rows,
+              board.win_length, board.turns, board.moves[0] if board.moves else -1, started_at,
+              finished_at - started_at)
+    players = (game_session.player_1.account_id or NO_ACCOUNT, game_session.player_2.account_id or NO_ACCOUNT)
+    return values, players, bytes(board.moves or b'')
+
+
+def write_chunk(directory, chunk_number, records):
+    """
+    Write records as a chunk of column files
+
+    :param directory: Archive directory
+    :param chunk_number: Sequence number of the chunk
+    :param records: Records from game_record
+    :return: Chunk directory
+    :rtype: str
+    """
+
+    chunk_directory = os.path.join(directory, f'chunk-{chunk_number:08d}')
+    partial_directory = chunk_directory + '.partial'
+    os.makedirs(partial_directory, exist_ok=True)
+
+    values = list(zip(*(record for record, _, _ in records)))
+    for (name, dtype), column in zip(COLUMNS.items(), values):
+        np.save(os.path.join(partial_directory, f'{name}.npy'), np.array(column, dtype=dtype))
+
+    # Account ids are saved sorted so readers can merge the dictionaries of many chunks cheaply
+    accounts = np.array([players for _, players, _ in records], dtype='S16').reshape(-1, 2)
+    player_accounts, codes = np.unique(accounts.T, return_inverse=True)
+    codes = codes.reshape(2, -1).astype('i4')
+    np.save(os.path.join(partial_directory, 'player_1.npy'), codes[0])
+    np.save(os.path.join(partial_directory, 'player_2.npy'), codes[1])
+    np.save(os.path.join(partial_directory, 'player_accounts.npy'), player_accounts)
+
+    moves = [game_moves for _, _, game_moves in records]
+    np.save(os.path.join(partial_directory, 'moves.npy'), np.frombuffer(b''.join(moves), dtype='u1'))
+    np.save(os.path.join(partial_directory, 'move_offsets.npy'),
+            np.concatenate(([0], np.cumsum([len(game_moves) for game_moves in moves]))).astype('i8'))
+
+    # Readers only see complete chunks
+    os.rename(partial_directory, chunk_directory)
+    return chunk_directory
+
+
+class GameArchive:
+
+    def __init__(self, chunk_size=CHUNK_SIZE):
+        """
+        :param chunk_size: Games per chunk. Archiving is disabled until open is called.
+        """
+        self.directory = None
+        self.chunk_size = chunk_size
+        self.buffer = []
+        self.chunk_number = 0
+        self._lock = Lock()
+        self._queue = None
+        self._close_at_exit = False
+
+    def open(self, directory):
+        """
+        Start archiving to directory, closing the previous directory if open. New chunks are numbered after the
+        existing ones.
+        """
+
+        self.close()
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.chunk_number = len(chunk_directories(directory))
+        self._queue = Queue()
+        Thread(target=self._write_chunks, daemon=True).start()
+        if not self._close_at_exit:
+            atexit.register(self.close)
+            self._close_at_exit = True
+
+    def record(self, game_session):
+        """
+        Buffer a finished game. Full chunks are handed to the writer thread.
+
+        :param game_session: Game that is over
+        """
+
+        if not self._queue:
+            return
+
+        record = game_record(game_session, time())
+        with self._lock:
+            self.buffer.append(record)
+            if len(self.buffer) < self.chunk_size:
+                return
+            records, self.buffer = self.buffer, []
+            self.chunk_number += 1
+            self._queue.put((self.chunk_number, records))
+
+    def close(self):
+        """Write buffered games and wait for the writer thread to finish"""
+        if not self._queue:
+            return
+
+        with self._lock:
+            if self.buffer:
+                self.chunk_number += 1
+                self._queue.put((self.chunk_number, self.buffer))
+                self.buffer = []
+        self._queue.put(None)
+        self._queue.join()
+        self._queue = None
+
+    def _write_chunks(self):
+        queue = self._queue
+        while True:
+            item = queue.get()
+            try:
+                if item is None:
+                    return
+                write_chunk(self.directory, *item)
+            except Exception as e:
+                # Losing a chunk is better than a dead writer, close() would wait for it forever
+                log_event('archive_write_failed', logging.ERROR, chunk=item[0], error=str(e))
+            finally:
+                queue.task_done()
+
+
+def chunk_directories(directory):
+    """
+    Complete chunks of an archive, oldest first
+    :rtype: list
+    """
+
+    if not os.path.isdir(directory):
+        return []
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if name.startswith('chunk-') and not name.endswith('.partial'))
+
+
+class ArchiveReader:
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def chunks(self, *names):
+        """
+        Load columns chunk by chunk. Only the requested column files are opened, memory mapped.
+
+        :param names: Column names, including moves, move_offsets, player_1, player_2 and player_accounts
+        :return: Generator of dicts of column name to array
+        """
+
+        for chunk_directory in chunk_directories(self.directory):
+            yield {name: np.load(os.path.join(chunk_directory, f'{name}.npy'), mmap_mode='r') for name in names}
+
+    def count(self):
+        """
+        Number of archived games
+        :rtype: int
+        """
+
+        return sum(len(chunk['turns']) for chunk in self.chunks('turns'))
+
+    def win_rate_by_first_column(self):
+        """
+        How often the player who moved first won, by the column of the first move
+
+        :return: Column to (games, win rate)
+        :rtype: dict
+        """
+
+        games, wins = np.zeros(0, dtype='i8'), np.zeros(0)
+        for chunk in self.chunks('first_column', 'winner'):
+            played = chunk['first_column'] >= 0
+            first_column = chunk['first_column'][played]
+            chunk_games = np.bincount(first_column)
+            chunk_wins = np.bincount(first_column, weights=chunk['winner'][played] == 1)
+            games, wins = add_padded(games, chunk_games), add_padded(wins, chunk_wins)
+
+        return {column: (int(games[column]), wins[column] / games[column]) for column in np.flatnonzero(games)}
+
+    def average_game_length_by_player(self):
+        """
+        Average number of turns of the games of each player with an account
+
+        :return: Account id (uuid string) to average turns
+        :rtype: dict
+        """
+
+        accounts, games, total_turns = [], [], []
+        for chunk in self.chunks('player_1', 'player_2', 'player_accounts', 'turns'):
+            players = np.concatenate((chunk['player_1'], chunk['player_2']))
+            turns = np.concatenate((chunk['turns'], chunk['turns']))
+            account_count = len(chunk['player_accounts'])
+            accounts.append(chunk['player_accounts'])
+            games.append(np.bincount(players, minlength=account_count))
+            total_turns.append(np.bincount(players, weights=turns, minlength=account_count))
+        if not accounts:
+            return {}
+
+        # Chunks have their own account codes, map them to one code per account across the archive. The accounts of
+        # each chunk are sorted, so a stable sort only has to merge the runs.
+        accounts = np.concatenate(accounts)
+        order = np.argsort(accounts, kind='stable')
+        sorted_accounts = accounts[order]
+        first = np.ones(len(sorted_accounts), dtype=bool)
+        first[1:] = sorted_accounts[1:] != sorted_accounts[:-1]
+        account_codes = np.empty(len(accounts), dtype=np.intp)
+        account_codes[order] = np.cumsum(first) - 1
+        unique_accounts = sorted_accounts[first]
+        games = np.bincount(account_codes, weights=np.concatenate(games), minlength=len(unique_accounts))
+        total_turns = np.bincount(account_codes, weights=np.concatenate(total_turns), minlength=len(unique_accounts))
+        played = (games > 0) & (unique_accounts != NO_ACCOUNT)
+        # numpy strips trailing zero bytes from S16 items, the byte view keeps all 16
+        account_bytes = np.ascontiguousarray(unique_accounts[played]).view('u1').reshape(-1, 16)
+        return {str(UUID(bytes=account.tobytes())): average
+                for account, average in zip(account_bytes, (total_turns[played] / games[played]).tolist())}
+
+    def moves(self, chunk):
+        """
+        Split the moves column of a chunk per game
+
+        :param chunk: Chunk with the moves and move_offsets columns
+        :return: Array of moves per game
+        :rtype: list
+        """
+
+        return np.split(chunk['moves'], chunk['move_offsets'][1:-1])
+
+
+def add_padded(total, values):
+    """
+    Add two 1d arrays of possibly different lengths
+    :rtype: numpy.ndarray
+    """
+
+    result = np.zeros(max(len(total), len(values)), dtype=np.result_type(total, values))
+    result[:len(total)] += total
+    result[:len(values)] += values
+    return result
+
+
+archive = GameArchive()
@@ -1,15 +1,150 @@
+import json
+from time import perf_counter
+from uuid import UUID
+from math import ceil
+from flask import Blueprint, jsonify, abort, request, g, Response, make_response
+from .game_session import GameSession, Board, SessionTable, session_lock, validate_board_config
+from .logs import log_event
+from .archive import archive
+from .matchmaker import matchmaking
+from .rate_limit import admission_control
+from .ratings import ratings
+from .spectators import broadcaster, stream_game
+from .status_cache import status_cache
+from .turn_deadlines import turn_deadlines
+from .poll_hints import load_tracker, add_poll_hint
+from .wire import MIMETYPE, encode_game_state, decode_drop_request
+from .metrics import REQUEST_LATENCY, REJECTED_REQUESTS, JOINS, MOVES, WINS, SESSIONS, ENGINE_LATENCY
 
-from flask import Blueprint, jsonify, abort, request
-from .game_session import GameSession
-
-game_sessions = [GameSession() for _ in range(10)]
+game_sessions = SessionTable(GameSession() for _ in range(10))
+# Player ids (16 bytes) handed out to players of game_sessions, only these get their own rate limit buckets
+known_players = set()
 game_blueprint = Blueprint('game', __name__)
 
 
+@game_blueprint.before_request
+def start_request_timer():
+    """
+    Record request start time for the latency histogram and count the request as in flight.
+    Requests over the client's rate limit or beyond the in flight limit are shed with a 429.
+    Games whose turn deadline has passed are forfeited before the request is handled.
+    """
+    g.request_start = perf_counter()
+    load_tracker.started()
+
+    rejection = admission_control.check(request.endpoint, rate_limit_client(), load_tracker.in_flight)
+    if rejection:
+        message, retry_after = rejection
+        response = make_response(jsonify({'message': message}), 429)
+        response.headers['Retry-After'] = str(ceil(retry_after))
+        return response
+
+    for game_session in turn_deadlines.expire():
+        record_game_over(game_session)
+        broadcaster.publish(game_session)
+
+
+def rate_limit_client():
+    """
+    Client key the request is rate limited by: the IP address, and the player id from the X-Player-Id header if it
+    belongs to a player of a game. Made up player ids share the bucket of their address.
+
+    :rtype: str or tuple
+    """
+    player_id = request.headers.get('X-Player-Id')
+    if player_id:
+        try:
+            if UUID(player_id).bytes in known_players:
+                return request.remote_addr, player_id
+        except ValueError:
+            pass
+    return request.remote_addr
+
+
+@game_blueprint.teardown_request
+def finish_request(_):
+    """Request is no longer in flight"""
+    load_tracker.finished()
+
+
+@game_blueprint.after_request
+def record_request_metrics(response):
+    """
+    Record request latency and rejected requests per endpoint.
+    Rejected requests are told when to retry.
+
+    :param response: Outgoing response
+    :type response: flask.Response
+    :return: Unmodified response
+    :rtype: flask.Response
+    """
+    REQUEST_LATENCY.observe(perf_counter() - g.request_start, request.endpoint)
+    if response.status_code >= 400:
+        REJECTED_REQUESTS.inc(request.endpoint, response.status_code)
+        if 'Retry-After' not in response.headers:
+            add_poll_hint(response)
+    return response
+
+
+def session_counts():
+    """
+    Count game sessions by state for the sessions gauge
+
+    :return: Session count keyed by label values
+    :rtype: dict
+    """
+    waiting = sum(1 for session in game_sessions if session.waiting_for_players)
+    finished = sum(1 for session in game_sessions if session.winner)
+    return {('waiting',): waiting, ('active',): len(game_sessions) - waiting - finished, ('finished',): finished}
+
+
+SESSIONS.set_function(session_counts)
+
+
+def preferred_encoding():
+    """
+    Encoding of game states preferred by the Accept header. JSON by default.
+    :rtype: str
+    """
+    if request.accept_mimetypes.best_match(['application/json', MIMETYPE]) == MIMETYPE:
+        return MIMETYPE
+    return 'application/json'
+
+
+def serialize_game_state(game_session, encoding):
+    """
+    :param game_session: Game session to serialize
+    :param encoding: Mimetype from preferred_encoding
+    :rtype: bytes
+    """
+    if encoding == MIMETYPE:
+        return encode_game_state(game_session)
+    return json.dumps(game_session.game_details()).encode()
+
+
+def game_state_response(game_session, body=None):
+    """
+    Build game state response in the encoding preferred by the Accept header. JSON by default.
+    The response tells the client when to poll next.
+
+    :param game_session: Game session to respond with
+    :type game_session: game_server.game_session.GameSession
+    :param body: Game state already serialized in the preferred encoding
+    :rtype: flask.Response
+    """
+    encoding = preferred_encoding()
+    if body is None:
+        body = serialize_game_state(game_session, encoding)
+    return add_poll_hint(Response(body, mimetype=encoding), game_session.state)
+
+
 @game_blueprint.route('/connect/<player_name>')
 def connect_to_game(player_name):
     """
-    Provide a player with a session
+    Provide a player with a session.
+    Board geometry can be requested with the optional columns, rows and win_length query parameters.
+    Returning players send the player token they were given in the X-Player-Token header and keep their rating,
+    new players are issued a token.
 
     :param player_name: player_name
     :type player_name: str
@@ -18,8 +153,22 @@ def connect_to_game(player_name):
     """
 
     try:
-        game_session, player = connect_player_to_game(player_name)
-        return jsonify({'player': player.player_details(), 'game_id': game_session.game_id})
+        player_token = request.headers.get('X-Player-Token')
+        if player_token:
+            account_id = ratings.authenticate(player_token)
+        else:
+            account_id, player_token = ratings.register()
+        game_session, player = connect_player_to_game(player_name,
+                                                      request.args.get('columns', Board.COLUMNS, type=int),
+                                                      request.args.get('rows', Board.ROWS, type=int),
+                                                      request.args.get('win_length', Board.WIN_LENGTH, type=int),
+                                                      account_id)
+        JOINS.inc()
+        if not game_session.waiting_for_players:
+            turn_deadlines.start_turn(game_session)
+        broadcaster.publish(game_session)
+        return jsonify({'player': player.player_details(), 'game_id': game_session.game_id,
+                        'rating': ratings.rating(account_id), 'player_token': player_token})
     except Exception as e:
         return abort(400, str(e))
 
@@ -27,7 +176,7 @@ def connect_to_game(player_name):
 @game_blueprint.route('/game_status/<game_id>')
 def get_game_status(game_id):
     """
-    Get status for game_id
+    Get status for game_id. The serialized status is shared by concurrent and repeated requests until the game changes.
 
     :param game_id: Game to check status of
     :type game_id: str
@@ -36,7 +185,8 @@ def get_game_status(game_id):
     """
 
     try:
-        return jsonify(get_game_session(game_id).game_details())
+        game_session, body = status_cache.get(game_id, preferred_encoding(), get_game_session, serialize_game_state)
+        return game_state_response(game_session, body)
     except Exception as e:
         return abort(400, f'Could not find game_server session for {game_id}: {e}')
 
@@ -52,51 +202,214 @@ def opponent_joined(game_id):
     :rtype: flask.Response
     """
     try:
-        return jsonify({'opponent': not get_game_session(game_id).waiting_for_players})
+        game_session = get_game_session(game_id)
+        return add_poll_hint(jsonify({'opponent': not game_session.waiting_for_players}), game_session.state)
     except Exception as e:
         abort(400, str(e))
 
 
+@game_blueprint.route('/hint/<game_id>')
+def get_hint(game_id):
+    """
+    Legal moves, immediate wins, forced blocks and threats for the player to move. The line counters are built and
+    read under session_lock so a concurrent move cannot leave them out of step with the board.
+
+    :param game_id: Game to analyse
+    :type game_id: str
+    :return: Hint details
+    :rtype: flask.Response
+    """
+
+    try:
+        game_session = get_game_session(game_id)
+        with session_lock:
+            hint = game_session.hint()
+        return jsonify(hint)
+    except Exception as e:
+        return abort(400, str(e))
+
+
+@game_blueprint.route('/spectate/<game_id>')
+def spectate_game(game_id):
+    """
+    Watch a game as a server sent event stream. The stream starts with the current game state, sends every
+    state change and ends when the game is over.
+
+    :param game_id: Game to watch
+    :type game_id: str
+    :return: Event stream of game details
+    :rtype: flask.Response
+    """
+
+    try:
+        game_session = get_game_session(game_id)
+    except Exception as e:
+        return abort(400, str(e))
+
+    channel, cursor = broadcaster.subscribe(game_session)
+    return Response(stream_game(game_session, channel, cursor), mimetype='text/event-stream')
+
+
 @game_blueprint.route('/drop_disc', methods=['POST'])
 def drop_disc():
     """
-    Drop disc into game_server board.
+    Drop disc into game_server board. The request body is JSON or the binary encoding from wire.py.
 
     :return: Game status after disk dropped.
     :rtype: flask.Response
     """
 
-    drop_data = request.json
     try:
+        drop_data = decode_drop_request(request.get_data()) if request.mimetype == MIMETYPE else request.json
         game_session = get_game_session(drop_data['game_id'])
-        if not game_session.next_player_turn() == drop_data['player_id']:
-            raise Exception(f'It is not your turn: {drop_data["player_id"]}')
+        # The state checks, the move and the next deadline are one step, a forfeit cannot come in between
+        with session_lock:
+            if game_session.state in GameSession.GAME_OVER_STATES:
+                raise Exception(f'Game is over: {game_session.state}')
+            if not game_session.next_player_turn() == drop_data['player_id']:
+                raise Exception(f'It is not your turn: {drop_data["player_id"]}')
+
+            with ENGINE_LATENCY.time('drop_disc'):
+                game_session.board.drop_disc(drop_data['column'], drop_data['disc'])
+            with ENGINE_LATENCY.time('check_for_winner'):
+                game_session.check_for_winner()
+            turn_deadlines.start_turn(game_session)
+        MOVES.inc()
+        log_event('disc_dropped', game_id=drop_data['game_id'], player_id=drop_data['player_id'],
+                  column=drop_data['column'])
+        if game_session.winner:
+            WINS.inc()
+            record_game_over(game_session)
+        broadcaster.publish(game_session)
+
+        return game_state_response(game_session)
+    except Exception as e:
+        return abort(400, str(e))
+
+
+@game_blueprint.route('/takeback', methods=['POST'])
+def request_takeback():
+    """
+    Ask the opponent to take back the player's last move. The request body is JSON with game_id and player_id.
+
+    :return: Game status with the pending request
+    :rtype: flask.Response
+    """
+
+    try:
+        takeback_data = request.json
+        game_session = get_game_session(takeback_data['game_id'])
+        with session_lock:
+            game_session.request_takeback(takeback_data['player_id'])
+        broadcaster.publish(game_session)
+
+        return game_state_response(game_session)
+    except Exception as e:
+        return abort(400, str(e))
 
-        game_session.board.drop_disc(drop_data['column'], drop_data['disc'])
-        game_session.check_for_winner()
 
-        return jsonify(game_session.game_details())
+@game_blueprint.route('/takeback/answer', methods=['POST'])
+def answer_takeback():
+    """
+    Accept or decline the opponent's takeback request. The request body is JSON with game_id, player_id and accept.
+
+    :return: Game status after the answer
+    :rtype: flask.Response
+    """
+
+    try:
+        takeback_data = request.json
+        accept = takeback_data['accept']
+        if not isinstance(accept, bool):
+            raise Exception(f'accept must be true or false: {accept}')
+        game_session = get_game_session(takeback_data['game_id'])
+        with session_lock:
+            game_session.answer_takeback(takeback_data['player_id'], accept)
+            if accept:
+                turn_deadlines.start_turn(game_session)
+        broadcaster.publish(game_session)
+
+        return game_state_response(game_session)
     except Exception as e:
         return abort(400, str(e))
 
 
-def connect_player_to_game(player_name):
+def connect_player_to_game(player_name, columns=Board.COLUMNS, rows=Board.ROWS, win_length=Board.WIN_LENGTH,
+                           account_id=None):
     """
     Get a players game_server session.
+    Players are matched by rating with a player waiting for the same board geometry.
+    If there is none, an empty session is set up with the requested geometry and the player waits there.
 
     :param player_name: Name of player
+    :param columns: Board columns
+    :param rows: Board rows
+    :param win_length: Discs in a row needed to win
+    :param account_id: Account id of the player, players without one are not rated
     :return: GameSession object and connected player object
     :rtype: tuple
-    :raises Exception: if no available sessions
+    :raises Exception: if no available sessions or invalid board geometry
     """
 
-    for session in game_sessions[:]:
-        if session.waiting_for_players:
-            return session, session.add_player(player_name)
+    validate_board_config(columns, rows, win_length)
+    pool = matchmaking.pool({'columns': columns, 'rows': rows, 'win_length': win_length})
+    rating = ratings.rating(account_id)
+
+    with session_lock:
+        # A player connecting again while waiting gets their waiting session back, not a second one
+        session = account_id is not None and pool.waiting_session(account_id)
+        if session:
+            return session, session.player_1
+
+        session = pool.find(rating)
+        if session:
+            player = session.add_player(player_name, account_id)
+            known_players.add(player.player_uuid)
+            pool.remove(session)
+            return session, player
+
+        session = game_sessions.take_free()
+        if session is not None:
+            session.board = Board(session.DISCS, columns, rows, win_length)
+            player = session.add_player(player_name, account_id)
+            known_players.add(player.player_uuid)
+            pool.add(rating, session)
+            return session, player
 
     raise Exception('Could not find available session for player to join. Max sessions reached')
 
 
+def record_game_over(game_session):
+    """
+    Update the ratings of the players of a game that is over and archive it
+
+    :param game_session: Game session after a move or forfeit
+    :type game_session: game_server.game_session.GameSession
+    """
+    if game_session.state in GameSession.GAME_OVER_STATES:
+        ratings.record_game(game_session)
+        archive.record(game_session)
+
+
+def restore_game_sessions(restored_sessions):
+    """
+    Replace the game sessions with restored ones. Waiting players are queued for matchmaking again and games in
+    progress get a new turn deadline.
+
+    :param restored_sessions: Sessions from a snapshot
+    :type restored_sessions: list
+    """
+    with session_lock:
+        game_sessions.replace(restored_sessions)
+        for game_session in restored_sessions:
+            known_players.update(player.player_uuid for player in game_session.players)
+            if game_session.state == GameSession.READY:
+                turn_deadlines.start_turn(game_session)
+            elif game_session.player_1 and game_session.waiting_for_players:
+                pool = matchmaking.pool(game_session.board.board_details())
+                pool.add(ratings.rating(game_session.player_1.account_id), game_session)
+
+
 def get_game_session(session_id):
     """
     Get game_server session by id
@@ -106,8 +419,12 @@ def get_game_session(session_id):
     :rtype: game.game_session.GameSession
     """
 
-    for session in game_sessions:
-        if session_id == session.game_id:
-            return session
+    try:
+        game_uuid = UUID(session_id).bytes
+    except (TypeError, ValueError, AttributeError):
+        raise Exception('Game session not found')
 
-    raise Exception('Game session not found')
\ No newline at end of file
+    session = game_sessions.get(game_uuid)
+    if session is None:
+        raise Exception('Game session not found')
+    return session
\ No newline at end of file
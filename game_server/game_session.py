@@ -1,14 +1,33 @@
 
-from uuid import uuid4
-from numpy import transpose, array, diagonal, flip
+from threading import Lock
+from time import time
+from uuid import uuid4, UUID
+from .logs import log_event
+
+# Held while a game session changes, so a move and a forfeit of the same turn cannot interleave and snapshots only see
+# whole changes
+session_lock = Lock()
 
 
 class Player:
 
-    def __init__(self, player_name, disc):
+    __slots__ = ('player_name', 'disc', 'player_uuid', 'account_id')
+
+    def __init__(self, player_name, disc, account_id=None):
         self.player_name = player_name
         self.disc = disc
-        self.player_id = str(uuid4())
+        self.player_uuid = uuid4().bytes
+        # Persistent 16 byte identity the player is rated by, see game_server.ratings
+        self.account_id = account_id
+
+    @property
+    def player_id(self):
+        """
+        Player id as a uuid string. Stored as 16 bytes.
+        :rtype: str
+        """
+
+        return str(UUID(bytes=self.player_uuid))
 
     def player_details(self):
 
@@ -19,13 +38,86 @@ class Board:
 
     COLUMNS = 9
     ROWS = 6
+    WIN_LENGTH = 5
+    MAX_DIMENSION = 100
+    EMPTY = '_'
+    # (column step, row step) for vertical, horizontal and both diagonal lines
+    DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1))
+
+    # Discs are stored as one bitmask per player. Cell (col, row) is bit col * rows + row with row 0 at the bottom.
+    __slots__ = ('valid_discs', 'columns', 'rows', 'win_length', 'masks', 'heights', 'moves', 'turns', 'last_disc',
+                 'last_col', 'version', 'line_counts', 'undone')
 
-    def __init__(self, valid_discs):
+    def __init__(self, valid_discs, columns=COLUMNS, rows=ROWS, win_length=WIN_LENGTH):
 
+        validate_board_config(columns, rows, win_length)
         self.valid_discs = valid_discs
-        self.board_matrix = array([['_'] * self.ROWS for _ in range(self.COLUMNS)])
+        self.columns = columns
+        self.rows = rows
+        self.win_length = win_length
+        self.masks = (0, 0)
+        self.heights = bytearray(columns)
+        # Columns of the moves in order. Allocated by the first move, most sessions sit idle without one.
+        self.moves = None
         self.turns = 0
         self.last_disc = None
+        self.last_col = None
+        # Incremented on every change of the board
+        self.version = 0
+        # Built on first use by lines()
+        self.line_counts = None
+        # Undone moves, the last undone at the end, as col * 2 + disc index. Allocated by the first undo and
+        # cleared by drop_disc.
+        self.undone = None
+
+    @classmethod
+    def from_masks(cls, valid_discs, columns, rows, win_length, masks):
+        """
+        Build a board from player bitmasks. The order of the moves is not known.
+
+        :param masks: Bitmask per valid disc
+        :type masks: tuple
+        :return: Board with the discs of masks
+        :rtype: Board
+        """
+
+        board = cls(valid_discs, columns, rows, win_length)
+        board.masks = tuple(masks)
+        occupied = masks[0] | masks[1]
+        column_mask = (1 << rows) - 1
+        for col in range(columns):
+            board.heights[col] = bin(occupied >> (col * rows) & column_mask).count('1')
+
+        disc_counts = [bin(mask).count('1') for mask in masks]
+        board.turns = sum(disc_counts)
+        if board.turns:
+            board.last_disc = valid_discs[0] if disc_counts[0] > disc_counts[1] else valid_discs[1]
+        return board
+
+    @property
+    def last_move(self):
+        """
+        Position of the last dropped disc
+        :return: (col, row) with row 0 at the bottom or None if no disc dropped
+        :rtype: tuple or None
+        """
+
+        if self.last_col is None:
+            return None
+        return self.last_col, self.heights[self.last_col] - 1
+
+    def get_disc(self, col, row):
+        """
+        Disc at (col, row), row 0 being the bottom of the board
+        :return: Disc or EMPTY
+        :rtype: str
+        """
+
+        bit = col * self.rows + row
+        for disc, mask in zip(self.valid_discs, self.masks):
+            if mask >> bit & 1:
+                return disc
+        return self.EMPTY
 
     def drop_disc(self, col, disc):
         """
@@ -40,82 +132,182 @@ class Board:
         if disc not in self.valid_discs or disc == self.last_disc:
             raise Exception(f'Invalid disc: {disc}')
 
-        if col in range(self.COLUMNS):
-            try:
-                insert_index = ''.join(self.board_matrix[col]).rindex('_')
-                self.board_matrix[col][insert_index] = disc
-                self.last_disc = disc
-            except ValueError:
+        if col in range(self.columns):
+            if self.heights[col] == self.rows:
                 raise Exception(f'No space left in column: {col}')
+            self._place(col, self.valid_discs.index(disc))
+            self.undone = None
         else:
             raise Exception(f'Invalid column: {col}')
 
+    def _place(self, col, player):
+        row = self.heights[col]
+        bit = 1 << (col * self.rows + row)
+        mask_1, mask_2 = self.masks
+        self.masks = (mask_1 | bit, mask_2) if player == 0 else (mask_1, mask_2 | bit)
+        self.heights[col] = row + 1
+        if self.moves is None:
+            self.moves = bytearray()
+        self.moves.append(col)
+        self.last_disc = self.valid_discs[player]
+        self.last_col = col
+        self.turns += 1
+        self.version += 1
+        if self.line_counts is not None:
+            self.line_counts.add(col * self.rows + row, player)
+
+    def undo(self):
+        """
+        Take back the last move. Only the bits of the last move are touched, so undo is O(1).
+        :return: Column of the move taken back
+        :rtype: int
+        :raises Exception: If there is no move to take back
+        """
+
+        if not self.moves:
+            raise Exception('No move to undo')
+
+        col = self.moves.pop()
+        player = self.valid_discs.index(self.last_disc)
+        row = self.heights[col] - 1
+        bit = 1 << (col * self.rows + row)
+        mask_1, mask_2 = self.masks
+        self.masks = (mask_1 & ~bit, mask_2) if player == 0 else (mask_1, mask_2 & ~bit)
+        self.heights[col] = row
+        self.turns -= 1
+        # Discs alternate so the previous move was the other player's
+        self.last_disc = self.valid_discs[1 - player] if self.turns else None
+        self.last_col = self.moves[-1] if self.moves else None
+        self.version += 1
+        if self.line_counts is not None:
+            self.line_counts.remove(col * self.rows + row, player)
+        if self.undone is None:
+            self.undone = bytearray()
+        self.undone.append(col * 2 + player)
+        return col
+
+    def redo(self):
+        """
+        Replay the last move taken back by undo
+        :return: Column of the move replayed
+        :rtype: int
+        :raises Exception: If there is no move to replay
+        """
+
+        if not self.undone:
+            raise Exception('No move to redo')
+
+        col, player = divmod(self.undone.pop(), 2)
+        self._place(col, player)
+        return col
+
+    def clone(self):
+        """
+        Copy of the board that can be changed independently. The discs and geometry are immutable and shared,
+        only the small per column and move arrays are copied.
+        :rtype: Board
+        """
+
+        board = Board.__new__(Board)
+        board.valid_discs = self.valid_discs
+        board.columns = self.columns
+        board.rows = self.rows
+        board.win_length = self.win_length
+        board.masks = self.masks
+        board.heights = self.heights[:]
+        board.moves = None if self.moves is None else self.moves[:]
+        board.turns = self.turns
+        board.last_disc = self.last_disc
+        board.last_col = self.last_col
+        board.version = self.version
+        board.line_counts = None if self.line_counts is None else self.line_counts.copy()
+        board.undone = None if self.undone is None else self.undone[:]
+        return board
+
     def check_for_winner(self):
         """
-        Check for vertical, horizontal or diagonal 5 in a row.
+        Check the lines through the last dropped disc for win_length in a row.
+        Only the last move can complete a line so the cost depends on win_length, not on the board area.
         :return: Winning disc if winner found else None
         :rtype: str or None
         """
 
-        winner = self.check_rows_and_cols()
+        if self.last_col is None:
+            return None
 
-        return winner if winner else self.check_diagonals()
+        col, row = self.last_move
+        mask = self.masks[self.valid_discs.index(self.last_disc)]
 
-    def check_diagonals(self):
+        for col_step, row_step in self.DIRECTIONS:
+            connected = 1 + self.count_discs_in_direction(mask, col, row, col_step, row_step) + \
+                self.count_discs_in_direction(mask, col, row, -col_step, -row_step)
+            if connected >= self.win_length:
+                return self.last_disc
+
+    def count_discs_in_direction(self, mask, col, row, col_step, row_step):
         """
-        Get board diagonals from the board using numpy.diagonal.
-        Need to extract left to right diagonals and right to left diagonals of 5 or greater.
-        :return:
+        Count consecutive discs of mask from (col, row) in one direction, excluding the starting cell.
+        Counting stops after win_length - 1 discs as a longer run cannot change the result.
+
+        :return: Number of consecutive matching discs
+        :rtype: int
         """
-        board = transpose(self.board_matrix)
-        horizontal_flip_board = flip(board) # flip board to extract right to left diagonal
-        diagonals = []
 
-        for i in range(-1, 5): # Only diagonals greater than len 4
-            diagonals.append(diagonal(board, i))
-            diagonals.append(diagonal(horizontal_flip_board))
+        count = 0
+        col, row = col + col_step, row + row_step
+        while count < self.win_length - 1 and 0 <= col < self.columns and 0 <= row < self.rows \
+                and mask >> (col * self.rows + row) & 1:
+            count += 1
+            col, row = col + col_step, row + row_step
 
-        for diag in diagonals:
-            winner = self.check_if_line_has_five_in_a_row(list(diag))
-            if winner:
-                print('Winner by connecting a diagonal')
-                return winner
+        return count
 
-    def check_rows_and_cols(self):
+    def lines(self):
         """
-        Check rows and columns for 5 in a row.
-        :return: Winning disc if winner found else none
-        :rtype: str or None
+        Line counters of the board, built from the discs on the board on first use and updated on every drop after
+        :rtype: game_server.lines.LineCounts
         """
 
-        for col in self.board_matrix:
-            winner = self.check_if_line_has_five_in_a_row(list(col))
-            if winner:
-                print('Winner by connecting a column')
-                return winner
+        if self.line_counts is None:
+            from .lines import LineCounts, window_table
+            self.line_counts = LineCounts(window_table(self.columns, self.rows, self.win_length), self.masks)
+        return self.line_counts
 
-        for row in transpose(self.board_matrix):
-            winner = self.check_if_line_has_five_in_a_row(list(row))
-            if winner:
-                print('Winner by connecting a row')
-                return winner
+    def legal_moves(self):
+        """
+        :return: Columns that are not full
+        :rtype: list
+        """
 
-    def check_if_line_has_five_in_a_row(self, line):
+        return [col for col in range(self.columns) if self.heights[col] < self.rows]
+
+    def winning_moves(self, disc):
+        """
+        Columns where dropping disc wins immediately
+        :rtype: list
         """
-        Check each list for 5 consecutive discs.
-        If the line contains 'XXXXX' or 'OOOOO' then we have a winner.
 
-        :param line: line of discs to check.
-        :type line: list
-        :return: Winning disc if winner found else None
-        :rtype: str or None
+        lines, player = self.lines(), self.valid_discs.index(disc)
+        return [col for col in self.legal_moves() if lines.completes_line(col * self.rows + self.heights[col], player)]
+
+    def threats(self, disc):
+        """
+        Empty cells anywhere on the board where disc would complete a line
+        :return: (col, row) cells
+        :rtype: list
         """
 
-        line_as_string = ''.join(line)
+        cells = self.lines().threat_cells(self.valid_discs.index(disc), self.masks)
+        return [divmod(cell, self.rows) for cell in cells]
 
-        for disc in self.valid_discs:
-            if disc*5 in line_as_string:
-                return disc
+    def board_details(self):
+        """
+        Board geometry details
+        :return: Board dimensions and win length
+        :rtype: dict
+        """
+
+        return {'columns': self.columns, 'rows': self.rows, 'win_length': self.win_length}
 
     def __str__(self):
         """
@@ -123,22 +315,75 @@ class Board:
         :return: String of board
         :rtype: str
         """
-        return ' ' + str(transpose(self.board_matrix))[1:-1] + '\n\n   1   2   3   4   5   6   7   8   9  '
+        rows = ('[' + ' '.join(f"'{self.get_disc(col, row)}'" for col in range(self.columns)) + ']'
+                for row in reversed(range(self.rows)))
+        column_numbers = ''.join(f'{col:>4}' for col in range(1, self.columns + 1))
+
+        return ' ' + '\n '.join(rows) + '\n\n' + column_numbers + '  '
+
+
+def validate_board_config(columns, rows, win_length):
+    """
+    Validate board geometry.
+    :raises Exception: If the board cannot be built or can never be won.
+    """
+
+    for name, value in (('columns', columns), ('rows', rows), ('win_length', win_length)):
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise Exception(f'Invalid {name}: {value}')
+
+    if not (1 <= columns <= Board.MAX_DIMENSION and 1 <= rows <= Board.MAX_DIMENSION):
+        raise Exception(f'Invalid board size: {columns}x{rows}. Max size is {Board.MAX_DIMENSION}x{Board.MAX_DIMENSION}')
+
+    if not 2 <= win_length <= max(columns, rows):
+        raise Exception(f'Invalid win length: {win_length} for a {columns}x{rows} board')
 
 
 class GameSession:
 
-    STATE = 'WAITING FOR PLAYERS'
+    WAITING = 'WAITING FOR PLAYERS'
+    READY = 'READY'
+    WINNER = 'WINNER'
+    FORFEIT = 'FORFEIT'
+    GAME_OVER_STATES = (WINNER, FORFEIT)
     PlAYER_1_DISC = 'X'
     PlAYER_2_DISC = 'O'
+    DISCS = (PlAYER_1_DISC, PlAYER_2_DISC)
 
-    def __init__(self):
-        self.game_id = str(uuid4())
+    __slots__ = ('game_uuid', 'player_1', 'player_2', 'board', 'winner', 'state', 'turn_timer', 'started_at',
+                 'revision', 'takeback')
+
+    def __init__(self, columns=Board.COLUMNS, rows=Board.ROWS, win_length=Board.WIN_LENGTH):
+        self.game_uuid = uuid4().bytes
         self.player_1 = None
         self.player_2 = None
-        self.players = []
-        self.board = Board([self.PlAYER_1_DISC, self.PlAYER_2_DISC])
+        self.board = Board(self.DISCS, columns, rows, win_length)
         self.winner = None
+        self.state = self.WAITING
+        self.turn_timer = None
+        self.started_at = None
+        # Incremented on every change of the session outside the board
+        self.revision = 0
+        # (player_id, board version) of a pending takeback request
+        self.takeback = None
+
+    @property
+    def game_id(self):
+        """
+        Game id as a uuid string. Stored as 16 bytes.
+        :rtype: str
+        """
+
+        return str(UUID(bytes=self.game_uuid))
+
+    @property
+    def players(self):
+        """
+        Players that have joined
+        :rtype: list
+        """
+
+        return [player for player in (self.player_1, self.player_2) if player]
 
     @property
     def waiting_for_players(self):
@@ -150,26 +395,40 @@ class GameSession:
 
         return not (self.player_1 and self.player_2)
 
-    def add_player(self, player_name):
+    @property
+    def version(self):
+        """
+        Changes whenever the game details change
+        :rtype: tuple
+        """
+
+        return self.revision, self.board.version
+
+    def add_player(self, player_name, account_id=None):
         """
         Add player to game_server session
         :param player_name: Name of player to add.
         :type player_name: str
+        :param account_id: Account id of the player, see game_server.ratings
+        :type account_id: bytes
         :return: Player added
         """
 
         if self.waiting_for_players:
             if not self.player_1:
-                print('Player 1 added')
-                self.player_1 = Player(player_name, self.PlAYER_1_DISC)
-                self.players.append(self.player_1)
+                self.player_1 = Player(player_name, self.PlAYER_1_DISC, account_id)
+                self.revision += 1
+                log_event('player_joined', game_id=self.game_id, player_id=self.player_1.player_id, player_number=1)
                 return self.player_1
             else:
+                if account_id is not None and account_id == self.player_1.account_id:
+                    raise Exception('Cannot play against yourself.')
                 if self.player_1.player_name != player_name:
-                    self.player_2 = Player(player_name, self.PlAYER_2_DISC)
-                    self.players.append(self.player_2)
-                    print('Player 2 added')
-                    self.STATE = 'READY'
+                    self.player_2 = Player(player_name, self.PlAYER_2_DISC, account_id)
+                    log_event('player_joined', game_id=self.game_id, player_id=self.player_2.player_id, player_number=2)
+                    self.state = self.READY
+                    self.started_at = time()
+                    self.revision += 1
                     return self.player_2
                 else:
                     raise Exception(f'Name: {player_name} already in use.')
@@ -185,8 +444,94 @@ class GameSession:
         player_details = [player.player_details() for player in self.players]
         player_turn = None if self.waiting_for_players else self.next_player_turn()
 
-        return {'game_id': self.game_id, 'state': self.STATE, 'players': player_details,
-                'game_board': str(self.board), 'player_turn':  player_turn, 'winner': self.winner}
+        return {'game_id': self.game_id, 'state': self.state, 'players': player_details,
+                'game_board': str(self.board), 'player_turn':  player_turn, 'winner': self.winner,
+                'takeback_requested_by': self.takeback_requested_by(), **self.board.board_details()}
+
+    def hint(self):
+        """
+        Analysis of the position for the player to move, from the board's line counters. Columns are 0 based.
+        Winning moves win immediately, forced blocks are the columns where the opponent would win next.
+        Threats are the empty cells anywhere on the board that would complete a line of each player.
+
+        :return: Hint details
+        :rtype: dict
+        """
+        board = self.board
+        hint = {'game_id': self.game_id, 'player_turn': None, 'legal_moves': [], 'winning_moves': [],
+                'forced_blocks': [],
+                'threats': {player.player_id: [list(cell) for cell in board.threats(player.disc)]
+                            for player in self.players}}
+
+        if self.state == self.READY:
+            player_turn = self.next_player_turn()
+            player, opponent = self.player_1, self.player_2
+            if player.player_id != player_turn:
+                player, opponent = opponent, player
+            hint.update(player_turn=player_turn, legal_moves=board.legal_moves(),
+                        winning_moves=board.winning_moves(player.disc), forced_blocks=board.winning_moves(opponent.disc))
+        return hint
+
+    def takeback_requested_by(self):
+        """
+        Player waiting for an answer to a takeback request. A request lapses when the board changes.
+        :return: Player ID or None
+        :rtype: str or None
+        """
+        if self.takeback is None or self.takeback[1] != self.board.version:
+            return None
+        return self.takeback[0]
+
+    def request_takeback(self, player_id):
+        """
+        Ask the opponent to take back the last move of player_id, and the opponent's reply if there is one
+
+        :param player_id: Player asking
+        :type player_id: str
+        :raises Exception: If the game is not in progress or the player has no move to take back
+        """
+        if self.state != self.READY:
+            raise Exception(f'Game is not in progress: {self.state}')
+        player = self._player(player_id)
+        if self.takeback_requested_by():
+            raise Exception('Takeback already requested')
+        if not self.board.moves or (self.board.last_disc != player.disc and len(self.board.moves) < 2):
+            raise Exception(f'No move to take back: {player_id}')
+
+        self.takeback = (player_id, self.board.version)
+        self.revision += 1
+        log_event('takeback_requested', game_id=self.game_id, player_id=player_id)
+
+    def answer_takeback(self, player_id, accept):
+        """
+        Accept or decline the opponent's takeback request. Accepted moves are undone so it is the requester's turn.
+
+        :param player_id: Player answering
+        :type player_id: str
+        :param accept: Take the moves back?
+        :type accept: bool
+        :raises Exception: If there is no request to answer
+        """
+        requested_by = self.takeback_requested_by()
+        if self.state != self.READY or requested_by is None:
+            raise Exception('No takeback requested')
+        if self._player(player_id).player_id == requested_by:
+            raise Exception('Takeback must be answered by the opponent')
+
+        requester = self._player(requested_by)
+        if accept:
+            self.board.undo()
+            if self.board.last_disc == requester.disc:
+                self.board.undo()
+        self.takeback = None
+        self.revision += 1
+        log_event('takeback_answered', game_id=self.game_id, player_id=player_id, accepted=accept)
+
+    def _player(self, player_id):
+        for player in self.players:
+            if player.player_id == player_id:
+                return player
+        raise Exception(f'Player not in game: {player_id}')
 
     def next_player_turn(self):
         """
@@ -209,7 +554,73 @@ class GameSession:
         winning_disc = self.board.check_for_winner()
 
         if winning_disc:
-            self.STATE = 'WINNER'
+            self.state = self.WINNER
             self.winner = self.player_1.player_id if winning_disc == self.player_1.disc else self.player_2.player_id
+            self.revision += 1
+            log_event('game_won', game_id=self.game_id, player_id=self.winner, turns=self.board.turns)
+
+    def forfeit_turn(self):
+        """
+        The player whose turn it is missed their deadline and forfeits. The opponent wins.
+        """
+        if self.state != self.READY:
+            return
+
+        forfeiting_player = self.next_player_turn()
+        self.state = self.FORFEIT
+        self.winner = self.player_2.player_id if forfeiting_player == self.player_1.player_id else self.player_1.player_id
+        self.revision += 1
+
+
+class SessionTable:
+    """
+    Game sessions of a server. Sessions are found by game uuid in a dict and empty sessions are handed out from a free
+    list, so neither a lookup nor a connect scans the sessions. Change it with session_lock held.
+    """
+
+    def __init__(self, game_sessions=()):
+        self.sessions = []
+        self.by_uuid = {}
+        # Empty sessions, the next one handed out at the end
+        self.free = []
+        self.replace(game_sessions)
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def __iter__(self):
+        return iter(self.sessions)
+
+    def __getitem__(self, index):
+        return self.sessions[index]
+
+    def replace(self, game_sessions):
+        """Replace all sessions, e.g. with the sessions of a snapshot"""
+        self.sessions = list(game_sessions)
+        self.by_uuid = {game_session.game_uuid: game_session for game_session in self.sessions}
+        self.free = [game_session for game_session in reversed(self.sessions) if not game_session.players]
+
+    def get(self, game_uuid):
+        """
+        :param game_uuid: 16 byte game uuid
+        :return: Session of the game or None
+        :rtype: GameSession or None
+        """
+
+        return self.by_uuid.get(game_uuid)
+
+    def take_free(self):
+        """
+        Take an empty session off the free list for a new player
+
+        :return: Empty session or None if all are taken
+        :rtype: GameSession or None
+        """
 
+        return self.free.pop() if self.free else None
 
+    def change_uuid(self, game_session, game_uuid):
+        """Give game_session a new game uuid, e.g. one minted for a shard"""
+        del self.by_uuid[game_session.game_uuid]
+        game_session.game_uuid = game_uuid
+        self.by_uuid[game_uuid] = game_session
@@ -0,0 +1,136 @@
+"""
+Incremental line counters for threat analysis.
+
+A window is one of the win_length long lines of cells that can be won on a board. The windows of a board geometry are
+computed once and shared by all boards of that geometry. LineCounts keeps, per player, the number of discs in each
+window and the set of open threats: windows one disc short of a win that the opponent has not blocked. Dropping a disc
+only updates the windows through its cell, at most 4 * win_length of them.
+"""
+from functools import lru_cache
+
+from .game_session import Board
+
+
+class WindowTable:
+
+    __slots__ = ('columns', 'rows', 'win_length', 'windows', 'cell_windows')
+
+    def __init__(self, columns, rows, win_length):
+        self.columns = columns
+        self.rows = rows
+        self.win_length = win_length
+
+        windows = []
+        for col_step, row_step in Board.DIRECTIONS:
+            for col in range(columns):
+                for row in range(rows):
+                    end_col = col + col_step * (win_length - 1)
+                    end_row = row + row_step * (win_length - 1)
+                    if 0 <= end_col < columns and 0 <= end_row < rows:
+                        windows.append(tuple((col + col_step * step) * rows + row + row_step * step
+                                             for step in range(win_length)))
+        # Cells are bit indexes: col * rows + row
+        self.windows = tuple(windows)
+
+        cell_windows = [[] for _ in range(columns * rows)]
+        for index, window in enumerate(windows):
+            for cell in window:
+                cell_windows[cell].append(index)
+        self.cell_windows = tuple(tuple(indexes) for indexes in cell_windows)
+
+
+@lru_cache(maxsize=None)
+def window_table(columns, rows, win_length):
+    """
+    Shared window table of a board geometry
+    :rtype: WindowTable
+    """
+
+    return WindowTable(columns, rows, win_length)
+
+
+class LineCounts:
+
+    __slots__ = ('table', 'counts', 'threats')
+
+    def __init__(self, table, masks=(0, 0)):
+        """
+        :param table: Window table of the board geometry
+        :type table: WindowTable
+        :param masks: Bitmask per player of the discs already on the board
+        """
+
+        self.table = table
+        self.counts = (bytearray(len(table.windows)), bytearray(len(table.windows)))
+        # Window indexes per player
+        self.threats = (set(), set())
+        for player, mask in enumerate(masks):
+            for cell in range(table.columns * table.rows):
+                if mask >> cell & 1:
+                    self.add(cell, player)
+
+    def copy(self):
+        """
+        Copy sharing the window table
+        :rtype: LineCounts
+        """
+
+        line_counts = LineCounts.__new__(LineCounts)
+        line_counts.table = self.table
+        line_counts.counts = tuple(counts[:] for counts in self.counts)
+        line_counts.threats = tuple(set(threats) for threats in self.threats)
+        return line_counts
+
+    def add(self, cell, player):
+        """
+        Count a disc of player (0 or 1) dropped into cell
+        """
+
+        counts, opponent_counts = self.counts[player], self.counts[1 - player]
+        threats, opponent_threats = self.threats[player], self.threats[1 - player]
+        threat_count = self.table.win_length - 1
+        for window in self.table.cell_windows[cell]:
+            counts[window] += 1
+            opponent_threats.discard(window)
+            if counts[window] == threat_count and not opponent_counts[window]:
+                threats.add(window)
+            else:
+                threats.discard(window)
+
+    def remove(self, cell, player):
+        """
+        Uncount a disc of player (0 or 1) taken out of cell
+        """
+
+        counts = self.counts[player]
+        threat_count = self.table.win_length - 1
+        for window in self.table.cell_windows[cell]:
+            counts[window] -= 1
+            for threat_player in (0, 1):
+                own, other = self.counts[threat_player], self.counts[1 - threat_player]
+                if own[window] == threat_count and not other[window]:
+                    self.threats[threat_player].add(window)
+                else:
+                    self.threats[threat_player].discard(window)
+
+    def completes_line(self, cell, player):
+        """
+        Would a disc of player in cell win?
+        :rtype: bool
+        """
+
+        threats = self.threats[player]
+        return any(window in threats for window in self.table.cell_windows[cell])
+
+    def threat_cells(self, player, masks):
+        """
+        Empty cells that would complete a line of player
+
+        :param masks: Bitmask per player of the discs on the board
+        :return: Sorted cell indexes
+        :rtype: list
+        """
+
+        occupied = masks[0] | masks[1]
+        return sorted({cell for window in self.threats[player] for cell in self.table.windows[window]
+                       if not occupied >> cell & 1})
@@ -0,0 +1,157 @@
+"""
+Structured, non-blocking logging for the game server.
+Request threads only enqueue the record, a background listener thread formats it and does the (possibly slow) write.
+High volume events can be sampled and rate limited before they are enqueued.
+"""
+import atexit
+import json
+import logging
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from queue import Queue, Full
+from threading import Lock
+from time import monotonic
+
+LOGGER_NAME = 'connect5'
+QUEUE_SIZE = 10000
+DEFAULT_SAMPLE_RATES = {'disc_dropped': 0.1}
+DEFAULT_RATE_LIMITS = {'disc_dropped': 100}
+
+logger = logging.getLogger(LOGGER_NAME)
+_listener = None
+
+
+def log_event(event, level=logging.INFO, **fields):
+    """
+    Log a structured event e.g. log_event('player_joined', game_id=..., player_id=...)
+
+    :param event: Event type
+    :type event: str
+    :param level: Logging level
+    :type level: int
+    :param fields: Event fields such as game_id and player_id
+    """
+
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={'event': event, 'fields': fields})
+
+
+class StructuredFormatter(logging.Formatter):
+
+    def format(self, record):
+        """
+        Format record as a single JSON line
+        :rtype: str
+        """
+
+        entry = {'time': record.created, 'level': record.levelname, 'event': getattr(record, 'event', record.getMessage())}
+        entry.update(getattr(record, 'fields', {}))
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+
+    def __init__(self, sample_rates=None, rate_limits=None):
+        """
+        :param sample_rates: Fraction of records to keep per event type e.g. {'disc_dropped': 0.1}
+        :type sample_rates: dict
+        :param rate_limits: Max records per second per event type e.g. {'disc_dropped': 100}
+        :type rate_limits: dict
+        """
+        super().__init__()
+        self.sample_rates = sample_rates or {}
+        self.rate_limits = rate_limits or {}
+        self._buckets = {}
+        self._lock = Lock()
+
+    def filter(self, record):
+        event = getattr(record, 'event', None)
+
+        sample_rate = self.sample_rates.get(event)
+        if sample_rate is not None and random.random() >= sample_rate:
+            return False
+
+        rate_limit = self.rate_limits.get(event)
+        if rate_limit is not None:
+            return self.take_token(event, rate_limit)
+
+        return True
+
+    def take_token(self, event, rate_limit):
+        """
+        Token bucket allowing bursts of up to one second of records.
+        :return: True if the record is within the rate limit
+        :rtype: bool
+        """
+
+        now = monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(event, (rate_limit, now))
+            tokens = min(rate_limit, tokens + (now - last) * rate_limit)
+            allowed = tokens >= 1
+            self._buckets[event] = (tokens - 1 if allowed else tokens, now)
+        return allowed
+
+
+class DroppingQueueHandler(QueueHandler):
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Formatting happens on the listener thread, nothing to prepare on the request thread
+        return record
+
+    def enqueue(self, record):
+        """Drop the record rather than block when the writer has fallen behind"""
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            self.dropped += 1
+
+
+def setup_logging(stream=None, level=logging.INFO, sample_rates=None, rate_limits=None):
+    """
+    Route the connect5 logger through a queue to a background writer.
+    Calling again replaces the previous configuration.
+
+    :param stream: Output stream, stdout by default
+    :param level: Minimum level to log
+    :param sample_rates: Fraction of records to keep per event type
+    :param rate_limits: Max records per second per event type
+    :return: Listener writing records in the background
+    :rtype: logging.handlers.QueueListener
+    """
+    global _listener
+
+    stop_logging()
+
+    log_queue = Queue(QUEUE_SIZE)
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(DEFAULT_SAMPLE_RATES if sample_rates is None else sample_rates,
+                                           DEFAULT_RATE_LIMITS if rate_limits is None else rate_limits))
+
+    stream_handler = logging.StreamHandler(stream or sys.stdout)
+    stream_handler.setFormatter(StructuredFormatter())
+
+    logger.handlers = [queue_handler]
+    logger.setLevel(level)
+    logger.propagate = False
+
+    _listener = QueueListener(log_queue, stream_handler)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """Flush queued records and stop the background writer"""
+    global _listener
+
+    if _listener:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
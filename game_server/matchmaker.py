@@ -0,0 +1,156 @@
+"""
+Rating based matchmaking.
+Waiting players are kept in buckets of BUCKET_WIDTH rating points, oldest first, with the bucket keys in a sorted list.
+An arriving player is matched with the oldest waiting player, in the nearest bucket, whose search window covers them.
+A waiting player's window widens the longer they wait. Only the buckets within MAX_WINDOW are looked at, so a match
+costs a binary search plus a scan of the players waiting in a constant number of buckets.
+Tickets are also indexed by account so a player connecting again finds the session they already wait in.
+"""
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+
+BUCKET_WIDTH = 50
+BASE_WINDOW = 100
+WINDOW_GROWTH = 10  # rating points per second waited
+MAX_WINDOW = 1000
+
+
+class Ticket:
+
+    __slots__ = ('rating', 'game_session', 'created', 'bucket_key')
+
+    def __init__(self, rating, game_session, created, bucket_key):
+        self.rating = rating
+        self.game_session = game_session
+        self.created = created
+        self.bucket_key = bucket_key
+
+    def window(self, now):
+        """
+        Rating difference this player accepts after waiting until now
+        :rtype: float
+        """
+
+        return min(MAX_WINDOW, BASE_WINDOW + WINDOW_GROWTH * (now - self.created))
+
+
+def account_of(game_session):
+    """
+    :return: Account id of the waiting player of game_session or None
+    :rtype: bytes or None
+    """
+
+    return game_session.player_1.account_id if game_session.player_1 else None
+
+
+class Matchmaker:
+
+    def __init__(self, clock=monotonic):
+        self.clock = clock
+        self.buckets = {}
+        self.bucket_keys = []
+        self.tickets = {}
+        # Account id of the waiting player: game session
+        self.accounts = {}
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self.tickets)
+
+    def add(self, rating, game_session):
+        """
+        Queue the waiting player of game_session
+
+        :param rating: Rating of the waiting player
+        :param game_session: Session the player is waiting in
+        :rtype: Ticket
+        """
+
+        with self._lock:
+            bucket_key = int(rating // BUCKET_WIDTH)
+            ticket = Ticket(rating, game_session, self.clock(), bucket_key)
+            bucket = self.buckets.get(bucket_key)
+            if bucket is None:
+                bucket = self.buckets[bucket_key] = OrderedDict()
+                insort(self.bucket_keys, bucket_key)
+            bucket[game_session.game_uuid] = ticket
+            self.tickets[game_session.game_uuid] = ticket
+            account_id = account_of(game_session)
+            if account_id is not None:
+                self.accounts[account_id] = game_session
+            return ticket
+
+    def remove(self, game_session):
+        """Remove the ticket of game_session, if queued"""
+        with self._lock:
+            ticket = self.tickets.pop(game_session.game_uuid, None)
+            if ticket is None:
+                return
+            account_id = account_of(game_session)
+            if account_id is not None and self.accounts.get(account_id) is game_session:
+                del self.accounts[account_id]
+            bucket = self.buckets[ticket.bucket_key]
+            del bucket[game_session.game_uuid]
+            if not bucket:
+                del self.buckets[ticket.bucket_key]
+                del self.bucket_keys[bisect_left(self.bucket_keys, ticket.bucket_key)]
+
+    def waiting_session(self, account_id):
+        """
+        :param account_id: Account id of a player
+        :return: Game session the player is queued in or None
+        :rtype: game_server.game_session.GameSession or None
+        """
+
+        return self.accounts.get(account_id)
+
+    def find(self, rating):
+        """
+        Find an opponent for a player. The ticket stays queued until removed.
+
+        :param rating: Rating of the arriving player
+        :return: Game session of the best waiting opponent or None
+        :rtype: game_server.game_session.GameSession or None
+        """
+
+        now = self.clock()
+        home_key = int(rating // BUCKET_WIDTH)
+        max_distance = MAX_WINDOW // BUCKET_WIDTH + 1
+
+        with self._lock:
+            start = bisect_left(self.bucket_keys, home_key - max_distance)
+            end = bisect_left(self.bucket_keys, home_key + max_distance + 1)
+            candidate_keys = sorted(self.bucket_keys[start:end], key=lambda key: abs(key - home_key))
+
+            for bucket_key in candidate_keys:
+                # The oldest ticket has the widest window but may be rated further away than a newer one
+                for ticket in self.buckets[bucket_key].values():
+                    if abs(ticket.rating - rating) <= ticket.window(now):
+                        return ticket.game_session
+        return None
+
+
+class MatchmakingPools:
+
+    def __init__(self, clock=monotonic):
+        self.clock = clock
+        self.pools = {}
+
+    def pool(self, board_config):
+        """
+        Matchmaker of players waiting for a board geometry
+
+        :param board_config: Board geometry dict from Board.board_details
+        :rtype: Matchmaker
+        """
+
+        key = (board_config['columns'], board_config['rows'], board_config['win_length'])
+        pool = self.pools.get(key)
+        if pool is None:
+            pool = self.pools.setdefault(key, Matchmaker(self.clock))
+        return pool
+
+
+matchmaking = MatchmakingPools()
@@ -0,0 +1,74 @@
+"""
+Server provided polling hints.
+Responses carry a Retry-After header (whole seconds) and a more precise X-Poll-Interval header (seconds) telling
+clients when to poll next. The interval depends on the game state and grows with the number of requests in flight.
+"""
+from math import ceil
+from threading import Lock
+
+from .game_session import GameSession
+
+# Seconds until the next poll is useful for each game state
+STATE_POLL_INTERVALS = {GameSession.WAITING: 5.0, GameSession.READY: 2.0, GameSession.WINNER: 30.0,
+                        GameSession.FORFEIT: 30.0}
+ERROR_POLL_INTERVAL = 5.0
+MIN_POLL_INTERVAL = 0.5
+MAX_POLL_INTERVAL = 60.0
+# Other requests in flight at which the interval is doubled
+TARGET_IN_FLIGHT = 32
+
+
+class LoadTracker:
+
+    def __init__(self):
+        self.in_flight = 0
+        self._lock = Lock()
+
+    def started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def finished(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def load_factor(self):
+        """
+        Multiplier applied to poll intervals, 1 when no other request is in flight
+        :rtype: float
+        """
+
+        return 1 + max(0, self.in_flight - 1) / TARGET_IN_FLIGHT
+
+
+load_tracker = LoadTracker()
+
+
+def poll_interval(state=None):
+    """
+    Seconds a client should wait before polling again
+
+    :param state: Game state or None for a rejected request
+    :type state: str or None
+    :rtype: float
+    """
+
+    base = STATE_POLL_INTERVALS.get(state, ERROR_POLL_INTERVAL)
+    return min(MAX_POLL_INTERVAL, max(MIN_POLL_INTERVAL, base * load_tracker.load_factor()))
+
+
+def add_poll_hint(response, state=None):
+    """
+    Add polling hint headers to a response
+
+    :param response: Outgoing response
+    :type response: flask.Response
+    :param state: Game state or None for a rejected request
+    :return: Response with hint headers
+    :rtype: flask.Response
+    """
+
+    interval = poll_interval(state)
+    response.headers['Retry-After'] = str(ceil(interval))
+    response.headers['X-Poll-Interval'] = f'{interval:.2f}'
+    return response
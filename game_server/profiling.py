@@ -0,0 +1,268 @@
+"""
+Opt in profiling of the server.
+
+RequestProfiler runs cProfile around a request that sends the X-Profile header, or around a random fraction of requests,
+and dumps the profile in the pstats format (`python -m pstats <file>`, snakeviz, ...).
+StackSampler is a statistical profiler that can be started and stopped at runtime. A background thread records the
+stacks of all threads every few milliseconds and dumps them as collapsed stacks (flamegraph.pl, speedscope).
+
+Neither is installed unless create_app is given a profile directory, and the sampler thread only runs while started,
+so profiling costs nothing while disabled. The X-Profile header and the sampler routes are only honoured from loopback,
+or with the configured profile token as the X-Profile value, and each profiler stops dumping after max_dumps files.
+"""
+import cProfile
+import hmac
+import os
+import random
+import sys
+from collections import Counter
+from threading import Event, Lock, Thread, get_ident
+from time import time
+
+from .logs import log_event
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_TOKEN_ENV = 'CONNECT5_PROFILE_TOKEN'
+LOOPBACK_ADDRESSES = ('127.0.0.1', '::1')
+MAX_DUMPS = 100
+SAMPLE_INTERVAL = 0.005
+
+
+def profile_path(directory, name, extension):
+    """
+    Unique dump file path
+    :rtype: str
+    """
+
+    return os.path.join(directory, f'{name}-{time():.6f}-{get_ident()}.{extension}')
+
+
+def profiling_allowed(remote_addr, headers, token=None):
+    """
+    Whether a client may ask for profiling: from loopback, or with token as the X-Profile value
+
+    :param remote_addr: Address of the client
+    :param headers: Request headers
+    :param token: Profile token, only loopback clients are allowed if None
+    :rtype: bool
+    """
+
+    if remote_addr in LOOPBACK_ADDRESSES:
+        return True
+    return bool(token) and hmac.compare_digest(headers.get(PROFILE_HEADER, ''), token)
+
+
+class RequestProfiler:
+
+    def __init__(self, output_dir, sample_rate=0.0, max_dumps=MAX_DUMPS):
+        """
+        :param output_dir: Directory profiles are dumped to
+        :param sample_rate: Fraction of requests profiled without the X-Profile header
+        :param max_dumps: Profiles dumped at most, later requests are not profiled
+        """
+
+        os.makedirs(output_dir, exist_ok=True)
+        self.output_dir = output_dir
+        self.sample_rate = sample_rate
+        self.max_dumps = max_dumps
+        self.dumps = 0
+        self._lock = Lock()
+
+    def should_profile(self, headers, allowed=True):
+        """
+        :param headers: Request headers
+        :param allowed: Whether the client may ask for profiling with the X-Profile header
+        :rtype: bool
+        """
+
+        return (allowed and PROFILE_HEADER in headers) or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    def start(self, headers, allowed=True):
+        """
+        Start profiling the current request if asked to or sampled, and fewer than max_dumps profiles were dumped
+
+        :param headers: Request headers
+        :param allowed: Whether the client may ask for profiling with the X-Profile header
+        :return: Running profile or None
+        :rtype: cProfile.Profile or None
+        """
+
+        if not self.should_profile(headers, allowed):
+            return None
+        with self._lock:
+            if self.dumps >= self.max_dumps:
+                return None
+            self.dumps += 1
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is active, e.g. a concurrent request on interpreters with one global profiler
+            with self._lock:
+                self.dumps -= 1
+            return None
+        return profile
+
+    def finish(self, profile, endpoint):
+        """
+        Stop profile and dump it
+
+        :param profile: Profile from start
+        :param endpoint: Name of the profiled endpoint, used in the file name
+        :return: Path of the pstats file
+        :rtype: str
+        """
+
+        profile.disable()
+        path = profile_path(self.output_dir, endpoint or 'request', 'pstats')
+        profile.dump_stats(path)
+        log_event('request_profiled', path=path)
+        return path
+
+
+def collapse_stack(frame):
+    """
+    Stack of frame as collapsed stack frames, outermost first
+    :rtype: str
+    """
+
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+        frame = frame.f_back
+    return ';'.join(reversed(frames))
+
+
+class StackSampler:
+
+    def __init__(self, output_dir, interval=SAMPLE_INTERVAL, max_dumps=MAX_DUMPS):
+        """
+        :param output_dir: Directory samples are dumped to
+        :param interval: Seconds between samples
+        :param max_dumps: Sample files dumped at most, the sampler does not start again after that
+        """
+
+        os.makedirs(output_dir, exist_ok=True)
+        self.output_dir = output_dir
+        self.interval = interval
+        self.max_dumps = max_dumps
+        self.dumps = 0
+        self.samples = Counter()
+        self._stopped = Event()
+        self._thread = None
+        self._lock = Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        """
+        Start sampling. Does nothing if already running.
+
+        :return: False if max_dumps sample files were already dumped
+        :rtype: bool
+        """
+        with self._lock:
+            if self._thread is not None:
+                return True
+            if self.dumps >= self.max_dumps:
+                return False
+            self.dumps += 1
+            self.samples = Counter()
+            self._stopped.clear()
+            self._thread = Thread(target=self._sample, daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        """
+        Stop sampling and dump the samples
+
+        :return: Path of the collapsed stacks file or None if not running
+        :rtype: str or None
+        """
+
+        with self._lock:
+            if self._thread is None:
+                return None
+            self._stopped.set()
+            self._thread.join()
+            self._thread = None
+
+        path = profile_path(self.output_dir, 'samples', 'folded')
+        self.dump_collapsed(path)
+        log_event('samples_dumped', path=path, samples=sum(self.samples.values()))
+        return path
+
+    def sample(self):
+        """Record the stacks of all other threads once"""
+        sampler_thread = get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id != sampler_thread:
+                self.samples[collapse_stack(frame)] += 1
+
+    def dump_collapsed(self, path):
+        """Write the samples as collapsed stacks, one 'frame;frame;frame count' line per stack"""
+        with open(path, 'w') as samples_file:
+            for stack, count in self.samples.most_common():
+                samples_file.write(f'{stack} {count}\n')
+
+    def _sample(self):
+        while not self._stopped.wait(self.interval):
+            self.sample()
+
+
+def register_profiling(app, output_dir, sample_rate=0.0, token=None, max_dumps=MAX_DUMPS):
+    """
+    Profile requests of app and add the POST /profiler/start and /profiler/stop sampler routes
+
+    :param app: Flask app
+    :param output_dir: Directory profiles are dumped to
+    :param sample_rate: Fraction of requests profiled without the X-Profile header
+    :param token: X-Profile value remote clients must send. Read from PROFILE_TOKEN_ENV, or loopback only if not set.
+    :param max_dumps: Files each profiler dumps at most
+    :return: (RequestProfiler, StackSampler)
+    :rtype: tuple
+    """
+    from flask import g, jsonify, make_response, request
+
+    token = token or os.environ.get(PROFILE_TOKEN_ENV)
+    request_profiler = RequestProfiler(output_dir, sample_rate, max_dumps)
+    stack_sampler = StackSampler(output_dir, max_dumps=max_dumps)
+
+    def allowed():
+        return profiling_allowed(request.remote_addr, request.headers, token)
+
+    def forbidden():
+        return make_response(jsonify({'message': 'Profiling is only allowed from loopback or with the profile token'}),
+                             403)
+
+    @app.before_request
+    def start_request_profile():
+        g.profile = request_profiler.start(request.headers, PROFILE_HEADER in request.headers and allowed())
+
+    @app.teardown_request
+    def finish_request_profile(_):
+        profile = g.pop('profile', None)
+        if profile is not None:
+            request_profiler.finish(profile, request.endpoint)
+
+    @app.route('/profiler/start', methods=['POST'])
+    def start_sampler():
+        """Start the statistical sampler"""
+        if not allowed():
+            return forbidden()
+        return jsonify({'running': stack_sampler.start()})
+
+    @app.route('/profiler/stop', methods=['POST'])
+    def stop_sampler():
+        """Stop the statistical sampler and dump the collapsed stacks"""
+        if not allowed():
+            return forbidden()
+        path = stack_sampler.stop()
+        return jsonify({'running': False, 'file': path and os.path.basename(path)})
+
+    return request_profiler, stack_sampler
@@ -0,0 +1,96 @@
+"""
+Admission control for the game blueprint: per client token bucket rate limits and a global limit on requests in flight.
+Buckets are spread over independently locked shards and each shard keeps only its most recently used buckets,
+so memory stays bounded however many clients connect.
+"""
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+
+# (tokens per second, burst) per endpoint
+ENDPOINT_QUOTAS = {
+    'game.connect_to_game': (1, 5),
+    'game.get_game_status': (2, 5),
+    'game.opponent_joined': (2, 5),
+    'game.get_hint': (2, 5),
+    'game.drop_disc': (5, 10),
+    'game.request_takeback': (1, 3),
+    'game.answer_takeback': (1, 3),
+}
+DEFAULT_QUOTA = (5, 10)
+MAX_IN_FLIGHT = 256
+MAX_BUCKETS = 100000
+SHARDS = 16
+
+
+class TokenBucketStore:
+
+    def __init__(self, max_buckets=MAX_BUCKETS, shards=SHARDS, clock=monotonic):
+        self.clock = clock
+        self.shard_size = max(1, max_buckets // shards)
+        self.shards = [(OrderedDict(), Lock()) for _ in range(shards)]
+
+    def take(self, key, rate, burst):
+        """
+        Take a token from the bucket of key
+
+        :param key: Bucket key e.g. (endpoint, client)
+        :param rate: Tokens added per second
+        :param burst: Bucket capacity
+        :return: Seconds until a token is available, 0 if a token was taken
+        :rtype: float
+        """
+
+        now = self.clock()
+        buckets, lock = self.shards[hash(key) % len(self.shards)]
+
+        with lock:
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = [burst, now]
+                if len(buckets) > self.shard_size:
+                    buckets.popitem(last=False)
+            else:
+                buckets.move_to_end(key)
+                bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0
+            return (1 - bucket[0]) / rate
+
+    def __len__(self):
+        return sum(len(buckets) for buckets, _ in self.shards)
+
+
+class AdmissionControl:
+
+    def __init__(self, quotas=None, default_quota=DEFAULT_QUOTA, max_in_flight=MAX_IN_FLIGHT, buckets=None):
+        self.quotas = ENDPOINT_QUOTAS if quotas is None else quotas
+        self.default_quota = default_quota
+        self.max_in_flight = max_in_flight
+        self.buckets = TokenBucketStore() if buckets is None else buckets
+
+    def check(self, endpoint, client, in_flight):
+        """
+        Decide whether to handle a request
+
+        :param endpoint: Flask endpoint name
+        :param client: Client key, player id or IP address
+        :param in_flight: Requests currently in flight, including this one
+        :return: None if admitted, otherwise (reason, seconds to wait before retrying)
+        :rtype: tuple or None
+        """
+
+        if in_flight > self.max_in_flight:
+            return 'Server overloaded, try again later', 1.0
+
+        rate, burst = self.quotas.get(endpoint, self.default_quota)
+        wait = self.buckets.take((endpoint, client), rate, burst)
+        if wait:
+            return f'Rate limit exceeded for {endpoint}', wait
+        return None
+
+
+admission_control = AdmissionControl()
@@ -0,0 +1,185 @@
+"""
+Elo ratings of players. A player is identified by an account id, issued with a player token on their first connect,
+not by the name they type. The token is the account id signed with the server's secret, so any process sharing the
+secret (e.g. the shards behind game_server.router) can check it without storing tokens. Account ids are 16 byte uuids,
+formatted as uuid strings only in tokens and the JSON file. Ratings and the secret can be
+loaded from and saved to a JSON file so they persist across server restarts.
+
+Behind the router each account belongs to one shard, the one its id hashes to. The shard mints the ids of the accounts
+it registers, and hands the ratings of accounts it no longer owns over to their new shard when the shards change.
+"""
+import hashlib
+import hmac
+import json
+import os
+import secrets
+from threading import Lock
+from uuid import UUID, uuid4
+
+INITIAL_RATING = 1500
+K_FACTOR = 32
+# Environment variable overriding the token secret
+TOKEN_SECRET_ENV = 'CONNECT5_TOKEN_SECRET'
+
+
+def expected_score(rating, opponent_rating):
+    """
+    Probability of winning against opponent under the Elo model
+    :rtype: float
+    """
+
+    return 1 / (1 + 10 ** ((opponent_rating - rating) / 400))
+
+
+class RatingStore:
+
+    def __init__(self, initial_rating=INITIAL_RATING, k_factor=K_FACTOR, secret=None, new_account_id=None):
+        """
+        :param secret: Secret player tokens are signed with. Read from TOKEN_SECRET_ENV, or random if not set.
+        :param new_account_id: Returns the 16 byte id of a new account, a random uuid by default
+        """
+
+        self.initial_rating = initial_rating
+        self.k_factor = k_factor
+        self.secret = secret or os.environ.get(TOKEN_SECRET_ENV) or secrets.token_hex(32)
+        self.new_account_id = new_account_id or (lambda: uuid4().bytes)
+        # account id: rating
+        self.ratings = {}
+        # account id: rating last handed off to the account's new shard
+        self.handed_off = {}
+        self._lock = Lock()
+
+    def register(self):
+        """
+        Issue a new player identity
+
+        :return: (16 byte account id, player token)
+        :rtype: tuple
+        """
+
+        account_id = self.new_account_id()
+        return account_id, self._sign(account_id)
+
+    def authenticate(self, player_token):
+        """
+        :return: 16 byte account id the player token was issued for
+        :rtype: bytes
+        :raises Exception: If the token was not signed with this store's secret
+        """
+
+        try:
+            account_id = UUID(player_token.partition('.')[0]).bytes
+        except ValueError:
+            raise Exception('Unknown player token')
+        if not hmac.compare_digest(self._sign(account_id).encode(), player_token.encode()):
+            raise Exception('Unknown player token')
+        return account_id
+
+    def _sign(self, account_id):
+        id_string = str(UUID(bytes=account_id))
+        signature = hmac.new(self.secret.encode(), id_string.encode(), hashlib.sha256).hexdigest()
+        return f'{id_string}.{signature}'
+
+    def rating(self, account_id):
+        """
+        :return: Rating of player, initial rating for new players
+        :rtype: float
+        """
+
+        return self.ratings.get(account_id, self.initial_rating)
+
+    def record_result(self, winner_id, loser_id):
+        """
+        Update both ratings after a game
+
+        :param winner_id: Account id of the winner
+        :param loser_id: Account id of the loser
+        :return: New (winner rating, loser rating)
+        :rtype: tuple
+        """
+
+        with self._lock:
+            winner_rating, loser_rating = self.rating(winner_id), self.rating(loser_id)
+            change = self.k_factor * (1 - expected_score(winner_rating, loser_rating))
+            self.ratings[winner_id] = winner_rating + change
+            self.ratings[loser_id] = loser_rating - change
+            return self.ratings[winner_id], self.ratings[loser_id]
+
+    def record_game(self, game_session):
+        """
+        Update ratings of the players of a finished game. Games with a player without an account are not rated.
+
+        :param game_session: Game that was won or forfeited
+        :type game_session: game_server.game_session.GameSession
+        """
+
+        winner, loser = game_session.player_1, game_session.player_2
+        if winner.account_id is None or loser.account_id is None:
+            return
+        if winner.player_id != game_session.winner:
+            winner, loser = loser, winner
+        self.record_result(winner.account_id, loser.account_id)
+
+    def hand_off(self, owns, forget=False):
+        """
+        Rating changes of the accounts this store no longer owns, to be added to their new owner with take_over.
+        A change is counted from the rating last handed off, so a game still running here when the accounts moved is
+        carried over by the next hand off.
+
+        :param owns: Returns True for the account ids that stay in this store
+        :type owns: callable
+        :param forget: Drop the accounts handed off, once no game here can change them any more
+        :return: Account id: rating change
+        :rtype: dict
+        """
+
+        changes = {}
+        with self._lock:
+            for account_id, rating in self.ratings.items():
+                if not owns(account_id):
+                    change = rating - self.handed_off.get(account_id, self.initial_rating)
+                    if change:
+                        changes[account_id] = change
+                    self.handed_off[account_id] = rating
+            if forget:
+                for account_id in self.handed_off:
+                    del self.ratings[account_id]
+                self.handed_off.clear()
+        return changes
+
+    def take_over(self, changes):
+        """
+        Add the rating changes handed off by another store
+
+        :param changes: Account id: rating change
+        :type changes: dict
+        """
+
+        with self._lock:
+            for account_id, change in changes.items():
+                self.ratings[account_id] = self.rating(account_id) + change
+
+    def load(self, path):
+        """
+        Load ratings from a JSON file if it exists. The saved secret is used unless TOKEN_SECRET_ENV is set, so
+        tokens issued before a restart stay valid.
+        """
+        if os.path.exists(path):
+            with open(path) as ratings_file:
+                data = json.load(ratings_file)
+            with self._lock:
+                self.ratings.update((UUID(account_id).bytes, rating)
+                                    for account_id, rating in data.get('ratings', {}).items())
+                if data.get('secret') and not os.environ.get(TOKEN_SECRET_ENV):
+                    self.secret = data['secret']
+
+    def save(self, path):
+        """Save ratings and the token secret to a JSON file"""
+        with self._lock:
+            data = {'ratings': {str(UUID(bytes=account_id)): rating for account_id, rating in self.ratings.items()},
+                    'secret': self.secret}
+        with open(path, 'w') as ratings_file:
+            json.dump(data, ratings_file)
+
+
+ratings = RatingStore()
@@ -0,0 +1,342 @@
+"""
+Router front end for several game server processes (shards).
+
+Requests for an existing game are forwarded to the shard owning its game id on the hash ring (see sharding.py), so
+the move path needs no shared store. New players are placed on the least loaded shard, by requests in flight and the
+free sessions each shard reports on /shard, or on the shard where a player is waiting for the same board geometry so
+they can be matched. Returning players, who send a player token, go to the shard owning their account id on the ring,
+which holds their rating.
+
+When shards are added or removed the router pushes the new ring to the shards and keeps the previous ring until
+finish_rebalance is called. Games created before the change stay on their shard: a request the new owner does not know
+is retried on the owner under the previous ring. Call finish_rebalance once those games are over, the shards cannot
+change again before that. The ratings of accounts that move are handed over to their new shard when the ring changes,
+and the changes from games still running on the old shard when finish_rebalance is called.
+
+Run 4 shards on ports 5001-5004 behind a router on port 5000:
+    python -m game_server.router 4
+"""
+import sys
+from collections import Counter
+from threading import Lock
+from time import monotonic
+
+import requests
+
+from .game_session import Board, GameSession
+from .sharding import HashRing
+from .wire import MIMETYPE, decode_drop_request
+
+# Response headers that are not forwarded because the router sets them itself
+HOP_HEADERS = {'connection', 'content-length', 'content-encoding', 'keep-alive', 'transfer-encoding'}
+FORWARDED_HEADERS = ('Accept', 'Content-Type', 'X-Player-Id', 'X-Player-Token')
+SESSION_NOT_FOUND = b'Game session not found'
+MAX_SESSIONS_REACHED = b'Max sessions reached'
+# Seconds between refreshes of the free sessions reported by the shards
+LOAD_REFRESH_INTERVAL = 1.0
+
+
+class Router:
+
+    def __init__(self, shard_urls, http=None, clock=monotonic):
+        """
+        :param shard_urls: Shard name to base url
+        :type shard_urls: dict
+        :param http: requests.Session-like object used to reach the shards
+        :param clock: Returns the current time in seconds
+        """
+
+        self.shard_urls = dict(shard_urls)
+        self.ring = HashRing(self.shard_urls)
+        self.previous_ring = None
+        self.http = http or requests.Session()
+        self.clock = clock
+        self.in_flight = Counter()
+        # Free sessions last reported by each shard, less the players placed in them since
+        self.free_sessions = Counter()
+        self.load_refreshed = None
+        # Board geometry to the shard of the last player left waiting for it
+        self.waiting = {}
+        self._lock = Lock()
+
+    def placement_order(self):
+        """
+        Shards for a new player, least loaded first: fewest requests in flight, then most free sessions
+        :rtype: list
+        """
+
+        self.refresh_load()
+        return sorted(self.ring.shards, key=lambda shard: (self.in_flight[shard], -self.free_sessions[shard]))
+
+    def refresh_load(self, force=False):
+        """
+        Ask the shards for their free sessions, at most every LOAD_REFRESH_INTERVAL seconds unless forced.
+        A shard that cannot be reached keeps its last count.
+        """
+
+        now = self.clock()
+        with self._lock:
+            if not force and self.load_refreshed is not None and now - self.load_refreshed < LOAD_REFRESH_INTERVAL:
+                return
+            self.load_refreshed = now
+
+        for shard in self.ring.shards:
+            try:
+                response = self.http.request('GET', self.shard_urls[shard] + '/shard')
+            except requests.RequestException:
+                continue
+            if response.status_code == 200:
+                with self._lock:
+                    self.free_sessions[shard] = response.json()['free_sessions']
+
+    def forward(self, shard, method, path, headers=None, data=None, stream=False):
+        """
+        Forward a request to a shard
+
+        :param path: Path with query string
+        :return: Shard response
+        :rtype: requests.Response
+        """
+
+        with self._lock:
+            self.in_flight[shard] += 1
+        try:
+            return self.http.request(method, self.shard_urls[shard] + path, headers=headers, data=data,
+                                     stream=stream)
+        finally:
+            with self._lock:
+                self.in_flight[shard] -= 1
+
+    def route_game(self, game_id, method, path, headers=None, data=None, stream=False):
+        """
+        Forward a request for an existing game to its shard, retrying on its previous shard while rebalancing
+
+        :return: Shard response
+        :rtype: requests.Response
+        """
+
+        shard = self.ring.shard_for(game_id)
+        response = self.forward(shard, method, path, headers, data, stream)
+        previous_ring = self.previous_ring
+        if response.status_code == 400 and previous_ring is not None:
+            previous_shard = previous_ring.shard_for(game_id)
+            if previous_shard != shard and SESSION_NOT_FOUND in response.content:
+                response = self.forward(previous_shard, method, path, headers, data, stream)
+        return response
+
+    def route_connect(self, board_config, path, headers=None):
+        """
+        Place a player. A returning player goes to the shard owning their account. A new player tries the shard with
+        a player waiting for the same board geometry, then the least loaded shards until one has a free session.
+
+        :param board_config: (columns, rows, win_length) requested
+        :return: Shard response
+        :rtype: requests.Response
+        :raises Exception: If there are no shards
+        """
+
+        account_id = token_account_id((headers or {}).get('X-Player-Token'))
+        waiting_shard = self.waiting.get(board_config)
+        shards = self.placement_order()
+        if not shards:
+            raise Exception('No shards available')
+        if account_id:
+            # Only the owner has the rating, the shard checks the token
+            shards = [self.ring.shard_for(account_id)]
+        elif waiting_shard in shards:
+            shards.remove(waiting_shard)
+            shards.insert(0, waiting_shard)
+
+        for shard in shards:
+            response = self.forward(shard, 'GET', path, headers)
+            if response.status_code == 400 and MAX_SESSIONS_REACHED in response.content:
+                with self._lock:
+                    self.free_sessions[shard] = 0
+                continue
+            if response.status_code == 200:
+                with self._lock:
+                    if response.json()['player']['disc'] == GameSession.PlAYER_1_DISC:
+                        # The first player took a free session, the second joins one that was not free
+                        self.free_sessions[shard] = max(self.free_sessions[shard] - 1, 0)
+                        self.waiting[board_config] = shard
+                    elif self.waiting.get(board_config) == shard:
+                        del self.waiting[board_config]
+            return response
+        return response
+
+    def add_shard(self, shard, url):
+        """
+        Add a shard. Games on the other shards stay reachable through the previous ring.
+
+        :raises Exception: If the previous rebalance is not finished
+        """
+        self._check_rebalance_finished()
+        self.shard_urls[shard] = url
+        self._change_ring(lambda ring: ring.add(shard))
+
+    def remove_shard(self, shard):
+        """
+        Stop placing players on a shard. Its games stay reachable through the previous ring, stop the shard after
+        finish_rebalance.
+
+        :raises Exception: If the previous rebalance is not finished
+        """
+        self._check_rebalance_finished()
+        self._change_ring(lambda ring: ring.remove(shard))
+
+    def finish_rebalance(self):
+        """Hand over the last rating changes of moved accounts, then forget the previous ring and the urls of removed
+        shards"""
+        if self.previous_ring is not None:
+            self._hand_off_ratings(self.previous_ring.shards, forget=True)
+        self.previous_ring = None
+        self.shard_urls = {shard: url for shard, url in self.shard_urls.items() if shard in self.ring.shards}
+        self.free_sessions = Counter({shard: count for shard, count in self.free_sessions.items()
+                                      if shard in self.ring.shards})
+
+    def _check_rebalance_finished(self):
+        # Games from before the previous change are only found through previous_ring, a second ring would lose them
+        if self.previous_ring is not None:
+            raise Exception('Finish the current rebalance before changing the shards again')
+
+    def _change_ring(self, change):
+        ring = HashRing(self.ring.shards, self.ring.replicas)
+        change(ring)
+        self.previous_ring, self.ring = self.ring, ring
+        for shard in ring.shards:
+            response = self.http.request('PUT', self.shard_urls[shard] + '/shard', json={'shards': ring.shards})
+            if response.status_code == 200:
+                with self._lock:
+                    self.free_sessions[shard] = response.json()['free_sessions']
+        self._hand_off_ratings(self.previous_ring.shards)
+
+    def _hand_off_ratings(self, shards, forget=False):
+        # Collect the rating changes of the accounts the current ring moves off shards and add them on their owners
+        changes = {}
+        for shard in shards:
+            response = self.http.request('POST', self.shard_urls[shard] + '/shard/ratings',
+                                         json={'shards': self.ring.shards, 'forget': forget})
+            for account_id, change in response.json()['ratings'].items():
+                changes.setdefault(self.ring.shard_for(account_id), {})[account_id] = change
+        for shard, shard_changes in changes.items():
+            self.http.request('PUT', self.shard_urls[shard] + '/shard/ratings', json={'ratings': shard_changes})
+
+
+def token_account_id(player_token):
+    """
+    Account id of a player token, unchecked. The shard the player is sent to checks the token.
+
+    :param player_token: Player token or None
+    :return: Account id as a uuid string or None
+    :rtype: str or None
+    """
+
+    return player_token.partition('.')[0] if player_token else None
+
+
+def request_game_id(request):
+    """
+    Game id of a request to the game blueprint
+
+    :param request: Incoming request
+    :type request: flask.Request
+    :return: Game id or None if the request is not for a game
+    :rtype: str or None
+    """
+
+    if request.path.endswith('/drop_disc'):
+        data = request.get_data()
+        drop_data = decode_drop_request(data) if request.mimetype == MIMETYPE else request.get_json(silent=True)
+        return (drop_data or {}).get('game_id')
+    if '/takeback' in request.path:
+        return (request.get_json(silent=True) or {}).get('game_id')
+    return request.view_args.get('game_id')
+
+
+def create_router_app(router):
+    """
+    Router front end with the same API as a game server
+
+    :param router: Router to the shards
+    :type router: Router
+    :return: flask.Flask
+    """
+    from flask import Flask, Response, jsonify, make_response, request
+
+    app = Flask(__name__)
+
+    def shard_response(response):
+        headers = [(name, value) for name, value in response.headers.items() if name.lower() not in HOP_HEADERS]
+        if response.headers.get('Content-Type', '').startswith('text/event-stream'):
+            return Response(response.iter_content(chunk_size=None), response.status_code, headers)
+        return Response(response.content, response.status_code, headers)
+
+    def forwarded_headers():
+        headers = {name: request.headers[name] for name in FORWARDED_HEADERS if name in request.headers}
+        headers['X-Forwarded-For'] = request.remote_addr
+        return headers
+
+    def bad_request(message):
+        return make_response(jsonify({'message': message}), 400)
+
+    @app.route('/api/v1/connect/<player_name>')
+    def connect(player_name):
+        # Parsed like the game servers do, so the same geometry asked for differently finds the waiting player
+        board_config = (request.args.get('columns', Board.COLUMNS, type=int),
+                        request.args.get('rows', Board.ROWS, type=int),
+                        request.args.get('win_length', Board.WIN_LENGTH, type=int))
+        try:
+            return shard_response(router.route_connect(board_config, request.full_path.rstrip('?'),
+                                                       forwarded_headers()))
+        except Exception as e:
+            return bad_request(str(e))
+
+    @app.route('/api/v1/drop_disc', methods=['POST'])
+    @app.route('/api/v1/takeback', methods=['POST'])
+    @app.route('/api/v1/takeback/answer', methods=['POST'])
+    @app.route('/api/v1/game_status/<game_id>')
+    @app.route('/api/v1/hint/<game_id>')
+    @app.route('/api/v1/opponent/joined/<game_id>')
+    @app.route('/api/v1/spectate/<game_id>')
+    def game_request(game_id=None):
+        try:
+            game_id = request_game_id(request)
+        except Exception as e:
+            return bad_request(str(e))
+        if not game_id:
+            return bad_request('Game session not found')
+
+        stream = '/spectate/' in request.path
+        try:
+            return shard_response(router.route_game(game_id, request.method, request.full_path.rstrip('?'),
+                                                    forwarded_headers(), request.get_data(), stream))
+        except Exception as e:
+            return bad_request(str(e))
+
+    return app
+
+
+def run_shard(shard, shards, port):
+    """Run a shard worker process"""
+    from . import create_app
+
+    create_app(shard=shard, shards=shards).run(port=port, threaded=True)
+
+
+if __name__ == '__main__':
+    import os
+    import secrets
+    from multiprocessing import Process
+
+    from .ratings import TOKEN_SECRET_ENV
+
+    # Shards check each other's player tokens
+    os.environ.setdefault(TOKEN_SECRET_ENV, secrets.token_hex(32))
+    shard_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+    shard_ports = {f'shard-{number}': 5001 + number for number in range(shard_count)}
+    for shard_name, shard_port in shard_ports.items():
+        Process(target=run_shard, args=(shard_name, list(shard_ports), shard_port), daemon=True).start()
+
+    shard_router = Router({shard_name: f'http://127.0.0.1:{shard_port}'
+                           for shard_name, shard_port in shard_ports.items()})
+    create_router_app(shard_router).run(port=5000, threaded=True)
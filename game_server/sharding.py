@@ -0,0 +1,139 @@
+"""
+Consistent hashing of game ids onto shards, the game server processes behind game_server.router.
+
+Each shard owns REPLICAS points on a hash ring and a game id belongs to the shard owning the first point at or after
+its hash. Adding or removing a shard only moves the game ids between its points and their predecessors, about 1/N of
+them. A shard worker mints the ids of its empty sessions so that they hash to itself, so the router finds every game
+from its id alone. Account ids are minted the same way, so a returning player is sent to the shard holding their rating.
+"""
+from bisect import bisect, insort
+from hashlib import blake2b
+from uuid import UUID, uuid4
+
+REPLICAS = 64
+
+
+def shard_hash(key):
+    """
+    Position of key on the ring
+    :rtype: int
+    """
+
+    return int.from_bytes(blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+
+    def __init__(self, shards=(), replicas=REPLICAS):
+        self.replicas = replicas
+        self.points = []
+        self.owners = {}
+        for shard in shards:
+            self.add(shard)
+
+    @property
+    def shards(self):
+        """
+        :return: Shard names, sorted
+        :rtype: list
+        """
+
+        return sorted(set(self.owners.values()))
+
+    def add(self, shard):
+        """Give shard its points on the ring"""
+        for replica in range(self.replicas):
+            point = shard_hash(f'{shard}#{replica}')
+            if point not in self.owners:
+                insort(self.points, point)
+            self.owners[point] = shard
+
+    def remove(self, shard):
+        """Remove the points of shard. Its game ids move to the next points on the ring."""
+        self.points = [point for point in self.points if self.owners[point] != shard]
+        self.owners = {point: self.owners[point] for point in self.points}
+
+    def shard_for(self, key):
+        """
+        :param key: Game id
+        :return: Name of the shard owning key
+        :rtype: str
+        :raises Exception: If the ring has no shards
+        """
+
+        if not self.points:
+            raise Exception('No shards available')
+        index = bisect(self.points, shard_hash(key)) % len(self.points)
+        return self.owners[self.points[index]]
+
+
+def mint_uuid(ring, shard):
+    """
+    Random game or account uuid owned by shard, about N attempts for N shards
+
+    :return: 16 byte uuid
+    :rtype: bytes
+    """
+
+    while True:
+        new_uuid = uuid4().bytes
+        if ring.shard_for(str(UUID(bytes=new_uuid))) == shard:
+            return new_uuid
+
+
+def register_shard(app, shard, shards):
+    """
+    Run app as a shard worker: mint the ids of its empty sessions and new accounts for the ring of shards and add the
+    /shard routes used by the router. The client address is taken from the X-Forwarded-For header set by the router.
+
+    :param app: Flask app from create_app
+    :param shard: Name of this shard
+    :param shards: Names of all shards
+    """
+    from flask import jsonify, request
+    from werkzeug.middleware.proxy_fix import ProxyFix
+    from .game import game_sessions
+    from .game_session import session_lock
+    from .ratings import ratings
+
+    ring = HashRing(shards)
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1)
+
+    def mint_empty_sessions():
+        with session_lock:
+            for game_session in game_sessions.free:
+                game_sessions.change_uuid(game_session, mint_uuid(ring, shard))
+
+    mint_empty_sessions()
+    ratings.new_account_id = lambda: mint_uuid(ring, shard)
+
+    @app.route('/shard')
+    def shard_details():
+        """Shard name, ring and number of free sessions"""
+        return jsonify({'shard': shard, 'shards': ring.shards,
+                        'free_sessions': len(game_sessions.free)})
+
+    @app.route('/shard', methods=['PUT'])
+    def update_ring():
+        """Replace the ring when shards are added or removed. New games are minted for the new ring."""
+        nonlocal ring
+        ring = HashRing(request.json['shards'])
+        mint_empty_sessions()
+        return shard_details()
+
+    @app.route('/shard/ratings', methods=['POST'])
+    def hand_off_ratings():
+        """
+        Rating changes of the accounts the posted ring gives to other shards, see RatingStore.hand_off.
+        The body is JSON with shards and forget.
+        """
+        new_ring = HashRing(request.json['shards'])
+        changes = ratings.hand_off(lambda account_id: new_ring.shard_for(str(UUID(bytes=account_id))) == shard,
+                                   request.json.get('forget', False))
+        return jsonify({'ratings': {str(UUID(bytes=account_id)): change for account_id, change in changes.items()}})
+
+    @app.route('/shard/ratings', methods=['PUT'])
+    def take_over_ratings():
+        """Add the rating changes handed off by other shards. The body is JSON with ratings."""
+        ratings.take_over({UUID(account_id).bytes: change for account_id, change in request.json['ratings'].items()})
+        return jsonify({'shard': shard})
@@ -0,0 +1,345 @@
+"""
+Snapshots of all in-memory game sessions, restored when the server starts.
+
+A snapshot is taken in a forked child process: the child gets a copy-on-write view of the sessions frozen at the fork,
+writes them and exits, while the server keeps handling requests. The fork holds session_lock so no session is caught
+mid-change. Where fork is not available, and for the final snapshot on exit, a background thread copies the fields of
+CAPTURE_BATCH sessions at a time under session_lock and encodes them after releasing it, so moves only wait for one
+batch.
+
+Snapshot layout (network byte order):
+    magic 'C5SS' | version u8 | session count u32 | sessions
+Session layout:
+    game_id 16 bytes | state u8 | winner u8 (0 none, 1 or 2 the winning player) | columns u8 | rows u8 |
+    win_length u8 | player count u8 | started_at f64 (NaN if not started) | move count u16 |
+    per player: player_id 16 bytes | account_id 16 bytes (zero if none) | name length u16 | name utf-8 |
+    moves (one column u8 per move) | player 1 mask | player 2 mask (each (columns * rows + 7) // 8 bytes)
+"""
+import gc
+import logging
+import math
+import os
+from struct import Struct
+from threading import Event, Thread
+from time import time
+
+from .game_session import Board, GameSession, Player, session_lock
+from .logs import log_event
+from .wire import STATES
+
+MAGIC = b'C5SS'
+VERSION = 2
+SNAPSHOT_INTERVAL = 60
+KEEP_SNAPSHOTS = 3
+CAPTURE_BATCH = 1000
+
+_HEADER = Struct('!4sBI')
+_SESSION = Struct('!16sBBBBBBdH')
+_PLAYER = Struct('!16s16sH')
+NO_ACCOUNT = bytes(16)
+
+
+def session_fields(game_session):
+    """
+    Copy of the snapshotted fields of a game session, immutable so it can be packed after session_lock is released
+    :rtype: tuple
+    """
+
+    board = game_session.board
+    players = game_session.players
+    winner = 0
+    if game_session.winner is not None:
+        winner = next(number for number, player in enumerate(players, 1) if player.player_id == game_session.winner)
+    return (game_session.game_uuid, STATES.index(game_session.state), winner, board.columns, board.rows,
+            board.win_length, game_session.started_at,
+            tuple((player.player_uuid, player.account_id or NO_ACCOUNT, player.player_name) for player in players),
+            bytes(board.moves or b''), board.masks)
+
+
+def pack_session(fields):
+    """
+    Pack the fields from session_fields
+    :rtype: bytes
+    """
+
+    game_uuid, state, winner, columns, rows, win_length, started_at, players, moves, masks = fields
+    parts = [_SESSION.pack(game_uuid, state, winner, columns, rows, win_length, len(players),
+                           math.nan if started_at is None else started_at, len(moves))]
+    for player_uuid, account_id, player_name in players:
+        name = player_name.encode()
+        parts.append(_PLAYER.pack(player_uuid, account_id, len(name)))
+        parts.append(name)
+
+    mask_length = (columns * rows + 7) // 8
+    parts.append(moves)
+    parts.extend(mask.to_bytes(mask_length, 'big') for mask in masks)
+    return b''.join(parts)
+
+
+def encode_session(game_session):
+    """
+    Pack a game session
+    :rtype: bytes
+    """
+
+    return pack_session(session_fields(game_session))
+
+
+def pack_snapshot(fields):
+    """
+    Pack the fields of all game sessions
+    :rtype: bytes
+    """
+
+    return _HEADER.pack(MAGIC, VERSION, len(fields)) + b''.join(map(pack_session, fields))
+
+
+def encode_snapshot(game_sessions):
+    """
+    Pack all game sessions
+    :rtype: bytes
+    """
+
+    # The count is written first, so encode a copy of the list
+    return pack_snapshot(list(map(session_fields, game_sessions)))
+
+
+def capture_sessions(game_sessions, batch=CAPTURE_BATCH):
+    """
+    Copy the fields of all game sessions while they keep changing. session_lock is held for batch sessions at a time,
+    so every session is copied whole and moves wait for one batch at most.
+
+    :return: Fields from session_fields per session
+    :rtype: list
+    """
+
+    with session_lock:
+        game_sessions = list(game_sessions)
+    fields = []
+    for start in range(0, len(game_sessions), batch):
+        with session_lock:
+            fields.extend(map(session_fields, game_sessions[start:start + batch]))
+    return fields
+
+
+def decode_snapshot(data):
+    """
+    Unpack game sessions
+
+    :param data: Packed snapshot
+    :type data: bytes
+    :return: Restored game sessions
+    :rtype: list
+    :raises Exception: If the data is not a supported snapshot
+    """
+
+    if len(data) < _HEADER.size:
+        raise Exception('Unsupported snapshot')
+    magic, version, count = _HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise Exception('Unsupported snapshot')
+
+    # Collections triggered by the millions of new objects would only rescan them
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _decode_sessions(data, count)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def _decode_sessions(data, count):
+    # Local names for the hot loop
+    unpack_session, unpack_player = _SESSION.unpack_from, _PLAYER.unpack_from
+    new_session, new_player, new_board = GameSession.__new__, Player.__new__, Board.__new__
+    discs, isnan = GameSession.DISCS, math.isnan
+    view = memoryview(data)
+    offset = _HEADER.size
+    game_sessions = []
+    for _ in range(count):
+        game_uuid, state, winner, columns, rows, win_length, player_count, started_at, move_count = \
+            unpack_session(data, offset)
+        offset += _SESSION.size
+
+        game_session = new_session(GameSession)
+        game_session.game_uuid = game_uuid
+        game_session.state = STATES[state]
+        game_session.started_at = None if isnan(started_at) else started_at
+        game_session.turn_timer = None
+        game_session.revision = 0
+        game_session.takeback = None
+
+        players = []
+        for disc in discs[:player_count]:
+            player_uuid, account_id, name_length = unpack_player(data, offset)
+            offset += _PLAYER.size
+            player = new_player(Player)
+            player.player_name = str(view[offset:offset + name_length], 'utf-8')
+            player.disc = disc
+            player.player_uuid = player_uuid
+            player.account_id = account_id if account_id != NO_ACCOUNT else None
+            players.append(player)
+            offset += name_length
+        game_session.player_1 = players[0] if player_count > 0 else None
+        game_session.player_2 = players[1] if player_count > 1 else None
+        game_session.winner = players[winner - 1].player_id if winner else None
+
+        # The geometry was validated when the game was created, so Board.__init__ is skipped
+        board = new_board(Board)
+        board.valid_discs = discs
+        board.columns = columns
+        board.rows = rows
+        board.win_length = win_length
+        moves = bytearray(view[offset:offset + move_count])
+        board.moves = moves if move_count else None
+        offset += move_count
+        mask_length = (columns * rows + 7) // 8
+        board.masks = (int.from_bytes(view[offset:offset + mask_length], 'big'),
+                       int.from_bytes(view[offset + mask_length:offset + 2 * mask_length], 'big'))
+        offset += 2 * mask_length
+        board.heights = bytearray(map(moves.count, range(columns)))
+        board.turns = move_count
+        if move_count:
+            board.last_col = moves[-1]
+            board.last_disc = discs[(move_count - 1) % 2]
+        else:
+            board.last_col = board.last_disc = None
+        board.version = 0
+        board.line_counts = None
+        board.undone = None
+        game_session.board = board
+        game_sessions.append(game_session)
+
+    return game_sessions
+
+
+def snapshot_paths(directory):
+    """
+    Complete snapshots of directory, oldest first
+    :rtype: list
+    """
+
+    if not os.path.isdir(directory):
+        return []
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if name.startswith('snapshot-') and name.endswith('.bin'))
+
+
+def write_snapshot(directory, game_sessions, keep=KEEP_SNAPSHOTS):
+    """
+    Write a snapshot file, then remove all but the newest keep snapshots. Does not log or take locks so it is safe
+    to run in a forked child.
+
+    :return: Path of the snapshot
+    :rtype: str
+    """
+
+    return write_snapshot_data(directory, encode_snapshot(game_sessions), keep)
+
+
+def write_snapshot_data(directory, data, keep=KEEP_SNAPSHOTS):
+    """
+    Write an encoded snapshot, then remove all but the newest keep snapshots
+
+    :param data: Snapshot from encode_snapshot
+    :return: Path of the snapshot
+    :rtype: str
+    """
+
+    path = os.path.join(directory, f'snapshot-{time():017.6f}.bin')
+    with open(path + '.partial', 'wb') as snapshot_file:
+        snapshot_file.write(data)
+    # Readers only see complete snapshots
+    os.rename(path + '.partial', path)
+    for old_path in snapshot_paths(directory)[:-keep]:
+        os.remove(old_path)
+    return path
+
+
+def load_latest_snapshot(directory):
+    """
+    :return: Game sessions of the newest snapshot of directory or None if there is none
+    :rtype: list or None
+    """
+
+    paths = snapshot_paths(directory)
+    if not paths:
+        return None
+    with open(paths[-1], 'rb') as snapshot_file:
+        return decode_snapshot(snapshot_file.read())
+
+
+class Snapshotter:
+
+    def __init__(self, directory, game_sessions, interval=SNAPSHOT_INTERVAL, use_fork=hasattr(os, 'fork')):
+        """
+        :param directory: Directory snapshots are written to
+        :param game_sessions: Live list of game sessions
+        :param interval: Seconds between periodic snapshots
+        :param use_fork: Write snapshots from a forked child process
+        """
+
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.game_sessions = game_sessions
+        self.interval = interval
+        self.use_fork = use_fork
+        self._stopped = Event()
+        self._thread = None
+
+    def snapshot(self):
+        """
+        Snapshot the sessions without blocking request handling
+
+        :return: Thread that finishes when the snapshot is written
+        :rtype: threading.Thread
+        """
+
+        if self.use_fork:
+            # The child copies the sessions as they are at the fork, so no change may be half done
+            with session_lock:
+                pid = os.fork()
+            if pid == 0:
+                # Child: the sessions are frozen as they were at the fork. A collection would touch every object and
+                # copy the pages shared with the server.
+                gc.disable()
+                status = 0
+                try:
+                    write_snapshot(self.directory, self.game_sessions)
+                except BaseException:
+                    status = 1
+                os._exit(status)
+            thread = Thread(target=self._wait_for_child, args=(pid,), daemon=True)
+        else:
+            thread = Thread(target=self._write, daemon=True)
+        thread.start()
+        return thread
+
+    def start(self):
+        """Take a snapshot every interval seconds"""
+        self._thread = Thread(target=self._snapshot_periodically, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop periodic snapshots and write a final snapshot in this process"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._write()
+
+    def _write(self):
+        fields = capture_sessions(self.game_sessions)
+        log_event('snapshot_written', path=write_snapshot_data(self.directory, pack_snapshot(fields)),
+                  sessions=len(fields))
+
+    def _wait_for_child(self, pid):
+        _, status = os.waitpid(pid, 0)
+        if status:
+            log_event('snapshot_failed', logging.ERROR, pid=pid, status=status)
+        else:
+            log_event('snapshot_written', path=snapshot_paths(self.directory)[-1], sessions=len(self.game_sessions))
+
+    def _snapshot_periodically(self):
+        while not self._stopped.wait(self.interval):
+            self.snapshot().join()
@@ -0,0 +1,137 @@
+"""
+Read only spectator subscriptions.
+Each watched game has one channel holding the last BUFFER_SIZE serialized updates. A state change is serialized once
+and appended to the channel, every spectator reads the same bytes through its own cursor. A spectator that falls more
+than BUFFER_SIZE updates behind is dropped rather than buffering for it.
+"""
+import json
+from collections import deque
+from threading import Condition, Lock
+
+BUFFER_SIZE = 16
+KEEPALIVE_INTERVAL = 15
+
+
+class SlowConsumer(Exception):
+    """Spectator fell too far behind and missed updates"""
+
+
+class GameChannel:
+
+    def __init__(self, buffer_size=BUFFER_SIZE):
+        self.updates = deque(maxlen=buffer_size)
+        self.sequence = 0
+        self.subscribers = 0
+        self.closed = False
+        self.condition = Condition()
+
+    def publish(self, payload, close=False):
+        """
+        Append an update and wake waiting spectators
+
+        :param payload: Serialized update shared by all spectators
+        :type payload: bytes
+        :param close: No further updates will follow
+        """
+
+        with self.condition:
+            self.updates.append(payload)
+            self.sequence += 1
+            self.closed = self.closed or close
+            self.condition.notify_all()
+
+    def read(self, cursor, timeout=KEEPALIVE_INTERVAL):
+        """
+        Updates published after cursor, waiting up to timeout for one
+
+        :param cursor: Sequence number of the last update read
+        :return: (updates, new cursor, channel closed)
+        :rtype: tuple
+        :raises SlowConsumer: If updates after cursor were already evicted from the buffer
+        """
+
+        with self.condition:
+            if cursor == self.sequence and not self.closed:
+                self.condition.wait(timeout)
+
+            missed = self.sequence - cursor
+            if missed > len(self.updates):
+                raise SlowConsumer(f'Spectator missed {missed - len(self.updates)} updates')
+            updates = [self.updates[index] for index in range(len(self.updates) - missed, len(self.updates))]
+            return updates, self.sequence, self.closed
+
+
+class Broadcaster:
+
+    def __init__(self, buffer_size=BUFFER_SIZE):
+        self.buffer_size = buffer_size
+        self.channels = {}
+        self._lock = Lock()
+
+    def subscribe(self, game_session):
+        """
+        Start watching a game
+
+        :param game_session: Game to watch
+        :return: Channel of the game and the cursor to start reading from
+        :rtype: tuple
+        """
+
+        with self._lock:
+            channel = self.channels.get(game_session.game_uuid)
+            if channel is None:
+                channel = self.channels[game_session.game_uuid] = GameChannel(self.buffer_size)
+            channel.subscribers += 1
+        return channel, channel.sequence
+
+    def unsubscribe(self, game_session, channel):
+        """Stop watching a game. The channel is discarded with its last spectator."""
+        with self._lock:
+            channel.subscribers -= 1
+            if not channel.subscribers and self.channels.get(game_session.game_uuid) is channel:
+                del self.channels[game_session.game_uuid]
+
+    def publish(self, game_session):
+        """
+        Send the game state to its spectators, serialized once for all of them. Does nothing if nobody is watching.
+
+        :param game_session: Game session whose state changed
+        :type game_session: game_server.game_session.GameSession
+        """
+
+        channel = self.channels.get(game_session.game_uuid)
+        if channel is not None:
+            channel.publish(format_event(game_session), close=game_session.state in game_session.GAME_OVER_STATES)
+
+
+def format_event(game_session):
+    """
+    Game state as a server sent event
+    :rtype: bytes
+    """
+
+    return f'data: {json.dumps(game_session.game_details())}\n\n'.encode()
+
+
+def stream_game(game_session, channel, cursor):
+    """
+    Generate the server sent event stream of a spectator: the current state, then every update until the game is over.
+
+    :param game_session: Watched game
+    :param channel: Channel from Broadcaster.subscribe
+    :param cursor: Cursor from Broadcaster.subscribe
+    """
+
+    try:
+        closed = game_session.state in game_session.GAME_OVER_STATES
+        yield format_event(game_session)
+        while not closed:
+            updates, cursor, closed = channel.read(cursor)
+            yield from updates or [b': keepalive\n\n']
+    except SlowConsumer as e:
+        yield f'event: error\ndata: {json.dumps({"message": str(e)})}\n\n'.encode()
+    finally:
+        broadcaster.unsubscribe(game_session, channel)
+
+
+broadcaster = Broadcaster()
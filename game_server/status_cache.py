@@ -0,0 +1,115 @@
+"""
+Shared game status reads.
+The serialized status of a game is cached per encoding until the game's version changes, so repeated polls of an
+unchanged game skip the session lookup and serialization. Concurrent reads that miss the cache are coalesced: one
+request computes the status and the others wait for its result (single flight). The status is serialized under
+session_lock, so it is never read half way through a move.
+Entries are keyed by the game uuid, however the id is spelled, and the least recently read are evicted past
+max_entries.
+"""
+from collections import OrderedDict
+from threading import Event, Lock
+from uuid import UUID
+
+from .game_session import session_lock as game_session_lock
+
+MAX_ENTRIES = 1024
+
+
+class Flight:
+
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = Event()
+        self.result = None
+        self.error = None
+
+    def wait(self):
+        """
+        Result of the leading request
+        :raises Exception: The error of the leading request
+        """
+
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class StatusCache:
+
+    def __init__(self, max_entries=MAX_ENTRIES, session_lock=game_session_lock):
+        """
+        :param max_entries: Statuses cached at most, the least recently read are evicted first
+        :param session_lock: Lock the sessions are changed under, held while a status is serialized
+        """
+
+        # (game_uuid, encoding): (game_session, version, body), least recently read first
+        self.entries = OrderedDict()
+        self.max_entries = max_entries
+        self.flights = {}
+        self.session_lock = session_lock
+        self._lock = Lock()
+
+    def get(self, game_id, encoding, find_session, serialize):
+        """
+        Serialized status of a game
+
+        :param game_id: Requested game id
+        :param encoding: Mimetype of the serialized status
+        :param find_session: Called with game_id to look up the session on a miss
+        :param serialize: Called with the session and encoding to serialize it on a miss
+        :return: (game_session, body)
+        :rtype: tuple
+        :raises Exception: Raised by find_session or serialize
+        """
+
+        try:
+            game_uuid = UUID(game_id).bytes
+        except (TypeError, ValueError, AttributeError):
+            # Not a game id, find_session reports it
+            game_session = find_session(game_id)
+            with self.session_lock:
+                return game_session, serialize(game_session, encoding)
+
+        key = (game_uuid, encoding)
+        entry = self.entries.get(key)
+        if entry is not None:
+            game_session, version, body = entry
+            if game_session.game_uuid == game_uuid and game_session.version == version:
+                with self._lock:
+                    if key in self.entries:
+                        self.entries.move_to_end(key)
+                return game_session, body
+
+        with self._lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight()
+        if not leader:
+            return flight.wait()
+
+        try:
+            game_session = find_session(game_id)
+            with self.session_lock:
+                version = game_session.version
+                body = serialize(game_session, encoding)
+            with self._lock:
+                self.entries[key] = (game_session, version, body)
+                self.entries.move_to_end(key)
+                if len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+            flight.result = (game_session, body)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self.flights[key]
+            flight.done.set()
+
+
+status_cache = StatusCache()
@@ -0,0 +1,126 @@
+from game_server.archive import GameArchive, ArchiveReader, NO_ACCOUNT, game_record
+from game_server.game_session import GameSession
+
+import tempfile
+import unittest
+from unittest.mock import patch
+from uuid import UUID, uuid4
+
+KIERAN, JOHN, MARY = (uuid4().bytes for _ in range(3))
+
+
+def finished_game(player_1, player_2, columns, winner=1):
+    game_session = GameSession()
+    game_session.add_player('Kieran', player_1)
+    game_session.add_player('John', player_2)
+    for turn, column in enumerate(columns):
+        game_session.board.drop_disc(column, GameSession.DISCS[turn % 2])
+    game_session.winner = (game_session.player_1 if winner == 1 else game_session.player_2).player_id
+    game_session.state = GameSession.WINNER
+    return game_session
+
+
+class TestGameArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.archive = GameArchive(chunk_size=2)
+        self.archive.open(self.directory)
+        self.reader = ArchiveReader(self.directory)
+
+    def tearDown(self):
+        self.archive.close()
+
+    def test_record__disabled(self):
+        archive = GameArchive()
+        archive.record(finished_game(KIERAN, JOHN, [0]))
+        self.assertEqual([], archive.buffer)
+
+    def test_game_record(self):
+        game_session = finished_game(KIERAN, JOHN, [4, 3, 4], winner=2)
+
+        values, players, moves = game_record(game_session, game_session.started_at + 30)
+        self.assertEqual(2, values[1])
+        self.assertEqual(4, values[7])
+        self.assertEqual(30, values[9])
+        self.assertEqual((KIERAN, JOHN), players)
+        self.assertEqual(b'\x04\x03\x04', moves)
+
+    def test_record__writes_full_chunks(self):
+        for _ in range(3):
+            self.archive.record(finished_game(KIERAN, JOHN, [0, 1]))
+        self.archive._queue.join()
+
+        self.assertEqual(2, self.reader.count())
+        self.assertEqual(1, len(self.archive.buffer))
+
+    def test_close__writes_partial_chunk(self):
+        self.archive.record(finished_game(KIERAN, JOHN, [0]))
+        self.archive.close()
+
+        self.assertEqual(1, self.reader.count())
+
+    def test_close__after_write_error(self):
+        with patch('game_server.archive.write_chunk', side_effect=[OSError('No space left on device'), None]) as write:
+            for _ in range(3):
+                self.archive.record(finished_game(KIERAN, JOHN, [0]))
+            self.archive.close()
+
+        self.assertEqual(2, write.call_count)
+        self.assertIsNone(self.archive._queue)
+
+    def test_moves(self):
+        self.archive.record(finished_game(KIERAN, JOHN, [0, 1, 2]))
+        self.archive.record(finished_game(KIERAN, JOHN, [5]))
+        self.archive.close()
+
+        chunk = next(self.reader.chunks('moves', 'move_offsets'))
+        self.assertEqual([[0, 1, 2], [5]], [moves.tolist() for moves in self.reader.moves(chunk)])
+
+    def test_win_rate_by_first_column(self):
+        self.archive.record(finished_game(KIERAN, JOHN, [4], winner=1))
+        self.archive.record(finished_game(KIERAN, JOHN, [4], winner=2))
+        self.archive.record(finished_game(KIERAN, JOHN, [0], winner=1))
+        self.archive.close()
+
+        self.assertEqual({0: (1, 1.0), 4: (2, 0.5)}, self.reader.win_rate_by_first_column())
+
+    def test_game_record__no_accounts(self):
+        game_session = finished_game(None, None, [4])
+
+        self.assertEqual((NO_ACCOUNT, NO_ACCOUNT), game_record(game_session, game_session.started_at)[1])
+
+    def test_game_record__no_moves(self):
+        game_session = finished_game(KIERAN, JOHN, [])
+
+        values, _, moves = game_record(game_session, game_session.started_at)
+        self.assertEqual(-1, values[7])
+        self.assertEqual(b'', moves)
+
+    def test_average_game_length_by_player(self):
+        self.archive.record(finished_game(KIERAN, JOHN, [0, 1, 2, 3]))
+        self.archive.record(finished_game(KIERAN, MARY, [0, 1]))
+        self.archive.record(finished_game(MARY, JOHN, [0, 1, 2, 3, 4, 5]))
+        self.archive.record(finished_game(MARY, None, [0, 1, 2, 3]))
+        self.archive.close()
+
+        self.assertEqual({str(UUID(bytes=KIERAN)): 3, str(UUID(bytes=JOHN)): 5, str(UUID(bytes=MARY)): 4},
+                         self.reader.average_game_length_by_player())
+
+    def test_average_game_length_by_player__ids_ending_in_zero_bytes(self):
+        account = bytes(15) + b'\x01'
+        short_account = b'\x01' + bytes(15)
+        self.archive.record(finished_game(account, short_account, [0, 1]))
+        self.archive.close()
+
+        self.assertEqual({str(UUID(bytes=account)): 2, str(UUID(bytes=short_account)): 2},
+                         self.reader.average_game_length_by_player())
+
+    def test_open__continues_numbering(self):
+        self.archive.record(finished_game(KIERAN, JOHN, [0]))
+        self.archive.close()
+
+        self.archive.open(self.directory)
+        self.archive.record(finished_game(KIERAN, JOHN, [0]))
+        self.archive.close()
+        self.assertEqual(2, self.reader.count())
@@ -1,7 +1,6 @@
 from game_server.game_session import Board
 
 import unittest
-from unittest.mock import patch
 
 
 class TestBoard(unittest.TestCase):
@@ -12,7 +11,8 @@ class TestBoard(unittest.TestCase):
 
     def test_drop_disk_successful(self):
         self.board.drop_disc(1, 'X')
-        self.assertTrue('X' in self.board.board_matrix[1])
+        self.assertEqual('X', self.board.get_disc(1, 0))
+        self.assertEqual('_', self.board.get_disc(1, 1))
 
     def test_drop_disk__invalid_disk(self):
 
@@ -23,7 +23,7 @@ class TestBoard(unittest.TestCase):
 
     def test_drop_disk__no_space_left_in_column(self):
 
-        self.board.board_matrix[1] = ['']  # This represents a full column
+        self.play(self.board, [1] * self.board.ROWS)
 
         with self.assertRaises(Exception) as e:
             self.board.drop_disc(1, 'X')
@@ -36,59 +36,147 @@ class TestBoard(unittest.TestCase):
             self.board.drop_disc(20, 'X')
         self.assertEqual('Invalid column: 20', str(e.exception))
 
-    @patch('game_server.game_session.Board.check_rows_and_cols', return_value='X')
-    def test_check_for_winner__winner_found(self, _):
+    def test_drop_disk__records_last_move(self):
+        self.board.drop_disc(1, 'X')
+        self.assertEqual((1, 0), self.board.last_move)
+        self.assertEqual(1, self.board.turns)
+
+    def play(self, board, columns):
+        """Drop discs into columns alternating between X and O"""
+        for i, col in enumerate(columns):
+            board.drop_disc(col, 'XO'[i % 2])
+
+    def test_check_for_winner__no_moves(self):
+
+        self.assertIsNone(self.board.check_for_winner())
+
+    def test_check_for_winner__no_winner(self):
+        self.play(self.board, [0, 1, 2, 3])
+
+        self.assertIsNone(self.board.check_for_winner())
+
+    def test_check_for_winner__column_winner(self):
+        self.play(self.board, [0, 1, 0, 1, 0, 1, 0, 1, 0])
+
         self.assertEqual('X', self.board.check_for_winner())
 
-    @patch('game_server.game_session.Board.check_rows_and_cols', return_value=None)
-    @patch('game_server.game_session.Board.check_diagonals', return_value=None)
-    def test_check_for_winner__no_winner_found(self, *_):
+    def test_check_for_winner__row_winner(self):
+        # Last disc lands in the middle of the row
+        self.play(self.board, [0, 0, 1, 1, 3, 3, 4, 4, 2])
+
+        self.assertEqual('X', self.board.check_for_winner())
+
+    def test_check_for_winner__diagonal_winner(self):
+        self.play(self.board, [0, 1, 1, 2, 6, 2, 2, 3, 7, 3, 8, 3, 3, 4, 6, 4, 7, 4, 8, 4, 4])
+
+        self.assertEqual('X', self.board.check_for_winner())
+
+    def test_check_for_winner__anti_diagonal_winner(self):
+        self.play(self.board, [8, 7, 7, 6, 0, 6, 6, 5, 1, 5, 2, 5, 5, 4, 0, 4, 1, 4, 2, 4, 4])
+
+        self.assertEqual('X', self.board.check_for_winner())
+
+    def test_check_for_winner__four_in_a_row_not_enough(self):
+        self.play(self.board, [0, 1, 0, 1, 0, 1, 0])
+
         self.assertIsNone(self.board.check_for_winner())
 
-    def test_check_diagonals__no_winner(self):
+    def test_check_for_winner__custom_win_length(self):
+        board = Board(['X', 'O'], columns=7, rows=6, win_length=4)
+        self.play(board, [0, 1, 0, 1, 0, 1, 0])
+
+        self.assertEqual('X', board.check_for_winner())
+
+    def test_check_for_winner__large_board(self):
+        board = Board(['X', 'O'], columns=100, rows=100, win_length=5)
+        self.play(board, [50, 0, 51, 0, 52, 0, 53, 0, 54])
 
-        self.assertIsNone(self.board.check_diagonals())
+        self.assertEqual('X', board.check_for_winner())
 
-    @patch('builtins.print')
-    def test_check_diagonals__winner(self, _):
-        self.board.board_matrix[0][0] = 'X'
-        self.board.board_matrix[1][1] = 'X'
-        self.board.board_matrix[2][2] = 'X'
-        self.board.board_matrix[3][3] = 'X'
-        self.board.board_matrix[4][4] = 'X'
+    def test_init__invalid_board_size(self):
 
-        self.assertEqual('X', self.board.check_diagonals())
+        with self.assertRaises(Exception) as e:
+            Board(['X', 'O'], columns=101, rows=6)
+        self.assertEqual('Invalid board size: 101x6. Max size is 100x100', str(e.exception))
+
+    def test_init__invalid_win_length(self):
 
-    def test_check_row_and_col__no_winner(self):
-        self.assertIsNone(self.board.check_rows_and_cols())
+        with self.assertRaises(Exception) as e:
+            Board(['X', 'O'], columns=4, rows=4, win_length=5)
+        self.assertEqual('Invalid win length: 5 for a 4x4 board', str(e.exception))
 
-    @patch('builtins.print')
-    def test_check_row_and_col__row_winner(self, mock_print):
+    def test_str__empty_board(self):
+        expected = ' ' + '\n '.join(["['_' '_' '_' '_' '_' '_' '_' '_' '_']"] * 6) + \
+            '\n\n   1   2   3   4   5   6   7   8   9  '
 
-        self.board.board_matrix[0][0] = 'X'
-        self.board.board_matrix[1][0] = 'X'
-        self.board.board_matrix[2][0] = 'X'
-        self.board.board_matrix[3][0] = 'X'
-        self.board.board_matrix[4][0] = 'X'
+        self.assertEqual(expected, str(self.board))
 
-        self.assertEqual('X', self.board.check_rows_and_cols())
-        mock_print.assert_called_once_with('Winner by connecting a row')
+    def test_undo__restores_board(self):
+        self.play(self.board, [4, 4, 3])
+        before = (self.board.masks, bytes(self.board.heights), self.board.turns, self.board.last_move)
+        self.board.drop_disc(2, 'O')
 
-    @patch('builtins.print')
-    def test_check_row_and_col__col_winner(self, mock_print):
+        self.assertEqual(2, self.board.undo())
+        self.assertEqual(before, (self.board.masks, bytes(self.board.heights), self.board.turns,
+                                  self.board.last_move))
+        self.assertEqual('X', self.board.last_disc)
 
-        self.board.board_matrix[2] = ['X', 'X', 'X', 'X', 'X', '_']
+    def test_undo__no_moves(self):
 
-        self.assertEqual('X', self.board.check_rows_and_cols())
-        mock_print.assert_called_once_with('Winner by connecting a column')
+        with self.assertRaises(Exception) as e:
+            self.board.undo()
+        self.assertEqual('No move to undo', str(e.exception))
 
-    def test_check_if_line_has_five_in_a_row__winner(self):
+    def test_undo__updates_line_counts(self):
+        self.play(self.board, [0, 0, 1, 1, 2, 2, 3])
+        self.assertEqual([4], self.board.winning_moves('X'))
 
-        self.assertEqual('X', self.board.check_if_line_has_five_in_a_row(['X', 'X', 'X', 'X', 'X', '_']))
+        self.board.undo()
+        self.assertEqual([], self.board.winning_moves('X'))
 
-    def test_check_if_line_has_five_in_a_row__no_winner(self):
+    def test_redo(self):
+        self.play(self.board, [4, 3])
+        self.board.undo()
+        self.board.undo()
+        self.assertIsNone(self.board.last_disc)
 
-        self.assertIsNone(self.board.check_if_line_has_five_in_a_row(['X', 'X', '_', '_', '_', '_']))
+        self.assertEqual(4, self.board.redo())
+        self.assertEqual(3, self.board.redo())
+        self.assertEqual(('X', 'O'), (self.board.get_disc(4, 0), self.board.get_disc(3, 0)))
+        with self.assertRaises(Exception):
+            self.board.redo()
+
+    def test_redo__cleared_by_drop(self):
+        self.play(self.board, [4, 3])
+        self.board.undo()
+        self.board.drop_disc(5, 'O')
+
+        with self.assertRaises(Exception) as e:
+            self.board.redo()
+        self.assertEqual('No move to redo', str(e.exception))
+
+    def test_move_history__allocated_on_use(self):
+        self.assertIsNone(self.board.moves)
+        self.assertIsNone(self.board.undone)
+
+        self.play(self.board, [4, 3])
+        self.board.undo()
+        self.assertEqual(bytearray([4]), self.board.moves)
+        self.assertEqual(bytearray([3 * 2 + 1]), self.board.undone)
+
+    def test_clone__independent(self):
+        self.play(self.board, [4, 3])
+        self.board.lines()
+        clone = self.board.clone()
+        clone.drop_disc(4, 'X')
+        clone.undo()
+        clone.undo()
+
+        self.assertEqual(2, self.board.turns)
+        self.assertEqual('O', self.board.get_disc(3, 0))
+        self.assertEqual(self.board.masks[0], clone.masks[0])
+        self.assertIsNot(self.board.line_counts, clone.line_counts)
+        self.assertIs(self.board.line_counts.table, clone.line_counts.table)
 
 if __name__ == '__main__':
     unittest.main()
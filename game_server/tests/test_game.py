@@ -3,12 +3,17 @@
 Flask unit tests
 """
 import unittest
-from unittest.mock import Mock, patch
+from unittest.mock import MagicMock, Mock, patch
 
 from game_server import create_app
 
-from game_server.game_session import GameSession, Player
-from game_server.game import get_game_session, game_sessions, connect_player_to_game
+from game_server.game_session import GameSession, Player, SessionTable
+from game_server.game import get_game_session, game_sessions, connect_player_to_game, record_game_over
+from game_server.matchmaker import MatchmakingPools
+from game_server.ratings import RatingStore
+from game_server.rate_limit import admission_control, TokenBucketStore
+from game_server.status_cache import StatusCache
+from common.wire import MIMETYPE, decode_game_state, encode_drop_request
 
 
 
@@ -20,6 +25,12 @@ class TestApp(unittest.TestCase):
         self.app = app.test_client()
         self.game = GameSession()
         self.player = Player('Kieran', 'X')
+        rate_limit_patch = patch.object(admission_control, 'buckets', TokenBucketStore())
+        rate_limit_patch.start()
+        self.addCleanup(rate_limit_patch.stop)
+        status_cache_patch = patch('game_server.game.status_cache', StatusCache())
+        status_cache_patch.start()
+        self.addCleanup(status_cache_patch.stop)
 
     @patch('game_server.game.connect_player_to_game')
     def test_connect_to_game__add_player_successful(self, mock_connect_player):
@@ -63,6 +74,113 @@ class TestApp(unittest.TestCase):
         self.assertEqual(res_json['player_turn'], self.game.player_1.player_id)
         self.assertEqual(len(res_json['players']), 2)
 
+    @patch('game_server.game.get_game_session')
+    def test_get_game_status__poll_hint(self, mock_get_game_session):
+
+        mock_get_game_session.return_value = self.game
+
+        res = self.app.get('/api/v1/game_status/123')
+        self.assertEqual(res.headers['Retry-After'], '5')
+        self.assertEqual(res.headers['X-Poll-Interval'], '5.00')
+
+    @patch('game_server.game.get_game_session')
+    def test_get_game_status__cached_until_game_changes(self, mock_get_game_session):
+        self.game.add_player('Kieran')
+        mock_get_game_session.return_value = self.game
+
+        self.app.get(f'/api/v1/game_status/{self.game.game_id}')
+        self.app.get(f'/api/v1/game_status/{self.game.game_id}')
+        self.assertEqual(1, mock_get_game_session.call_count)
+
+        self.game.add_player('John')
+        res_json = self.app.get(f'/api/v1/game_status/{self.game.game_id}').json
+        self.assertEqual('READY', res_json['state'])
+        self.assertEqual(2, mock_get_game_session.call_count)
+
+    def test_get_game_status__rejected_poll_hint(self):
+
+        res = self.app.get('/api/v1/game_status/unknown')
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('Retry-After', res.headers)
+
+    @patch('game_server.game.get_game_session')
+    def test_get_hint(self, mock_get_game_session):
+        self.game.add_player('Kieran')
+        self.game.add_player('John')
+        for col in range(4):
+            self.game.board.drop_disc(col, 'X')
+            self.game.board.drop_disc(col, 'O')
+        mock_get_game_session.return_value = self.game
+
+        res_json = self.app.get(f'/api/v1/hint/{self.game.game_id}').json
+        self.assertEqual(self.game.player_1.player_id, res_json['player_turn'])
+        self.assertEqual(list(range(9)), res_json['legal_moves'])
+        self.assertEqual([4], res_json['winning_moves'])
+        self.assertEqual([], res_json['forced_blocks'])
+        self.assertEqual({self.game.player_1.player_id: [[4, 0]], self.game.player_2.player_id: [[4, 1]]},
+                         res_json['threats'])
+
+    @patch('game_server.game.get_game_session')
+    def test_get_hint__under_session_lock(self, mock_get_game_session):
+        self.game.add_player('Kieran')
+        self.game.add_player('John')
+        mock_get_game_session.return_value = self.game
+        session_lock = MagicMock()
+        # A drop_disc holding the lock would finish before the line counters are read
+        session_lock.__enter__.side_effect = lambda: self.game.board.drop_disc(4, 'X')
+
+        with patch('game_server.game.session_lock', session_lock):
+            res_json = self.app.get(f'/api/v1/hint/{self.game.game_id}').json
+        self.assertEqual(self.game.player_2.player_id, res_json['player_turn'])
+        rebuilt = self.game.board.clone()
+        rebuilt.line_counts = None
+        self.assertEqual(rebuilt.lines().counts, self.game.board.line_counts.counts)
+
+    def test_get_hint__unknown_game(self):
+
+        res = self.app.get('/api/v1/hint/unknown')
+        self.assertEqual(400, res.status_code)
+        self.assertEqual('Game session not found', res.json['message'])
+
+    @patch('game_server.game.get_game_session')
+    def test_takeback(self, mock_get_game_session):
+        self.game.add_player('Kieran')
+        self.game.add_player('John')
+        self.game.board.drop_disc(4, 'X')
+        mock_get_game_session.return_value = self.game
+        player_1, player_2 = self.game.player_1.player_id, self.game.player_2.player_id
+
+        res_json = self.app.post('/api/v1/takeback', json={'game_id': self.game.game_id, 'player_id': player_1}).json
+        self.assertEqual(player_1, res_json['takeback_requested_by'])
+        res_json = self.app.post('/api/v1/takeback/answer', json={'game_id': self.game.game_id, 'player_id': player_2,
+                                                                  'accept': True}).json
+        self.assertEqual(0, self.game.board.turns)
+        self.assertEqual(player_1, res_json['player_turn'])
+        self.assertIsNone(res_json['takeback_requested_by'])
+
+    @patch('game_server.game.get_game_session')
+    def test_answer_takeback__accept_not_boolean(self, mock_get_game_session):
+        self.game.add_player('Kieran')
+        self.game.add_player('John')
+        self.game.board.drop_disc(4, 'X')
+        mock_get_game_session.return_value = self.game
+        self.game.request_takeback(self.game.player_1.player_id)
+
+        res = self.app.post('/api/v1/takeback/answer', json={'game_id': self.game.game_id,
+                                                             'player_id': self.game.player_2.player_id,
+                                                             'accept': 'false'})
+        self.assertEqual(400, res.status_code)
+        self.assertEqual('accept must be true or false: false', res.json['message'])
+        self.assertEqual(1, self.game.board.turns)
+
+    @patch('game_server.game.get_game_session')
+    def test_takeback__not_in_progress(self, mock_get_game_session):
+        mock_get_game_session.return_value = self.game
+
+        res = self.app.post('/api/v1/takeback', json={'game_id': self.game.game_id, 'player_id': '456'})
+        self.assertEqual(400, res.status_code)
+        self.assertEqual('Game is not in progress: WAITING FOR PLAYERS', res.json['message'])
+
     @patch('game_server.game.get_game_session')
     def test_opponent_joined__not_joined(self, mock_get_game_session):
 
@@ -94,6 +212,29 @@ class TestApp(unittest.TestCase):
 
         self.assertEqual(response_json, {'message': 'It is not your turn: 456'})
 
+    @patch('game_server.game.get_game_session')
+    def test_spectate_game__finished_game(self, mock_get_game_session):
+
+        self.game.state = 'WINNER'
+        mock_get_game_session.return_value = self.game
+
+        res = self.app.get('/api/v1/spectate/123')
+        self.assertEqual(res.mimetype, 'text/event-stream')
+        self.assertTrue(res.data.decode().startswith('data: {"game_id": "' + self.game.game_id))
+
+    def test_spectate_game__unknown_game(self):
+
+        self.assertEqual(self.app.get('/api/v1/spectate/123').status_code, 400)
+
+    @patch('game_server.game.get_game_session')
+    def test_drop_disc__game_over(self, mock_get_game_session):
+
+        self.game.state = 'FORFEIT'
+        mock_get_game_session.return_value = self.game
+
+        response_json = self.app.post('/api/v1/drop_disc', json={'game_id': '555', 'player_id': '456', 'column': 5, 'disc': 'O'}).json
+        self.assertEqual(response_json, {'message': 'Game is over: FORFEIT'})
+
     @patch('game_server.game.get_game_session')
     def test_drop_disc__drop_successful(self, mock_get_game_session):
         mock_game_session = Mock()
@@ -104,6 +245,70 @@ class TestApp(unittest.TestCase):
         res = self.app.post('/api/v1/drop_disc', json={'game_id': '555', 'player_id': '456', 'column': 5, 'disc': 'O'})
         self.assertEqual(res.status_code, 200)
 
+    @patch('game_server.game.get_game_session')
+    def test_get_game_status__binary(self, mock_get_game_session):
+
+        self.game.add_player('Kieran')
+        mock_get_game_session.return_value = self.game
+
+        res = self.app.get('/api/v1/game_status/123', headers={'Accept': MIMETYPE})
+        self.assertEqual(res.mimetype, MIMETYPE)
+        self.assertEqual(decode_game_state(res.data)['game_id'], self.game.game_id)
+
+    @patch('game_server.game.get_game_session')
+    def test_drop_disc__binary(self, mock_get_game_session):
+
+        self.game.add_player('Kieran')
+        self.game.add_player('John')
+        mock_get_game_session.return_value = self.game
+
+        res = self.app.post('/api/v1/drop_disc', data=encode_drop_request(self.game.game_id, self.game.player_1.player_id, 2, 'X'),
+                            headers={'Accept': MIMETYPE, 'Content-Type': MIMETYPE})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(decode_game_state(res.data)['player_turn'], self.game.player_2.player_id)
+
+    @patch('game_server.game.get_game_session')
+    def test_get_game_status__rate_limited(self, mock_get_game_session):
+
+        mock_get_game_session.return_value = self.game
+        responses = [self.app.get('/api/v1/game_status/123', headers={'X-Player-Id': 'abc'}) for _ in range(6)]
+
+        self.assertEqual([200] * 5 + [429], [res.status_code for res in responses])
+        self.assertEqual(responses[-1].json, {'message': 'Rate limit exceeded for game.get_game_status'})
+        self.assertEqual(responses[-1].headers['Retry-After'], '1')
+
+    @patch('game_server.game.get_game_session')
+    def test_get_game_status__rate_limited_by_address(self, mock_get_game_session):
+        mock_get_game_session.return_value = self.game
+        for _ in range(5):
+            self.app.get('/api/v1/game_status/123', headers={'X-Player-Id': 'abc'})
+
+        # Made up player ids do not get a new bucket
+        made_up_player_id = '7c9e6679-7425-40de-944b-e07fc1f90ae7'
+        self.assertEqual(429, self.app.get('/api/v1/game_status/123',
+                                           headers={'X-Player-Id': made_up_player_id}).status_code)
+        with patch('game_server.game.known_players', {self.player.player_uuid}):
+            self.assertEqual(200, self.app.get('/api/v1/game_status/123',
+                                               headers={'X-Player-Id': self.player.player_id}).status_code)
+
+    @patch('game_server.game.load_tracker')
+    def test_get_game_status__overloaded(self, mock_load_tracker):
+
+        mock_load_tracker.in_flight = 1000
+        res = self.app.get('/api/v1/game_status/123')
+        self.assertEqual(res.status_code, 429)
+        self.assertEqual(res.json, {'message': 'Server overloaded, try again later'})
+
+    def test_metrics__request_latency_recorded(self):
+
+        self.app.get('/api/v1/game_status/unknown')
+        res = self.app.get('/metrics')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('connect5_request_duration_seconds_count{endpoint="game.get_game_status"}', res.data.decode())
+        self.assertIn('connect5_rejected_requests_total{endpoint="game.get_game_status",status="400"}', res.data.decode())
+        self.assertIn('connect5_sessions{state="waiting"}', res.data.decode())
+
     def test_get_game_session__session_found(self):
 
         self.assertEqual(game_sessions[2], get_game_session(game_sessions[2].game_id))
@@ -115,12 +320,89 @@ class TestApp(unittest.TestCase):
 
         self.assertEqual('Game session not found', str(e.exception))
 
-    @patch('builtins.print')
-    def test_connect_player_to_game__success(self, _):
+    def test_connect_player_to_game__success(self):
 
         game_session, _ = connect_player_to_game('Kieran')
         self.assertEqual(game_sessions[0], game_session)
 
+    @patch('game_server.game.matchmaking', MatchmakingPools())
+    @patch('game_server.game.game_sessions', SessionTable([GameSession(), GameSession()]))
+    def test_connect_player_to_game__custom_board(self):
+        from game_server.game import game_sessions as patched_sessions
+
+        game_session, _ = connect_player_to_game('Kieran', columns=19, rows=19, win_length=5)
+        self.assertEqual(patched_sessions[0], game_session)
+        self.assertEqual({'columns': 19, 'rows': 19, 'win_length': 5}, game_session.board.board_details())
+
+        game_session, _ = connect_player_to_game('John')
+        self.assertEqual(patched_sessions[1], game_session)
+
+    @patch('game_server.game.matchmaking', MatchmakingPools())
+    @patch('game_server.game.ratings', RatingStore())
+    @patch('game_server.game.game_sessions', SessionTable([GameSession(), GameSession(), GameSession()]))
+    def test_connect_player_to_game__matched_by_rating(self):
+        from game_server.game import game_sessions as patched_sessions, ratings as patched_ratings
+
+        patched_ratings.ratings.update({'kieran-account': 2000, 'john-account': 1500, 'mary-account': 1980})
+        connect_player_to_game('Kieran', account_id='kieran-account')
+        connect_player_to_game('John', account_id='john-account')
+        game_session, _ = connect_player_to_game('Mary', account_id='mary-account')
+
+        self.assertEqual(patched_sessions[0], game_session)
+        self.assertEqual(['Kieran', 'Mary'], [player.player_name for player in game_session.players])
+
+    @patch('game_server.game.matchmaking', MatchmakingPools())
+    @patch('game_server.game.ratings', RatingStore())
+    @patch('game_server.game.game_sessions', SessionTable([GameSession(), GameSession(), GameSession()]))
+    def test_connect_player_to_game__reconnect_while_waiting(self):
+        from game_server.game import game_sessions as patched_sessions, matchmaking as patched_matchmaking
+
+        waiting_session, alice = connect_player_to_game('Alice', account_id=b'alice-account...')
+        game_session, player = connect_player_to_game('Alice', account_id=b'alice-account...')
+        self.assertIs(waiting_session, game_session)
+        self.assertIs(alice, player)
+        self.assertEqual(1, len(patched_matchmaking.pool(game_session.board.board_details())))
+
+        game_session, _ = connect_player_to_game('Bob', account_id=b'bob-account.....')
+        self.assertIs(waiting_session, game_session)
+        self.assertEqual([], [session for session in patched_sessions if len(session.players) == 1])
+
+    @patch('game_server.game.matchmaking', MatchmakingPools())
+    @patch('game_server.game.ratings', RatingStore())
+    @patch('game_server.game.game_sessions', SessionTable([GameSession(), GameSession()]))
+    def test_connect_to_game__player_token(self):
+        from game_server.game import game_sessions as patched_sessions, ratings as patched_ratings
+
+        res_json = self.app.get('/api/v1/connect/Kieran').json
+        player_token = res_json['player_token']
+        account_id = patched_ratings.authenticate(player_token)
+        self.assertEqual(account_id, patched_sessions[0].player_1.account_id)
+
+        # The same player under another name keeps their identity and gets their waiting session back
+        res_json = self.app.get('/api/v1/connect/Kier', headers={'X-Player-Token': player_token}).json
+        self.assertEqual(patched_sessions[0].game_id, res_json['game_id'])
+        self.assertEqual(patched_sessions[0].player_1.player_id, res_json['player']['player_id'])
+        self.assertFalse(patched_sessions[1].players)
+
+    def test_connect_to_game__unknown_player_token(self):
+
+        res = self.app.get('/api/v1/connect/Kieran', headers={'X-Player-Token': 'made-up'})
+        self.assertEqual(400, res.status_code)
+        self.assertEqual('Unknown player token', res.json['message'])
+
+    @patch('game_server.game.ratings')
+    def test_record_game_over__ratings_updated(self, mock_ratings):
+
+        self.game.state = 'WINNER'
+        record_game_over(self.game)
+        mock_ratings.record_game.assert_called_once_with(self.game)
+
+    def test_connect_player_to_game__invalid_board(self):
+
+        with self.assertRaises(Exception) as e:
+            connect_player_to_game('Kieran', columns=3, rows=3, win_length=5)
+        self.assertEqual('Invalid win length: 5 for a 3x3 board', str(e.exception))
+
     # Cant be tested due to in memory game sessions
 
     # def test_connect_player_to_game__no_sessions(self):
@@ -1,4 +1,4 @@
-from game_server.game_session import GameSession, Player
+from game_server.game_session import GameSession, Player, SessionTable
 
 import unittest
 from unittest.mock import Mock, patch
@@ -36,22 +36,27 @@ class TestPlayer(unittest.TestCase):
 
         self.assertEqual('Name: Kieran already in use.', str(e.exception))
 
-    @patch('builtins.print')
-    def test_add_player__add_player_1(self, _):
+    def test_add_player__add_player_1(self):
 
         self.game_session.player_1 = None
         self.game_session.add_player('Kieran')
         self.assertTrue(self.game_session.player_1.player_name == 'Kieran')
 
-    @patch('builtins.print')
-    def test_add_player__add_player_2(self, _):
+    def test_add_player__add_player_2(self):
 
         self.game_session.player_2 = None
         self.game_session.add_player('John')
         self.assertTrue(self.game_session.player_2.player_name == 'John')
 
+    @patch('game_server.game_session.log_event')
+    def test_add_player__logs_player_joined(self, mock_log_event):
+
+        self.game_session.player_2 = None
+        self.game_session.add_player('John')
+        mock_log_event.assert_called_once_with('player_joined', game_id=self.game_session.game_id,
+                                               player_id=self.game_session.player_2.player_id, player_number=2)
+
     def test_game_details__initial_game_details(self):
-        self.game_session.game_id = '123'
         self.game_session.player_1 = None
         self.game_session.player_2 = None
 
@@ -83,6 +88,141 @@ class TestPlayer(unittest.TestCase):
         self.game_session.check_for_winner()
         self.assertIsNone(self.game_session.winner)
 
+    def test_forfeit_turn__player_1_turn(self):
+        self.game_session.state = 'READY'
+        self.game_session.forfeit_turn()
+
+        self.assertEqual('FORFEIT', self.game_session.state)
+        self.assertEqual(self.game_session.player_2.player_id, self.game_session.winner)
+
+    def test_forfeit_turn__game_already_won(self):
+        self.game_session.state = 'WINNER'
+        self.game_session.forfeit_turn()
+
+        self.assertEqual('WINNER', self.game_session.state)
+        self.assertIsNone(self.game_session.winner)
+
+    def test_version__changes_with_game(self):
+        game_session = GameSession()
+        versions = [game_session.version]
+        for change in (lambda: game_session.add_player('Kieran'), lambda: game_session.add_player('John'),
+                       lambda: game_session.board.drop_disc(0, 'X'), game_session.forfeit_turn):
+            change()
+            versions.append(game_session.version)
+
+        self.assertEqual(5, len(set(versions)))
+
+    def test_hint__forced_block(self):
+        game_session = GameSession()
+        game_session.add_player('Kieran')
+        game_session.add_player('John')
+        for col, disc in ((0, 'X'), (8, 'O'), (1, 'X'), (8, 'O'), (2, 'X'), (7, 'O'), (3, 'X')):
+            game_session.board.drop_disc(col, disc)
+
+        hint = game_session.hint()
+        self.assertEqual(game_session.player_2.player_id, hint['player_turn'])
+        self.assertEqual([], hint['winning_moves'])
+        self.assertEqual([4], hint['forced_blocks'])
+
+    def test_hint__waiting_for_players(self):
+        game_session = GameSession()
+        game_session.add_player('Kieran')
+
+        hint = game_session.hint()
+        self.assertIsNone(hint['player_turn'])
+        self.assertEqual([], hint['legal_moves'])
+
+
+    def game_in_progress(self, columns):
+        game_session = GameSession()
+        game_session.add_player('Kieran')
+        game_session.add_player('John')
+        for turn, col in enumerate(columns):
+            game_session.board.drop_disc(col, GameSession.DISCS[turn % 2])
+        return game_session
+
+    def test_takeback__accepted_after_opponent_moved(self):
+        game_session = self.game_in_progress([4, 3, 2])
+        player_1, player_2 = game_session.player_1.player_id, game_session.player_2.player_id
+
+        game_session.request_takeback(player_2)
+        self.assertEqual(player_2, game_session.game_details()['takeback_requested_by'])
+        game_session.answer_takeback(player_1, True)
+
+        self.assertEqual(bytearray([4]), game_session.board.moves)
+        self.assertEqual(player_2, game_session.next_player_turn())
+        self.assertIsNone(game_session.takeback_requested_by())
+
+    def test_takeback__declined(self):
+        game_session = self.game_in_progress([4, 3])
+
+        game_session.request_takeback(game_session.player_2.player_id)
+        game_session.answer_takeback(game_session.player_1.player_id, False)
+        self.assertEqual(2, game_session.board.turns)
+
+    def test_takeback__lapses_on_move(self):
+        game_session = self.game_in_progress([4])
+
+        game_session.request_takeback(game_session.player_1.player_id)
+        game_session.board.drop_disc(4, 'O')
+        with self.assertRaises(Exception) as e:
+            game_session.answer_takeback(game_session.player_2.player_id, True)
+        self.assertEqual('No takeback requested', str(e.exception))
+
+    def test_takeback__invalid_requests(self):
+        game_session = self.game_in_progress([4])
+        player_1, player_2 = game_session.player_1.player_id, game_session.player_2.player_id
+
+        with self.assertRaises(Exception) as e:
+            game_session.request_takeback(player_2)
+        self.assertEqual(f'No move to take back: {player_2}', str(e.exception))
+        game_session.request_takeback(player_1)
+        with self.assertRaises(Exception) as e:
+            game_session.answer_takeback(player_1, True)
+        self.assertEqual('Takeback must be answered by the opponent', str(e.exception))
+
+    def test_add_player__same_account(self):
+        game_session = GameSession()
+        game_session.add_player('Kieran', 'kieran-account')
+
+        with self.assertRaises(Exception) as e:
+            game_session.add_player('Kier', 'kieran-account')
+        self.assertEqual('Cannot play against yourself.', str(e.exception))
+
+
+class TestSessionTable(unittest.TestCase):
+
+    def setUp(self):
+        self.taken = GameSession()
+        self.taken.add_player('Kieran')
+        self.free = [GameSession(), GameSession()]
+        self.table = SessionTable([self.free[0], self.taken, self.free[1]])
+
+    def test_get(self):
+
+        self.assertIs(self.taken, self.table.get(self.taken.game_uuid))
+        self.assertIsNone(self.table.get(GameSession().game_uuid))
+
+    def test_take_free__in_order(self):
+
+        self.assertEqual(self.free, [self.table.take_free(), self.table.take_free()])
+        self.assertIsNone(self.table.take_free())
+
+    def test_change_uuid(self):
+        old_uuid, new_uuid = self.free[0].game_uuid, GameSession().game_uuid
+        self.table.change_uuid(self.free[0], new_uuid)
+
+        self.assertIsNone(self.table.get(old_uuid))
+        self.assertIs(self.free[0], self.table.get(new_uuid))
+
+    def test_replace(self):
+        restored = GameSession()
+        self.table.replace([restored])
+
+        self.assertEqual([restored], list(self.table))
+        self.assertIsNone(self.table.get(self.taken.game_uuid))
+        self.assertIs(restored, self.table.take_free())
+
 
 if __name__ == '__main__':
     unittest.main()
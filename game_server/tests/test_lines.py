@@ -0,0 +1,82 @@
+from game_server.game_session import Board
+from game_server.lines import LineCounts, window_table
+
+import random
+import unittest
+
+
+def completes_line(board, mask, col, row):
+    """Brute force: would a disc at (col, row) give mask win_length in a row?"""
+    mask |= 1 << (col * board.rows + row)
+    return any(1 + board.count_discs_in_direction(mask, col, row, col_step, row_step) +
+               board.count_discs_in_direction(mask, col, row, -col_step, -row_step) >= board.win_length
+               for col_step, row_step in Board.DIRECTIONS)
+
+
+class TestWindowTable(unittest.TestCase):
+
+    def test_windows(self):
+        table = window_table(9, 6, 5)
+
+        # 30 horizontal, 18 vertical and 20 diagonal windows
+        self.assertEqual(68, len(table.windows))
+        self.assertEqual(3, len(table.cell_windows[0]))
+
+    def test_window_table__shared_per_geometry(self):
+
+        self.assertIs(window_table(9, 6, 5), window_table(9, 6, 5))
+        self.assertIsNot(window_table(9, 6, 5), window_table(7, 6, 4))
+
+
+class TestLineCounts(unittest.TestCase):
+
+    def setUp(self):
+        self.board = Board(('X', 'O'))
+        for col in range(4):
+            self.board.drop_disc(col, 'X')
+            self.board.drop_disc(col, 'O')
+
+    def test_threats(self):
+
+        self.assertEqual([(4, 0)], self.board.threats('X'))
+        self.assertEqual([(4, 1)], self.board.threats('O'))
+
+    def test_winning_moves(self):
+
+        self.assertEqual([4], self.board.winning_moves('X'))
+        self.assertEqual([], self.board.winning_moves('O'))
+
+    def test_drop_disc__blocks_threat(self):
+        self.board.lines()
+        self.board.drop_disc(8, 'X')
+        self.board.drop_disc(4, 'O')
+
+        self.assertEqual([], self.board.threats('X'))
+        self.assertEqual([4], self.board.winning_moves('O'))
+
+    def test_remove(self):
+        lines = self.board.lines()
+        lines.add(4 * self.board.rows, 1)
+
+        lines.remove(4 * self.board.rows, 1)
+        self.assertEqual(LineCounts(lines.table, self.board.masks).threats, lines.threats)
+        self.assertEqual(LineCounts(lines.table, self.board.masks).counts, lines.counts)
+
+    def test_incremental_matches_brute_force(self):
+        rng = random.Random(0)
+        for columns, rows, win_length in ((9, 6, 5), (7, 6, 4), (5, 4, 3)):
+            board = Board(('X', 'O'), columns, rows, win_length)
+            while board.legal_moves() and not board.check_for_winner():
+                # Counters are built at a random turn and updated incrementally after
+                if board.line_counts is None and rng.random() < 0.7:
+                    board.drop_disc(rng.choice(board.legal_moves()), 'O' if board.last_disc == 'X' else 'X')
+                    continue
+                for player, disc in enumerate(board.valid_discs):
+                    expected = [col for col in board.legal_moves()
+                                if completes_line(board, board.masks[player], col, board.heights[col])]
+                    self.assertEqual(expected, board.winning_moves(disc))
+                    expected_threats = [(col, row) for col in range(columns) for row in range(rows)
+                                        if board.get_disc(col, row) == Board.EMPTY
+                                        and completes_line(board, board.masks[player], col, row)]
+                    self.assertEqual(expected_threats, board.threats(disc))
+                board.drop_disc(rng.choice(board.legal_moves()), 'O' if board.last_disc == 'X' else 'X')
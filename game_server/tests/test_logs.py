@@ -0,0 +1,60 @@
+from game_server.logs import SamplingFilter, StructuredFormatter, DroppingQueueHandler, setup_logging, stop_logging, \
+    log_event
+
+import io
+import json
+import logging
+import unittest
+from queue import Queue
+from unittest.mock import patch
+
+
+class TestLogs(unittest.TestCase):
+
+    def setUp(self):
+        self.record = logging.LogRecord('connect5', logging.INFO, __file__, 1, 'disc_dropped', None, None)
+        self.record.event = 'disc_dropped'
+        self.record.fields = {'game_id': '123', 'player_id': '456'}
+
+    def test_structured_formatter__json_line(self):
+
+        entry = json.loads(StructuredFormatter().format(self.record))
+        self.assertEqual('disc_dropped', entry['event'])
+        self.assertEqual('123', entry['game_id'])
+        self.assertEqual('456', entry['player_id'])
+
+    def test_sampling_filter__no_rules(self):
+
+        self.assertTrue(SamplingFilter({}, {}).filter(self.record))
+
+    @patch('random.random', return_value=0.5)
+    def test_sampling_filter__sampled_out(self, _):
+
+        self.assertFalse(SamplingFilter({'disc_dropped': 0.1}, {}).filter(self.record))
+
+    @patch('game_server.logs.monotonic', return_value=100)
+    def test_sampling_filter__rate_limited(self, _):
+        sampling_filter = SamplingFilter({}, {'disc_dropped': 2})
+
+        self.assertEqual([True, True, False], [sampling_filter.filter(self.record) for _ in range(3)])
+
+    def test_dropping_queue_handler__queue_full(self):
+        handler = DroppingQueueHandler(Queue(1))
+        handler.handle(self.record)
+        handler.handle(self.record)
+
+        self.assertEqual(1, handler.dropped)
+
+    def test_setup_logging__writes_in_background(self):
+        stream = io.StringIO()
+        setup_logging(stream, sample_rates={}, rate_limits={})
+        log_event('game_won', game_id='123', player_id='456')
+        stop_logging()
+
+        self.assertEqual({'event': 'game_won', 'game_id': '123', 'player_id': '456'},
+                         {key: value for key, value in json.loads(stream.getvalue()).items()
+                          if key not in ('time', 'level')})
+
+
+if __name__ == '__main__':
+    unittest.main()
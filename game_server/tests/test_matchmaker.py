@@ -0,0 +1,75 @@
+from game_server.game_session import GameSession
+from game_server.matchmaker import Matchmaker, MatchmakingPools
+
+import unittest
+from unittest.mock import Mock
+
+
+class TestMatchmaker(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Mock(return_value=0)
+        self.matchmaker = Matchmaker(self.clock)
+
+    def test_find__no_waiting_players(self):
+
+        self.assertIsNone(self.matchmaker.find(1500))
+
+    def test_find__nearest_rating(self):
+        far, near = GameSession(), GameSession()
+        self.matchmaker.add(1420, far)
+        self.matchmaker.add(1530, near)
+
+        self.assertEqual(near, self.matchmaker.find(1500))
+
+    def test_find__oldest_in_bucket_first(self):
+        first, second = GameSession(), GameSession()
+        self.matchmaker.add(1510, first)
+        self.matchmaker.add(1505, second)
+
+        self.assertEqual(first, self.matchmaker.find(1500))
+
+    def test_find__newer_ticket_in_range(self):
+        oldest, newer = GameSession(), GameSession()
+        self.matchmaker.add(1549, oldest)
+        self.matchmaker.add(1500, newer)
+
+        self.assertEqual(newer, self.matchmaker.find(1400))
+
+    def test_waiting_session__by_account(self):
+        game_session = GameSession()
+        game_session.add_player('Alice', b'alice-account...')
+        self.matchmaker.add(1500, game_session)
+
+        self.assertIs(game_session, self.matchmaker.waiting_session(b'alice-account...'))
+        self.matchmaker.remove(game_session)
+        self.assertIsNone(self.matchmaker.waiting_session(b'alice-account...'))
+
+    def test_find__window_widens_over_time(self):
+        game_session = GameSession()
+        self.matchmaker.add(1800, game_session)
+
+        self.assertIsNone(self.matchmaker.find(1500))
+        self.clock.return_value = 30
+        self.assertEqual(game_session, self.matchmaker.find(1500))
+
+    def test_remove__bucket_discarded_when_empty(self):
+        game_session = GameSession()
+        self.matchmaker.add(1500, game_session)
+        self.matchmaker.remove(game_session)
+
+        self.assertEqual(0, len(self.matchmaker))
+        self.assertEqual([], self.matchmaker.bucket_keys)
+        self.assertIsNone(self.matchmaker.find(1500))
+
+    def test_pool__per_board_geometry(self):
+        pools = MatchmakingPools()
+
+        self.assertIs(pools.pool({'columns': 9, 'rows': 6, 'win_length': 5}),
+                      pools.pool({'columns': 9, 'rows': 6, 'win_length': 5}))
+        self.assertIsNot(pools.pool({'columns': 9, 'rows': 6, 'win_length': 5}),
+                         pools.pool({'columns': 19, 'rows': 19, 'win_length': 5}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+from game_server.metrics import Counter, Gauge, Histogram, Registry
+
+import unittest
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_counter__expose(self):
+        counter = Counter('moves_total', 'Discs dropped', ['endpoint'])
+        counter.inc('drop_disc')
+        counter.inc('drop_disc', amount=2)
+
+        self.assertEqual('# HELP moves_total Discs dropped\n# TYPE moves_total counter\n'
+                         'moves_total{endpoint="drop_disc"} 3', counter.expose())
+
+    def test_gauge__set(self):
+        gauge = Gauge('sessions', 'Sessions')
+        gauge.set(4)
+
+        self.assertEqual(['sessions 4'], gauge.samples())
+
+    def test_gauge__function(self):
+        gauge = Gauge('sessions', 'Sessions', ['state'])
+        gauge.set_function(lambda: {('waiting',): 2, ('active',): 1})
+
+        self.assertEqual(['sessions{state="active"} 1', 'sessions{state="waiting"} 2'], gauge.samples())
+
+    def test_histogram__cumulative_buckets(self):
+        histogram = Histogram('latency', 'Latency', ['endpoint'], buckets=(0.1, 1.0))
+        histogram.observe(0.0625, 'status')
+        histogram.observe(0.5, 'status')
+        histogram.observe(5, 'status')
+
+        self.assertEqual(['latency_bucket{endpoint="status",le="0.1"} 1',
+                          'latency_bucket{endpoint="status",le="1.0"} 2',
+                          'latency_bucket{endpoint="status",le="+Inf"} 3',
+                          'latency_sum{endpoint="status"} 5.5625',
+                          'latency_count{endpoint="status"} 3'], histogram.samples())
+
+    def test_histogram__time(self):
+        histogram = Histogram('latency', 'Latency', ['operation'])
+        with histogram.time('drop_disc'):
+            pass
+
+        self.assertIn('latency_count{operation="drop_disc"} 1', histogram.samples())
+
+    def test_registry__expose(self):
+        registry = Registry()
+        registry.register(Counter('joins_total', 'Joins')).inc()
+
+        self.assertEqual('# HELP joins_total Joins\n# TYPE joins_total counter\njoins_total 1\n', registry.expose())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+from game_server.poll_hints import LoadTracker, poll_interval, add_poll_hint, MAX_POLL_INTERVAL
+
+import unittest
+from unittest.mock import Mock, patch
+
+
+class TestPollHints(unittest.TestCase):
+
+    def test_load_tracker__load_factor(self):
+        load_tracker = LoadTracker()
+        self.assertEqual(1, load_tracker.load_factor())
+
+        for _ in range(33):
+            load_tracker.started()
+        self.assertEqual(2, load_tracker.load_factor())
+
+        load_tracker.finished()
+        self.assertLess(load_tracker.load_factor(), 2)
+
+    def test_poll_interval__by_state(self):
+
+        self.assertLess(poll_interval('READY'), poll_interval('WAITING FOR PLAYERS'))
+        self.assertLess(poll_interval('WAITING FOR PLAYERS'), poll_interval('WINNER'))
+
+    @patch('game_server.poll_hints.load_tracker')
+    def test_poll_interval__grows_with_load(self, mock_load_tracker):
+        mock_load_tracker.load_factor.return_value = 3
+
+        self.assertEqual(6, poll_interval('READY'))
+
+    @patch('game_server.poll_hints.load_tracker')
+    def test_poll_interval__capped(self, mock_load_tracker):
+        mock_load_tracker.load_factor.return_value = 1000
+
+        self.assertEqual(MAX_POLL_INTERVAL, poll_interval('READY'))
+
+    def test_add_poll_hint__headers(self):
+        response = Mock(headers={})
+
+        add_poll_hint(response, 'READY')
+        self.assertEqual({'Retry-After': '2', 'X-Poll-Interval': '2.00'}, response.headers)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+from game_server import create_app
+from game_server.profiling import RequestProfiler, StackSampler, collapse_stack, profiling_allowed
+
+import os
+import pstats
+import sys
+import tempfile
+import unittest
+from threading import Event, Thread
+
+
+def wait_for_sampler(started, done):
+    started.set()
+    done.wait(5)
+
+
+class TestRequestProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.profiler = RequestProfiler(self.directory)
+
+    def test_should_profile__header(self):
+
+        self.assertTrue(self.profiler.should_profile({'X-Profile': '1'}))
+        self.assertFalse(self.profiler.should_profile({}))
+
+    def test_should_profile__sampled(self):
+        self.profiler.sample_rate = 1.0
+
+        self.assertTrue(self.profiler.should_profile({}))
+
+    def test_start__not_profiled(self):
+
+        self.assertIsNone(self.profiler.start({}))
+
+    def test_start__not_allowed(self):
+
+        self.assertIsNone(self.profiler.start({'X-Profile': '1'}, allowed=False))
+
+    def test_start__max_dumps(self):
+        self.profiler.max_dumps = 1
+        self.profiler.finish(self.profiler.start({'X-Profile': '1'}), 'metrics')
+
+        self.assertIsNone(self.profiler.start({'X-Profile': '1'}))
+
+    def test_profiling_allowed(self):
+
+        self.assertTrue(profiling_allowed('127.0.0.1', {}))
+        self.assertTrue(profiling_allowed('::1', {}))
+        self.assertFalse(profiling_allowed('203.0.113.7', {'X-Profile': '1'}))
+        self.assertFalse(profiling_allowed('203.0.113.7', {'X-Profile': 'wrong'}, 'secret'))
+        self.assertTrue(profiling_allowed('203.0.113.7', {'X-Profile': 'secret'}, 'secret'))
+
+    def test_finish__dumps_pstats(self):
+        profile = self.profiler.start({'X-Profile': '1'})
+        sorted(range(100))
+
+        path = self.profiler.finish(profile, 'game.get_game_status')
+        self.assertTrue(os.path.basename(path).startswith('game.get_game_status-'))
+        self.assertGreater(pstats.Stats(path).total_calls, 0)
+
+
+class TestStackSampler(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.sampler = StackSampler(self.directory, interval=0.001)
+
+    def test_collapse_stack(self):
+
+        stack = collapse_stack(sys._getframe())
+        self.assertTrue(stack.endswith('test_profiling.py:test_collapse_stack'))
+
+    def test_sample__other_threads(self):
+        started, done = Event(), Event()
+        thread = Thread(target=wait_for_sampler, args=(started, done))
+        thread.start()
+        started.wait(5)
+
+        self.sampler.sample()
+        done.set()
+        thread.join()
+        self.assertTrue(any('wait_for_sampler' in stack for stack in self.sampler.samples))
+        self.assertFalse(any('test_sample__other_threads' in stack for stack in self.sampler.samples))
+
+    def test_stop__not_running(self):
+
+        self.assertIsNone(self.sampler.stop())
+
+    def test_start__max_dumps(self):
+        self.sampler.max_dumps = 1
+        self.assertTrue(self.sampler.start())
+        self.sampler.stop()
+
+        self.assertFalse(self.sampler.start())
+        self.assertFalse(self.sampler.running)
+
+    def test_start_stop__dumps_collapsed_stacks(self):
+        self.sampler.start()
+        self.assertTrue(self.sampler.running)
+        Event().wait(0.02)
+
+        path = self.sampler.stop()
+        self.assertFalse(self.sampler.running)
+        with open(path) as samples_file:
+            lines = samples_file.read().splitlines()
+        self.assertTrue(lines)
+        self.assertTrue(all(line.rsplit(' ', 1)[1].isdigit() for line in lines))
+
+
+class TestProfilingRoutes(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.app = create_app(profile_dir=self.directory).test_client()
+
+    def test_profile_header(self):
+        self.app.get('/metrics', headers={'X-Profile': '1'})
+        self.app.get('/metrics')
+
+        self.assertEqual(1, len(os.listdir(self.directory)))
+
+    def test_sampler_routes(self):
+        self.assertTrue(self.app.post('/profiler/start').json['running'])
+
+        file_name = self.app.post('/profiler/stop').json['file']
+        self.assertTrue(os.path.exists(os.path.join(self.directory, file_name)))
+
+    def test_remote_client__ignored_without_token(self):
+        remote = {'REMOTE_ADDR': '203.0.113.7'}
+        self.app.get('/metrics', headers={'X-Profile': '1'}, environ_base=remote)
+
+        self.assertEqual([], os.listdir(self.directory))
+        self.assertEqual(403, self.app.post('/profiler/start', environ_base=remote).status_code)
+        self.assertEqual(403, self.app.post('/profiler/stop', environ_base=remote).status_code)
+
+    def test_remote_client__profile_token(self):
+        app = create_app(profile_dir=self.directory, profile_token='secret').test_client()
+        remote = {'REMOTE_ADDR': '203.0.113.7'}
+        app.get('/metrics', headers={'X-Profile': 'wrong'}, environ_base=remote)
+        app.get('/metrics', headers={'X-Profile': 'secret'}, environ_base=remote)
+
+        self.assertEqual(1, len(os.listdir(self.directory)))
+        headers = {'X-Profile': 'secret'}
+        self.assertTrue(app.post('/profiler/start', headers=headers, environ_base=remote).json['running'])
+        app.post('/profiler/stop', headers=headers, environ_base=remote)
+
+    def test_disabled(self):
+
+        self.assertEqual(404, create_app().test_client().post('/profiler/start').status_code)
@@ -0,0 +1,61 @@
+from game_server.rate_limit import TokenBucketStore, AdmissionControl
+
+import unittest
+from unittest.mock import Mock
+
+
+class TestTokenBucketStore(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Mock(return_value=0)
+        self.buckets = TokenBucketStore(max_buckets=4, shards=1, clock=self.clock)
+
+    def test_take__burst_then_wait(self):
+
+        self.assertEqual([0, 0, 0.5], [self.buckets.take('player', 2, 2) for _ in range(3)])
+
+    def test_take__refills_over_time(self):
+        self.buckets.take('player', 2, 1)
+        self.clock.return_value = 0.5
+
+        self.assertEqual(0, self.buckets.take('player', 2, 1))
+
+    def test_take__memory_bounded(self):
+        for player in range(10):
+            self.buckets.take(player, 1, 1)
+
+        self.assertEqual(4, len(self.buckets))
+
+    def test_take__evicts_least_recently_used(self):
+        for player in range(4):
+            self.buckets.take(player, 1, 1)
+        self.buckets.take(0, 1, 1)
+        self.buckets.take(4, 1, 1)
+
+        self.assertIn(0, self.buckets.shards[0][0])
+        self.assertNotIn(1, self.buckets.shards[0][0])
+
+
+class TestAdmissionControl(unittest.TestCase):
+
+    def setUp(self):
+        self.admission_control = AdmissionControl({'game.drop_disc': (1, 1)}, (10, 10), max_in_flight=2,
+                                                  buckets=TokenBucketStore(clock=Mock(return_value=0)))
+
+    def test_check__admitted(self):
+
+        self.assertIsNone(self.admission_control.check('game.drop_disc', 'player', 1))
+
+    def test_check__rate_limited(self):
+        self.admission_control.check('game.drop_disc', 'player', 1)
+
+        self.assertEqual(('Rate limit exceeded for game.drop_disc', 1), self.admission_control.check('game.drop_disc', 'player', 1))
+        self.assertIsNone(self.admission_control.check('game.get_game_status', 'player', 1))
+
+    def test_check__overloaded(self):
+
+        self.assertEqual(('Server overloaded, try again later', 1.0), self.admission_control.check('game.drop_disc', 'player', 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
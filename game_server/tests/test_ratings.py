@@ -0,0 +1,103 @@
+from game_server.game_session import GameSession
+from game_server.ratings import RatingStore, expected_score
+
+import os
+import tempfile
+import unittest
+from uuid import UUID
+
+
+class TestRatings(unittest.TestCase):
+
+    def setUp(self):
+        self.ratings = RatingStore()
+
+    def test_expected_score__equal_ratings(self):
+
+        self.assertEqual(0.5, expected_score(1500, 1500))
+
+    def test_rating__new_player(self):
+
+        self.assertEqual(1500, self.ratings.rating('Kieran'))
+
+    def test_record_result__equal_ratings(self):
+
+        self.assertEqual((1516, 1484), self.ratings.record_result('Kieran', 'John'))
+
+    def test_record_result__upset_moves_more_points(self):
+        self.ratings.ratings['John'] = 1900
+
+        winner_rating, _ = self.ratings.record_result('Kieran', 'John')
+        self.assertGreater(winner_rating - 1500, 16)
+
+    def test_record_game__player_2_won(self):
+        game_session = GameSession()
+        game_session.add_player('Kieran', 'kieran-account')
+        game_session.add_player('John', 'john-account')
+        game_session.winner = game_session.player_2.player_id
+
+        self.ratings.record_game(game_session)
+        self.assertEqual(1516, self.ratings.rating('john-account'))
+        self.assertEqual(1484, self.ratings.rating('kieran-account'))
+
+    def test_record_game__not_rated_without_accounts(self):
+        game_session = GameSession()
+        game_session.add_player('Kieran')
+        game_session.add_player('John')
+        game_session.winner = game_session.player_2.player_id
+
+        self.ratings.record_game(game_session)
+        self.assertEqual({}, self.ratings.ratings)
+
+    def test_authenticate(self):
+        account_id, player_token = self.ratings.register()
+
+        self.assertEqual(account_id, self.ratings.authenticate(player_token))
+        self.assertEqual(account_id, RatingStore(secret=self.ratings.secret).authenticate(player_token))
+        for made_up in ('made-up', f'{account_id}.made-up', RatingStore().register()[1]):
+            with self.assertRaises(Exception) as e:
+                self.ratings.authenticate(made_up)
+            self.assertEqual('Unknown player token', str(e.exception))
+
+    def test_register__16_byte_account_id(self):
+        account_id, player_token = self.ratings.register()
+
+        self.assertEqual(16, len(account_id))
+        self.assertTrue(player_token.startswith(f'{UUID(bytes=account_id)}.'))
+
+    def test_save_and_load(self):
+        self.ratings.record_result(self.ratings.register()[0], self.ratings.register()[0])
+        path = os.path.join(tempfile.mkdtemp(), 'ratings.json')
+        self.ratings.save(path)
+
+        account_id, player_token = self.ratings.register()
+        self.ratings.save(path)
+
+        loaded = RatingStore()
+        loaded.load(path)
+        self.assertEqual(self.ratings.ratings, loaded.ratings)
+        self.assertEqual(account_id, loaded.authenticate(player_token))
+
+    def test_hand_off__changes_since_last_hand_off(self):
+        self.ratings.record_result('Kieran', 'John')
+        self.ratings.record_result('Mary', 'Anna')
+        kept = {'Mary', 'Anna'}
+
+        self.assertEqual({'Kieran': 16, 'John': -16}, self.ratings.hand_off(kept.__contains__))
+        self.ratings.record_result('John', 'Kieran')
+        changes = self.ratings.hand_off(kept.__contains__, forget=True)
+        self.assertEqual({'Kieran', 'John'}, set(changes))
+        self.assertEqual(0, sum(changes.values()))
+        self.assertEqual(kept, set(self.ratings.ratings))
+
+    def test_take_over(self):
+        old_owner = RatingStore()
+        old_owner.record_result('Kieran', 'John')
+        old_owner.record_result('John', 'Kieran')
+
+        self.ratings.take_over(old_owner.hand_off(lambda account_id: False))
+        self.assertEqual(old_owner.ratings, self.ratings.ratings)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,218 @@
+import json
+import unittest
+from unittest.mock import Mock
+from uuid import uuid4
+
+from game_server.router import Router, create_router_app
+from game_server.sharding import HashRing
+from common.wire import MIMETYPE, encode_drop_request
+
+
+class ShardResponse:
+
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.content = json.dumps(body).encode()
+        self.headers = {'Content-Type': 'application/json', 'Content-Length': str(len(self.content))}
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class FakeShards:
+    """
+    Records the requests sent to shards and answers them with handle. /shard reports free_sessions and
+    /shard/ratings hands off the rating changes in handed_off.
+    """
+
+    def __init__(self, handle=None):
+        self.requests = []
+        self.handle = handle or (lambda shard, path: ShardResponse(200, {'shard': shard}))
+        self.free_sessions = {}
+        self.handed_off = {}
+        self.load_requests = 0
+
+    def request(self, method, url, headers=None, data=None, stream=False, json=None):
+        shard, path = url.split('/', 3)[2], '/' + url.split('/', 3)[3]
+        if path == '/shard' and method == 'GET':
+            self.load_requests += 1
+            return ShardResponse(200, {'shard': shard, 'free_sessions': self.free_sessions.get(shard, 10)})
+        self.requests.append((method, shard, path, json))
+        if path == '/shard/ratings':
+            return ShardResponse(200, {'ratings': self.handed_off.get(shard, {}) if method == 'POST' else {}})
+        if path == '/shard':
+            return ShardResponse(200, {'shard': shard, 'shards': json['shards'],
+                                       'free_sessions': self.free_sessions.get(shard, 10)})
+        return self.handle(shard, path)
+
+
+def connect_response(disc):
+    return ShardResponse(200, {'player': {'disc': disc}, 'game_id': 'game', 'rating': 1500})
+
+
+class TestRouter(unittest.TestCase):
+
+    def setUp(self):
+        self.shards = FakeShards()
+        self.clock = Mock(return_value=0)
+        self.router = Router({'shard-0': 'http://shard-0', 'shard-1': 'http://shard-1'}, self.shards, self.clock)
+        self.game_id = '0f8fad5b-d9cb-469f-a165-70867728950e'
+
+    def test_route_game__owner(self):
+        owner = self.router.ring.shard_for(self.game_id)
+
+        response = self.router.route_game(self.game_id, 'GET', f'/api/v1/game_status/{self.game_id}')
+        self.assertEqual({'shard': owner}, response.json())
+
+    def test_route_connect__least_loaded(self):
+        self.shards.handle = lambda shard, path: connect_response('O')
+        self.shards.free_sessions = {'shard-0': 3, 'shard-1': 5}
+
+        self.router.route_connect((9, 6, 5), '/api/v1/connect/Kieran')
+        self.assertEqual('shard-1', self.shards.requests[0][1])
+
+    def test_route_connect__free_sessions_refreshed(self):
+        self.shards.handle = lambda shard, path: connect_response('X')
+        self.shards.free_sessions = {'shard-0': 5, 'shard-1': 5}
+        self.router.route_connect((7, 6, 5), '/api/v1/connect/Kieran')
+        self.router.route_connect(('9', None, None), '/api/v1/connect/John')
+
+        self.assertEqual(2, self.shards.load_requests)
+        self.assertEqual(['shard-0', 'shard-1'], [shard for _, shard, _, _ in self.shards.requests])
+
+        # Shard 1 finished games since
+        self.shards.free_sessions = {'shard-0': 4, 'shard-1': 9}
+        self.clock.return_value = 2
+        self.router.route_connect((11, 6, 5), '/api/v1/connect/Anna')
+        self.assertEqual(4, self.shards.load_requests)
+        self.assertEqual('shard-1', self.shards.requests[-1][1])
+
+    def test_route_connect__waiting_player_shard_first(self):
+        self.shards.handle = lambda shard, path: connect_response('X')
+        self.router.route_connect((9, 6, 5), '/api/v1/connect/Kieran')
+        waiting_shard = self.shards.requests[0][1]
+
+        self.shards.handle = lambda shard, path: connect_response('O')
+        self.router.route_connect((9, 6, 5), '/api/v1/connect/John')
+        self.assertEqual(waiting_shard, self.shards.requests[1][1])
+        self.assertEqual({}, self.router.waiting)
+
+    def test_route_connect__full_shard(self):
+        full = ShardResponse(400, {'message': 'Could not find available session for player to join. '
+                                              'Max sessions reached'})
+        self.shards.handle = lambda shard, path: full if shard == 'shard-0' else connect_response('X')
+
+        response = self.router.route_connect((9, 6, 5), '/api/v1/connect/Kieran')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual({(9, 6, 5): 'shard-1'}, self.router.waiting)
+
+    def test_route_connect__returning_player_to_account_shard(self):
+        account_id = next(account_id for account_id in (str(uuid4()) for _ in range(1000))
+                          if self.router.ring.shard_for(account_id) == 'shard-0')
+        self.shards.handle = lambda shard, path: connect_response('X')
+        self.shards.free_sessions = {'shard-0': 1, 'shard-1': 9}
+        self.router.waiting[(9, 6, 5)] = 'shard-1'
+
+        self.router.route_connect((9, 6, 5), '/api/v1/connect/Kieran', {'X-Player-Token': f'{account_id}.signature'})
+        self.assertEqual('shard-0', self.shards.requests[0][1])
+
+    def test_add_shard__hands_off_ratings(self):
+        ring = HashRing(['shard-0', 'shard-1', 'shard-2'])
+        account_id = next(account_id for account_id in (str(uuid4()) for _ in range(1000))
+                          if ring.shard_for(account_id) == 'shard-2')
+        self.shards.handed_off = {'shard-0': {account_id: 16}}
+
+        self.router.add_shard('shard-2', 'http://shard-2')
+        self.assertIn(('PUT', 'shard-2', '/shard/ratings', {'ratings': {account_id: 16}}), self.shards.requests)
+        self.router.finish_rebalance()
+        self.assertEqual([(shard, {'shards': ring.shards, 'forget': True}) for shard in ('shard-0', 'shard-1')],
+                         [(shard, body) for method, shard, path, body in self.shards.requests[-3:]
+                          if method == 'POST'])
+
+    def test_add_shard__pushes_ring(self):
+        self.router.add_shard('shard-2', 'http://shard-2')
+
+        pushed = [(shard, body) for method, shard, _, body in self.shards.requests if method == 'PUT']
+        self.assertEqual(3, len(pushed))
+        self.assertTrue(all(body == {'shards': ['shard-0', 'shard-1', 'shard-2']} for _, body in pushed))
+
+    def test_add_shard__refused_while_rebalancing(self):
+        self.router.remove_shard('shard-1')
+
+        with self.assertRaises(Exception):
+            self.router.add_shard('shard-2', 'http://shard-2')
+        self.assertEqual(['shard-0'], self.router.ring.shards)
+        self.assertNotIn('shard-2', self.router.shard_urls)
+
+        self.router.finish_rebalance()
+        self.router.add_shard('shard-2', 'http://shard-2')
+        self.assertEqual(['shard-0', 'shard-2'], self.router.ring.shards)
+
+    def test_route_game__previous_owner_while_rebalancing(self):
+        game_id = next(game_id for game_id in (f'game-{number}' for number in range(1000))
+                       if HashRing(['shard-0', 'shard-1', 'shard-2']).shard_for(game_id) == 'shard-2')
+        previous_owner = self.router.ring.shard_for(game_id)
+        self.router.add_shard('shard-2', 'http://shard-2')
+        self.shards.handle = lambda shard, path: (ShardResponse(200, {'shard': shard}) if shard == previous_owner
+                                                  else ShardResponse(400, {'message': 'Game session not found'}))
+
+        response = self.router.route_game(game_id, 'GET', f'/api/v1/game_status/{game_id}')
+        self.assertEqual({'shard': previous_owner}, response.json())
+
+        self.router.finish_rebalance()
+        self.assertEqual(400, self.router.route_game(game_id, 'GET', f'/api/v1/game_status/{game_id}').status_code)
+
+
+class TestRouterApp(unittest.TestCase):
+
+    def setUp(self):
+        self.shards = FakeShards()
+        self.router = Router({'shard-0': 'http://shard-0', 'shard-1': 'http://shard-1'}, self.shards)
+        self.app = create_router_app(self.router).test_client()
+        self.game_id = '0f8fad5b-d9cb-469f-a165-70867728950e'
+        self.owner = self.router.ring.shard_for(self.game_id)
+
+    def test_game_status(self):
+
+        self.assertEqual({'shard': self.owner}, self.app.get(f'/api/v1/game_status/{self.game_id}').json)
+
+    def test_drop_disc__json(self):
+        self.app.post('/api/v1/drop_disc', json={'game_id': self.game_id, 'player_id': 'player', 'column': 1,
+                                                 'disc': 'X'})
+
+        self.assertEqual(('POST', self.owner, '/api/v1/drop_disc', None), self.shards.requests[0])
+
+    def test_drop_disc__binary(self):
+        body = encode_drop_request(self.game_id, '7c9e6679-7425-40de-944b-e07fc1f90ae7', 1, 'X')
+        self.app.post('/api/v1/drop_disc', data=body, content_type=MIMETYPE)
+
+        self.assertEqual(self.owner, self.shards.requests[0][1])
+
+    def test_takeback(self):
+        self.app.post('/api/v1/takeback/answer', json={'game_id': self.game_id, 'player_id': 'player', 'accept': True})
+
+        self.assertEqual(('POST', self.owner, '/api/v1/takeback/answer', None), self.shards.requests[0])
+
+    def test_drop_disc__no_game_id(self):
+
+        response = self.app.post('/api/v1/drop_disc', json={})
+        self.assertEqual(400, response.status_code)
+        self.assertEqual([], self.shards.requests)
+
+    def test_connect__query_string_forwarded(self):
+        self.shards.handle = lambda shard, path: connect_response('X')
+
+        self.app.get('/api/v1/connect/Kieran?columns=7')
+        self.assertEqual('/api/v1/connect/Kieran?columns=7', self.shards.requests[0][2])
+
+    def test_connect__same_geometry_finds_waiting_player(self):
+        self.shards.handle = lambda shard, path: connect_response('X')
+        self.app.get('/api/v1/connect/Kieran')
+        waiting_shard = self.shards.requests[0][1]
+        self.shards.free_sessions = {waiting_shard: 0}
+        self.router.refresh_load(force=True)
+
+        self.shards.handle = lambda shard, path: connect_response('O')
+        self.app.get('/api/v1/connect/John?columns=9&rows=06&win_length=5')
+        self.assertEqual(waiting_shard, self.shards.requests[1][1])
+        self.assertEqual({}, self.router.waiting)
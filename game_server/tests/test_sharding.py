@@ -0,0 +1,87 @@
+from game_server import create_app
+from game_server.game import game_sessions
+from game_server.ratings import ratings
+from game_server.sharding import HashRing, mint_uuid
+
+import unittest
+from unittest.mock import patch
+from uuid import UUID, uuid4
+
+
+class TestHashRing(unittest.TestCase):
+
+    def setUp(self):
+        self.ring = HashRing(['shard-0', 'shard-1', 'shard-2'])
+        self.game_ids = [str(uuid4()) for _ in range(3000)]
+
+    def test_shard_for__no_shards(self):
+        with self.assertRaises(Exception) as e:
+            HashRing().shard_for('game')
+        self.assertEqual('No shards available', str(e.exception))
+
+    def test_shard_for__spreads_games(self):
+        owners = [self.ring.shard_for(game_id) for game_id in self.game_ids]
+
+        for shard in self.ring.shards:
+            self.assertGreater(owners.count(shard), 600)
+
+    def test_add__moves_games_to_new_shard_only(self):
+        before = {game_id: self.ring.shard_for(game_id) for game_id in self.game_ids}
+
+        self.ring.add('shard-3')
+        moved = [game_id for game_id in self.game_ids if self.ring.shard_for(game_id) != before[game_id]]
+        self.assertTrue(all(self.ring.shard_for(game_id) == 'shard-3' for game_id in moved))
+        self.assertLess(len(moved), 1200)
+
+    def test_remove(self):
+        before = {game_id: self.ring.shard_for(game_id) for game_id in self.game_ids}
+
+        self.ring.remove('shard-1')
+        self.assertEqual(['shard-0', 'shard-2'], self.ring.shards)
+        self.assertTrue(all(self.ring.shard_for(game_id) == owner
+                            for game_id, owner in before.items() if owner != 'shard-1'))
+
+    def test_mint_uuid(self):
+
+        game_uuid = mint_uuid(self.ring, 'shard-2')
+        self.assertEqual('shard-2', self.ring.shard_for(str(UUID(bytes=game_uuid))))
+
+
+class TestShardWorker(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(setattr, ratings, 'new_account_id', ratings.new_account_id)
+        self.app = create_app(shard='shard-1', shards=['shard-0', 'shard-1']).test_client()
+
+    def test_register_shard__mints_session_ids(self):
+        ring = HashRing(['shard-0', 'shard-1'])
+
+        self.assertTrue(all(ring.shard_for(game_session.game_id) == 'shard-1' for game_session in game_sessions
+                            if not game_session.players))
+
+    def test_update_ring(self):
+        shards = ['shard-0', 'shard-1', 'shard-2']
+
+        self.assertEqual(shards, self.app.put('/shard', json={'shards': shards}).json['shards'])
+        ring = HashRing(shards)
+        self.assertTrue(all(ring.shard_for(game_session.game_id) == 'shard-1' for game_session in game_sessions
+                            if not game_session.players))
+
+    def test_register_shard__mints_account_ids(self):
+
+        account_id, _ = ratings.register()
+        self.assertEqual('shard-1', HashRing(['shard-0', 'shard-1']).shard_for(str(UUID(bytes=account_id))))
+
+    def test_hand_off_ratings(self):
+        shards = ['shard-0', 'shard-1', 'shard-2']
+        ring = HashRing(shards)
+        moved = next(account_id for account_id in (uuid4() for _ in range(1000))
+                     if ring.shard_for(str(account_id)) == 'shard-2')
+
+        with patch.dict(ratings.ratings, {moved.bytes: 1516}, clear=True):
+            response = self.app.post('/shard/ratings', json={'shards': shards, 'forget': True})
+            self.assertEqual({str(moved): 16}, response.json['ratings'])
+            self.assertNotIn(moved.bytes, ratings.ratings)
+
+            self.app.put('/shard/ratings', json={'ratings': {str(moved): 16}})
+            self.assertEqual(1516, ratings.rating(moved.bytes))
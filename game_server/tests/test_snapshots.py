@@ -0,0 +1,126 @@
+from game_server.game_session import GameSession, session_lock
+from game_server.snapshots import Snapshotter, capture_sessions, decode_snapshot, encode_snapshot, \
+    load_latest_snapshot, pack_snapshot, snapshot_paths, write_snapshot
+
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+from uuid import UUID
+
+
+def game_in_progress(columns):
+    game_session = GameSession()
+    game_session.add_player('Kieran', UUID('0f8fad5b-d9cb-469f-a165-70867728950e').bytes)
+    game_session.add_player('Jöhn')
+    for column in columns:
+        game_session.board.drop_disc(column, GameSession.DISCS[game_session.board.turns % 2])
+    return game_session
+
+
+class TestSnapshots(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def assertSessionEqual(self, expected, actual):
+        self.assertEqual(expected.game_id, actual.game_id)
+        self.assertEqual(expected.state, actual.state)
+        self.assertEqual(expected.winner, actual.winner)
+        self.assertEqual(expected.started_at, actual.started_at)
+        self.assertEqual([(p.player_name, p.player_id, p.disc, p.account_id) for p in expected.players],
+                         [(p.player_name, p.player_id, p.disc, p.account_id) for p in actual.players])
+        self.assertEqual(expected.board.board_details(), actual.board.board_details())
+        self.assertEqual(expected.board.masks, actual.board.masks)
+        self.assertEqual(str(expected.board), str(actual.board))
+        self.assertEqual(expected.board.moves, actual.board.moves)
+        self.assertEqual(expected.board.last_disc, actual.board.last_disc)
+
+    def test_round_trip(self):
+        waiting = GameSession()
+        waiting.add_player('Kieran')
+        won = game_in_progress([0, 1, 0, 1, 0, 1, 0, 1, 0])
+        won.state = GameSession.WINNER
+        won.winner = won.player_1.player_id
+        game_sessions = [GameSession(), waiting, game_in_progress([4, 4, 3]), won]
+
+        restored = decode_snapshot(encode_snapshot(game_sessions))
+
+        self.assertEqual(len(game_sessions), len(restored))
+        for expected, actual in zip(game_sessions, restored):
+            self.assertSessionEqual(expected, actual)
+
+    def test_restored_game_continues(self):
+        restored, = decode_snapshot(encode_snapshot([game_in_progress([4, 4, 3])]))
+
+        restored.board.drop_disc(3, GameSession.DISCS[1])
+        self.assertEqual(0, restored.board.heights[0])
+        self.assertEqual(2, restored.board.heights[3])
+        self.assertEqual(GameSession.DISCS[1], restored.board.last_disc)
+        self.assertTrue(restored.board.legal_moves())
+
+    def test_decode_snapshot__unsupported(self):
+        with self.assertRaises(Exception):
+            decode_snapshot(b'not a snapshot')
+
+    def test_write_snapshot__keeps_newest(self):
+        for _ in range(5):
+            write_snapshot(self.directory, [GameSession()], keep=2)
+        self.assertEqual(2, len(snapshot_paths(self.directory)))
+        self.assertFalse([name for name in os.listdir(self.directory) if name.endswith('.partial')])
+
+    def test_load_latest_snapshot__none(self):
+        self.assertIsNone(load_latest_snapshot(self.directory))
+
+    def test_snapshotter__fork(self):
+        if not hasattr(os, 'fork'):
+            self.skipTest('fork is not available')
+        game_sessions = [game_in_progress([4])]
+        Snapshotter(self.directory, game_sessions, use_fork=True).snapshot().join()
+
+        restored, = load_latest_snapshot(self.directory)
+        self.assertSessionEqual(game_sessions[0], restored)
+
+    def test_snapshotter__fork_holds_session_lock(self):
+        if not hasattr(os, 'fork'):
+            self.skipTest('fork is not available')
+        lock = MagicMock()
+        with patch('game_server.snapshots.session_lock', lock):
+            Snapshotter(self.directory, [game_in_progress([4])], use_fork=True).snapshot().join()
+
+        lock.__enter__.assert_called_once()
+        self.assertEqual(1, len(load_latest_snapshot(self.directory)))
+
+    def test_snapshotter__thread_waits_for_session_lock(self):
+        snapshotter = Snapshotter(self.directory, [game_in_progress([4])], use_fork=False)
+        with session_lock:
+            thread = snapshotter.snapshot()
+            thread.join(0.05)
+            # A change in progress holds the lock, the snapshot waits for it to finish
+            self.assertTrue(thread.is_alive())
+        thread.join()
+
+        self.assertEqual(1, len(load_latest_snapshot(self.directory)))
+
+    def test_capture_sessions__lock_held_per_batch(self):
+        game_sessions = [game_in_progress([4]), game_in_progress([]), GameSession()]
+        lock = MagicMock()
+        with patch('game_server.snapshots.session_lock', lock):
+            fields = capture_sessions(game_sessions, batch=2)
+
+        # Once to copy the list, then once per batch
+        self.assertEqual(3, lock.__enter__.call_count)
+        self.assertEqual(encode_snapshot(game_sessions), pack_snapshot(fields))
+
+    def test_snapshotter__stop_writes_final_snapshot(self):
+        game_sessions = [GameSession()]
+        snapshotter = Snapshotter(self.directory, game_sessions, interval=60, use_fork=False)
+        snapshotter.start()
+        game_sessions.append(game_in_progress([2]))
+        snapshotter.stop()
+
+        self.assertEqual(2, len(load_latest_snapshot(self.directory)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+from game_server.game_session import GameSession
+from game_server.spectators import GameChannel, Broadcaster, SlowConsumer, stream_game, broadcaster
+
+import json
+import unittest
+from unittest.mock import patch
+
+
+class TestGameChannel(unittest.TestCase):
+
+    def setUp(self):
+        self.channel = GameChannel(buffer_size=2)
+
+    def test_read__updates_after_cursor(self):
+        self.channel.publish(b'1')
+        self.channel.publish(b'2')
+
+        self.assertEqual(([b'2'], 2, False), self.channel.read(1))
+
+    def test_read__timeout_without_updates(self):
+
+        self.assertEqual(([], 0, False), self.channel.read(0, timeout=0))
+
+    def test_read__closed(self):
+        self.channel.publish(b'1', close=True)
+
+        self.assertEqual(([b'1'], 1, True), self.channel.read(0))
+
+    def test_read__slow_consumer(self):
+        for payload in (b'1', b'2', b'3'):
+            self.channel.publish(payload)
+
+        with self.assertRaises(SlowConsumer) as e:
+            self.channel.read(0)
+        self.assertEqual('Spectator missed 1 updates', str(e.exception))
+
+
+class TestBroadcaster(unittest.TestCase):
+
+    def setUp(self):
+        self.broadcaster = Broadcaster()
+        self.game_session = GameSession()
+
+    @patch('game_server.spectators.format_event')
+    def test_publish__nobody_watching(self, mock_format_event):
+        self.broadcaster.publish(self.game_session)
+
+        mock_format_event.assert_not_called()
+
+    @patch('game_server.spectators.format_event', return_value=b'update')
+    def test_publish__serialized_once_for_all_spectators(self, mock_format_event):
+        subscriptions = [self.broadcaster.subscribe(self.game_session) for _ in range(100)]
+        self.broadcaster.publish(self.game_session)
+
+        mock_format_event.assert_called_once_with(self.game_session)
+        for channel, cursor in subscriptions:
+            self.assertEqual([b'update'], channel.read(cursor)[0])
+
+    def test_unsubscribe__last_spectator_removes_channel(self):
+        channel, _ = self.broadcaster.subscribe(self.game_session)
+        self.broadcaster.subscribe(self.game_session)
+
+        self.broadcaster.unsubscribe(self.game_session, channel)
+        self.assertIn(self.game_session.game_uuid, self.broadcaster.channels)
+        self.broadcaster.unsubscribe(self.game_session, channel)
+        self.assertNotIn(self.game_session.game_uuid, self.broadcaster.channels)
+
+
+class TestStreamGame(unittest.TestCase):
+
+    def test_stream_game__until_game_over(self):
+        game_session = GameSession()
+        game_session.add_player('Kieran')
+        game_session.add_player('John')
+        channel, cursor = broadcaster.subscribe(game_session)
+        stream = stream_game(game_session, channel, cursor)
+
+        self.assertEqual('READY', json.loads(next(stream).decode()[len('data: '):])['state'])
+        game_session.forfeit_turn()
+        broadcaster.publish(game_session)
+        self.assertEqual('FORFEIT', json.loads(next(stream).decode()[len('data: '):])['state'])
+        self.assertEqual([], list(stream))
+        self.assertNotIn(game_session.game_uuid, broadcaster.channels)
+
+
+if __name__ == '__main__':
+    unittest.main()
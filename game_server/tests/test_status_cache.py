@@ -0,0 +1,119 @@
+from game_server.game_session import GameSession
+from game_server.status_cache import StatusCache
+
+import unittest
+from threading import Event, Lock, Thread
+from unittest.mock import Mock
+
+
+class TestStatusCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = StatusCache()
+        self.game = GameSession()
+        self.game.add_player('Kieran')
+        self.find_session = Mock(return_value=self.game)
+        self.serialize = Mock(side_effect=lambda game_session, encoding: str(game_session.version).encode())
+
+    def get(self):
+        return self.cache.get(self.game.game_id, 'application/json', self.find_session, self.serialize)
+
+    def test_get__cached_until_version_changes(self):
+        self.get()
+        self.assertEqual((self.game, b'(1, 0)'), self.get())
+        self.assertEqual(1, self.serialize.call_count)
+
+        self.game.add_player('John')
+        self.assertEqual((self.game, b'(2, 0)'), self.get())
+        self.assertEqual(2, self.serialize.call_count)
+
+    def test_get__game_id_reassigned(self):
+        self.get()
+        self.game.game_uuid = GameSession().game_uuid
+
+        self.get()
+        self.assertEqual(2, self.find_session.call_count)
+
+    def test_get__game_id_spellings_share_entry(self):
+        self.get()
+        self.cache.get(self.game.game_id.upper(), 'application/json', self.find_session, self.serialize)
+        self.cache.get(self.game.game_id.replace('-', ''), 'application/json', self.find_session, self.serialize)
+
+        self.assertEqual(1, self.serialize.call_count)
+        self.assertEqual(1, len(self.cache.entries))
+
+    def test_get__least_recently_read_evicted(self):
+        self.cache.max_entries = 2
+        games = [GameSession() for _ in range(2)]
+        self.get()
+        for game in games:
+            self.cache.get(game.game_id, 'application/json', Mock(return_value=game), self.serialize)
+        self.get()
+
+        self.assertEqual(2, len(self.cache.entries))
+        self.assertEqual([games[1].game_uuid, self.game.game_uuid], [key[0] for key in self.cache.entries])
+
+    def test_get__invalid_game_id(self):
+        self.find_session.side_effect = Exception('Game session not found')
+
+        with self.assertRaises(Exception):
+            self.cache.get('not-a-game', 'application/json', self.find_session, self.serialize)
+        self.assertEqual({}, self.cache.entries)
+
+    def test_get__encodings_cached_separately(self):
+        self.get()
+        self.cache.get(self.game.game_id, 'application/x-connect5', self.find_session, self.serialize)
+
+        self.assertEqual(2, self.serialize.call_count)
+
+    def test_get__error_not_cached(self):
+        self.find_session.side_effect = Exception('Game session not found')
+
+        for _ in range(2):
+            with self.assertRaises(Exception):
+                self.get()
+        self.assertEqual(2, self.find_session.call_count)
+        self.assertEqual({}, self.cache.flights)
+
+    def test_get__serialized_under_session_lock(self):
+        session_lock = Lock()
+        self.cache = StatusCache(session_lock=session_lock)
+        results = []
+
+        with session_lock:
+            reader = Thread(target=lambda: results.append(self.get()))
+            reader.start()
+            reader.join(0.05)
+            self.assertEqual(0, self.serialize.call_count)
+            # The move finishes before the status is read
+            self.game.add_player('John')
+        reader.join()
+
+        self.assertEqual([(self.game, b'(2, 0)')], results)
+        self.assertEqual((2, 0), self.cache.entries[(self.game.game_uuid, 'application/json')][1])
+
+    def test_get__concurrent_requests_coalesced(self):
+        serializing, release = Event(), Event()
+
+        def slow_serialize(game_session, encoding):
+            serializing.set()
+            release.wait(5)
+            return b'status'
+        self.serialize.side_effect = slow_serialize
+
+        results = []
+        leader = Thread(target=lambda: results.append(self.get()))
+        leader.start()
+        serializing.wait(5)
+        followers = [Thread(target=lambda: results.append(self.get())) for _ in range(3)]
+        for follower in followers:
+            follower.start()
+            follower.join(0.01)
+        # Followers wait for the leader instead of serializing themselves
+        self.assertEqual([], results)
+        release.set()
+        for thread in [leader] + followers:
+            thread.join()
+
+        self.assertEqual([(self.game, b'status')] * 4, results)
+        self.assertEqual(1, self.serialize.call_count)
@@ -0,0 +1,64 @@
+from game_server.timing_wheel import TimingWheel
+
+import unittest
+from unittest.mock import patch
+
+
+class TestTimingWheel(unittest.TestCase):
+
+    def setUp(self):
+        self.wheel = TimingWheel(start=0, tick_duration=1, wheel_size=4, levels=3)
+
+    def test_advance__expires_due_timers(self):
+        self.wheel.schedule(2, 'a')
+        self.wheel.schedule(3, 'b')
+
+        self.assertEqual([], self.wheel.advance(1))
+        self.assertEqual(['a'], self.wheel.advance(2))
+        self.assertEqual(['b'], self.wheel.advance(3))
+
+    def test_advance__cascades_far_timers(self):
+        deadlines = [5, 17, 40, 63, 100]
+        for deadline in deadlines:
+            self.wheel.schedule(deadline, deadline)
+
+        expired_at = {}
+        for now in range(1, 120):
+            for payload in self.wheel.advance(now):
+                expired_at[payload] = now
+        self.assertEqual({deadline: deadline for deadline in deadlines}, expired_at)
+
+    def test_advance__large_jump(self):
+        self.wheel.schedule(10, 'a')
+        self.wheel.schedule(70, 'b')
+
+        self.assertEqual(['a'], self.wheel.advance(50))
+        self.assertEqual(['b'], self.wheel.advance(200))
+
+    def test_advance__idle_jumps_to_now(self):
+        self.wheel.schedule(2, 'a')
+        self.wheel.advance(3)
+
+        with patch.object(self.wheel, '_cascade') as mock_cascade:
+            self.assertEqual([], self.wheel.advance(10 ** 9))
+        mock_cascade.assert_not_called()
+        self.assertEqual(10 ** 9, self.wheel.current_tick)
+        self.wheel.schedule(10 ** 9 + 2, 'b')
+        self.assertEqual(['b'], self.wheel.advance(10 ** 9 + 2))
+
+    def test_cancel__timer_not_expired(self):
+        timer = self.wheel.schedule(2, 'a')
+        self.wheel.cancel(timer)
+
+        self.assertFalse(timer.active)
+        self.assertEqual([], self.wheel.advance(10))
+
+    def test_schedule__past_deadline_expires_next_tick(self):
+        self.wheel.advance(5)
+        self.wheel.schedule(1, 'a')
+
+        self.assertEqual(['a'], self.wheel.advance(6))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+from game_server.game_session import GameSession
+from game_server.turn_deadlines import TurnDeadlines
+
+import unittest
+from unittest.mock import MagicMock, Mock, patch
+
+
+class TestTurnDeadlines(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Mock(return_value=0)
+        self.turn_deadlines = TurnDeadlines(turn_timeout=60, clock=self.clock)
+        self.game_session = GameSession()
+        self.game_session.add_player('Kieran')
+        self.game_session.add_player('John')
+
+    def test_expire__turn_missed(self):
+        self.turn_deadlines.start_turn(self.game_session)
+        self.clock.return_value = 61
+
+        self.assertEqual([self.game_session], self.turn_deadlines.expire())
+        self.assertEqual('FORFEIT', self.game_session.state)
+        self.assertEqual(self.game_session.player_2.player_id, self.game_session.winner)
+
+    def test_expire__turn_taken_in_time(self):
+        self.turn_deadlines.start_turn(self.game_session)
+        self.clock.return_value = 50
+        self.game_session.board.drop_disc(0, 'X')
+        self.turn_deadlines.start_turn(self.game_session)
+        self.clock.return_value = 100
+
+        self.assertEqual([], self.turn_deadlines.expire())
+        self.assertEqual('READY', self.game_session.state)
+
+        self.clock.return_value = 111
+        self.turn_deadlines.expire()
+        self.assertEqual(self.game_session.player_1.player_id, self.game_session.winner)
+
+    def test_expire__disc_dropped_before_forfeit(self):
+        self.turn_deadlines.start_turn(self.game_session)
+        self.clock.return_value = 61
+
+        def drop_disc():
+            # A drop_disc request that held session_lock while the deadline expired
+            self.game_session.board.drop_disc(0, 'X')
+            self.turn_deadlines.start_turn(self.game_session)
+
+        session_lock = MagicMock()
+        session_lock.__enter__.side_effect = drop_disc
+        with patch('game_server.turn_deadlines.session_lock', session_lock):
+            self.assertEqual([], self.turn_deadlines.expire())
+        self.assertEqual('READY', self.game_session.state)
+
+    def test_start_turn__game_over_cancels_deadline(self):
+        self.turn_deadlines.start_turn(self.game_session)
+        self.game_session.state = 'WINNER'
+        self.turn_deadlines.start_turn(self.game_session)
+        self.clock.return_value = 100
+
+        self.assertEqual([], self.turn_deadlines.expire())
+        self.assertIsNone(self.game_session.turn_timer)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+from game_server.game_session import Board
+from game_server.vector_env import VectorEnv
+
+import numpy as np
+import unittest
+
+
+class TestVectorEnv(unittest.TestCase):
+
+    def setUp(self):
+        self.env = VectorEnv(3)
+
+    def test_init__board_too_large(self):
+        with self.assertRaises(Exception) as e:
+            VectorEnv(1, columns=10, rows=6)
+        self.assertEqual('Invalid board size: 10x6. Vectorized boards must fit in 64 bits', str(e.exception))
+
+    def test_reset(self):
+        self.env.step([0, 1, 2])
+
+        boards = self.env.reset()
+        self.assertEqual((3, 6, 9), boards.shape)
+        self.assertFalse(boards.any())
+        self.assertTrue(self.env.legal_moves().all())
+
+    def test_step__boards(self):
+        self.env.step([0, 0, 8])
+        boards, rewards, dones = self.env.step([0, 1, 8])
+
+        self.assertEqual([1, 2], boards[0, :2, 0].tolist())
+        self.assertEqual([1, 2], boards[1, 0, :2].tolist())
+        self.assertEqual([0, 0, 0], rewards.tolist())
+        self.assertEqual([False] * 3, dones.tolist())
+
+    def test_step__vertical_win(self):
+        for _ in range(4):
+            self.env.step([0, 0, 0])
+            self.env.step([1, 1, 1])
+
+        _, rewards, dones = self.env.step([0, 2, 0])
+        self.assertEqual([1, 0, 1], rewards.tolist())
+        self.assertEqual([True, False, True], dones.tolist())
+
+    def test_step__full_column(self):
+        for _ in range(6):
+            self.env.step([0, 1, 2])
+        self.assertEqual([False] + [True] * 8, self.env.legal_moves()[0].tolist())
+
+        _, rewards, dones = self.env.step([0, 9, -1])
+        self.assertEqual([-1] * 3, rewards.tolist())
+        self.assertTrue(dones.all())
+
+    def test_step__resets_finished_games(self):
+        self.env.step([9, 0, 0])
+
+        boards, _, _ = self.env.step([4, 0, 0])
+        self.assertEqual(1, boards[0, 0, 4])
+        self.assertEqual(1, self.env.turns[0])
+
+    def test_step__matches_board(self):
+        columns, rows, win_length = 7, 6, 4
+        env = VectorEnv(100, columns, rows, win_length)
+        boards = [Board(('X', 'O'), columns, rows, win_length) for _ in range(100)]
+        random = np.random.default_rng(0)
+
+        for _ in range(columns * rows):
+            for index in np.flatnonzero(env.dones):
+                boards[index] = Board(('X', 'O'), columns, rows, win_length)
+            moves = np.argmax(random.random((100, columns)) * env.legal_moves(), axis=1)
+            observations, rewards, dones = env.step(moves)
+
+            for index, board in enumerate(boards):
+                board.drop_disc(int(moves[index]), 'X' if board.turns % 2 == 0 else 'O')
+                self.assertEqual(bool(board.check_for_winner()), rewards[index] == 1)
+                expected = [[' XO'.index(board.get_disc(col, row).replace(Board.EMPTY, ' ')) for col in range(columns)]
+                            for row in range(rows)]
+                self.assertEqual(expected, observations[index].tolist())
@@ -0,0 +1,68 @@
+from common.wire import DISCS, STATES, decode_game_state, encode_drop_request, decode_drop_request, render_board
+from game_server.game_session import GameSession
+from game_server.wire import encode_game_state
+
+import unittest
+
+
+class TestWire(unittest.TestCase):
+
+    def setUp(self):
+        self.game_session = GameSession()
+        self.game_session.add_player('Kieran')
+        self.game_session.add_player('John')
+        self.game_session.board.drop_disc(4, 'X')
+        self.game_session.board.drop_disc(4, 'O')
+
+    def test_game_state__round_trip(self):
+        details = self.game_session.game_details()
+
+        decoded = decode_game_state(encode_game_state(self.game_session))
+        for key in ('game_id', 'state', 'player_turn', 'winner', 'columns', 'rows', 'win_length'):
+            self.assertEqual(details[key], decoded[key])
+        self.assertEqual(self.game_session.board.masks, decoded['masks'])
+        self.assertEqual(2, decoded['turns'])
+
+    def test_render_board__matches_board(self):
+        decoded = decode_game_state(encode_game_state(self.game_session))
+
+        self.assertEqual(self.game_session.game_details()['game_board'],
+                         render_board(decoded['masks'], decoded['columns'], decoded['rows']))
+
+    def test_codec_matches_server(self):
+        # The codec keeps its own copy so the client does not import the server
+
+        self.assertEqual((GameSession.WAITING, GameSession.READY, GameSession.WINNER, GameSession.FORFEIT), STATES)
+        self.assertEqual(GameSession.DISCS, DISCS)
+
+    def test_game_state__waiting_for_players(self):
+
+        decoded = decode_game_state(encode_game_state(GameSession()))
+        self.assertEqual('WAITING FOR PLAYERS', decoded['state'])
+        self.assertIsNone(decoded['player_turn'])
+
+    def test_game_state__smaller_than_json(self):
+
+        self.assertLess(len(encode_game_state(self.game_session)), len(str(self.game_session.game_details())) / 5)
+
+    def test_decode_game_state__unsupported(self):
+
+        with self.assertRaises(Exception) as e:
+            decode_game_state(b'{"state": "READY"}')
+        self.assertEqual('Unsupported game state encoding', str(e.exception))
+
+    def test_drop_request__round_trip(self):
+        game_id, player_id = self.game_session.game_id, self.game_session.player_1.player_id
+
+        self.assertEqual({'game_id': game_id, 'player_id': player_id, 'column': 3, 'disc': 'X'},
+                         decode_drop_request(encode_drop_request(game_id, player_id, 3, 'X')))
+
+    def test_decode_drop_request__unsupported(self):
+
+        with self.assertRaises(Exception) as e:
+            decode_drop_request(b'\x01')
+        self.assertEqual('Unsupported drop_disc encoding', str(e.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+"""
+Hierarchical timing wheel.
+Scheduling and cancelling a timer are O(1). Advancing the wheel costs O(1) per elapsed tick plus the expired timers,
+and nothing for ticks after the last pending timer; timers further out than one wheel revolution sit on a coarser
+level and are cascaded down as their time approaches.
+"""
+from math import ceil
+
+
+class Timer:
+
+    __slots__ = ('deadline', 'tick', 'payload', 'bucket')
+
+    def __init__(self, deadline, tick, payload):
+        self.deadline = deadline
+        self.tick = tick
+        self.payload = payload
+        self.bucket = None
+
+    @property
+    def active(self):
+        """
+        Timer is scheduled and has not expired or been cancelled
+        :rtype: bool
+        """
+
+        return self.bucket is not None
+
+
+class TimingWheel:
+
+    def __init__(self, start, tick_duration=1.0, wheel_size=64, levels=4):
+        """
+        :param start: Time of tick 0, e.g. time.monotonic()
+        :param tick_duration: Seconds per tick of the finest level, the resolution of the wheel
+        :param wheel_size: Buckets per level
+        :param levels: Number of levels. Timers beyond wheel_size ** levels ticks wait on the last level.
+        """
+        self.start = start
+        self.tick_duration = tick_duration
+        self.wheel_size = wheel_size
+        self.levels = [[set() for _ in range(wheel_size)] for _ in range(levels)]
+        self.current_tick = 0
+        # Scheduled timers that have not expired or been cancelled
+        self.pending = 0
+
+    def schedule(self, deadline, payload):
+        """
+        Schedule a timer
+
+        :param deadline: Time at which the timer expires, same clock as start
+        :param payload: Object returned by advance when the timer expires
+        :return: Timer that can be cancelled
+        :rtype: Timer
+        """
+
+        tick = max(self.current_tick + 1, ceil((deadline - self.start) / self.tick_duration))
+        timer = Timer(deadline, tick, payload)
+        self._insert(timer)
+        self.pending += 1
+        return timer
+
+    def cancel(self, timer):
+        """
+        Cancel a scheduled timer. Cancelling an expired or cancelled timer does nothing.
+        """
+
+        if timer.bucket is not None:
+            timer.bucket.discard(timer)
+            timer.bucket = None
+            self.pending -= 1
+
+    def advance(self, now):
+        """
+        Advance the wheel to now
+
+        :param now: Current time, same clock as start
+        :return: Payloads of the expired timers
+        :rtype: list
+        """
+
+        target_tick = int((now - self.start) // self.tick_duration)
+        expired = []
+
+        while self.current_tick < target_tick:
+            if not self.pending:
+                # Every bucket is empty, the ticks in between have nothing to expire or cascade
+                self.current_tick = target_tick
+                break
+            self.current_tick += 1
+            self._cascade()
+
+            bucket = self.levels[0][self.current_tick % self.wheel_size]
+            for timer in bucket:
+                timer.bucket = None
+                expired.append(timer.payload)
+            self.pending -= len(bucket)
+            bucket.clear()
+
+        return expired
+
+    def _insert(self, timer):
+        """Put timer in the finest level bucket that covers its tick"""
+        remaining = timer.tick - self.current_tick
+        span = 1
+
+        for level_number, level in enumerate(self.levels):
+            if remaining < span * self.wheel_size or level_number == len(self.levels) - 1:
+                bucket = level[(timer.tick // span) % self.wheel_size]
+                bucket.add(timer)
+                timer.bucket = bucket
+                return
+            span *= self.wheel_size
+
+    def _cascade(self):
+        """Move timers of the coarser buckets that are now within range of a finer level"""
+        span = self.wheel_size
+
+        for level in self.levels[1:]:
+            if self.current_tick % span:
+                return
+            bucket = level[(self.current_tick // span) % self.wheel_size]
+            timers = list(bucket)
+            bucket.clear()
+            for timer in timers:
+                self._insert(timer)
+            span *= self.wheel_size
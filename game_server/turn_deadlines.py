@@ -0,0 +1,67 @@
+"""
+Server side turn deadlines. A player who does not drop a disc within TURN_TIMEOUT seconds forfeits the game.
+Deadlines live in a timing wheel so starting a turn and expiring deadlines is O(1) per game, however many are active.
+"""
+from threading import Lock
+from time import monotonic
+
+from .game_session import session_lock
+from .logs import log_event
+from .metrics import FORFEITS
+from .timing_wheel import TimingWheel
+
+TURN_TIMEOUT = 60
+
+
+class TurnDeadlines:
+
+    def __init__(self, turn_timeout=TURN_TIMEOUT, clock=monotonic):
+        self.turn_timeout = turn_timeout
+        self.clock = clock
+        self.wheel = TimingWheel(clock())
+        self._lock = Lock()
+
+    def start_turn(self, game_session):
+        """
+        Restart the deadline of game_session for the player whose turn it is.
+        Games that are over have their deadline cancelled.
+
+        :param game_session: Game session that just started or had a disc dropped
+        :type game_session: game_server.game_session.GameSession
+        """
+
+        with self._lock:
+            if game_session.turn_timer:
+                self.wheel.cancel(game_session.turn_timer)
+                game_session.turn_timer = None
+            if game_session.state == game_session.READY:
+                game_session.turn_timer = self.wheel.schedule(self.clock() + self.turn_timeout, game_session)
+
+    def expire(self):
+        """
+        Forfeit every game whose turn deadline has passed. A game where a disc was dropped after its deadline passed
+        but before the forfeit has a new turn timer and is not forfeited.
+
+        :return: Forfeited game sessions
+        :rtype: list
+        """
+
+        with self._lock:
+            expired = self.wheel.advance(self.clock())
+            for game_session in expired:
+                game_session.turn_timer = None
+
+        forfeited = []
+        for game_session in expired:
+            # start_turn is called with session_lock held, so take it after releasing the wheel lock
+            with session_lock:
+                if game_session.turn_timer is not None or game_session.state != game_session.READY:
+                    continue
+                game_session.forfeit_turn()
+            forfeited.append(game_session)
+            FORFEITS.inc()
+            log_event('turn_forfeited', game_id=game_session.game_id, player_id=game_session.winner)
+        return forfeited
+
+
+turn_deadlines = TurnDeadlines()
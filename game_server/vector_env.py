@@ -0,0 +1,138 @@
+"""
+Headless batch of Connect 5 games for simulation and training. Does not depend on Flask.
+
+All games are stepped together with numpy. Each game is stored as one uint64 bitboard per player with a padding row
+above every column: cell (col, row) is bit col * (rows + 1) + row. The padding bit is never set, so shifting a
+bitboard never carries a line over from one column into the next and the win check is a few shifts and ands per
+direction for the whole batch.
+"""
+import numpy as np
+
+from .game_session import Board, validate_board_config
+
+ONE = np.uint64(1)
+
+
+class VectorEnv:
+
+    def __init__(self, num_envs, columns=Board.COLUMNS, rows=Board.ROWS, win_length=Board.WIN_LENGTH):
+        """
+        :param num_envs: Number of games stepped together
+        :raises Exception: If the board does not fit in 64 bits with its padding row
+        """
+
+        validate_board_config(columns, rows, win_length)
+        if columns * (rows + 1) > 64:
+            raise Exception(f'Invalid board size: {columns}x{rows}. Vectorized boards must fit in 64 bits')
+
+        self.num_envs = num_envs
+        self.columns = columns
+        self.rows = rows
+        self.win_length = win_length
+
+        height = rows + 1
+        # Bit shift between neighbouring cells: vertical, horizontal and both diagonals. A line whose cells are more than
+        # 64 bits apart cannot fit on the board and shifting that far is undefined.
+        self.shifts = [np.uint64(shift) for shift in (1, height, height + 1, height - 1)
+                       if shift * (win_length - 1) < 64]
+        # bit_positions[row, col] is the bit of the cell, row 0 at the bottom
+        self.bit_positions = np.arange(columns) * height + np.arange(rows)[:, None]
+        self._envs = np.arange(num_envs)
+
+        self.masks = np.zeros((num_envs, 2), dtype=np.uint64)
+        self.heights = np.zeros((num_envs, columns), dtype=np.uint8)
+        self.turns = np.zeros(num_envs, dtype=np.int16)
+        self.dones = np.zeros(num_envs, dtype=bool)
+
+    def reset(self, envs=None):
+        """
+        Start new games
+
+        :param envs: Boolean mask of the games to reset, all games if None
+        :return: Boards of all games
+        :rtype: numpy.ndarray
+        """
+
+        if envs is None:
+            envs = slice(None)
+        self.masks[envs] = 0
+        self.heights[envs] = 0
+        self.turns[envs] = 0
+        self.dones[envs] = False
+        return self.boards()
+
+    @property
+    def players(self):
+        """
+        Player to move in each game, 0 for player 1 and 1 for player 2. Player 1 moves first.
+        :rtype: numpy.ndarray
+        """
+
+        return self.turns & 1
+
+    def legal_moves(self):
+        """
+        :return: Boolean (num_envs, columns) array of the columns that are not full
+        :rtype: numpy.ndarray
+        """
+
+        return self.heights < self.rows
+
+    def step(self, columns):
+        """
+        Drop a disc for the player to move in every game. Games that finished on the previous step are reset first.
+
+        Rewards are for the player that moved: 1 for a win, -1 for a move into a full or invalid column (which ends the
+        game) and 0 otherwise. A game also ends when the board is full.
+
+        :param columns: Column per game, 0 based
+        :return: (boards, rewards, dones)
+        :rtype: tuple
+        """
+
+        if self.dones.any():
+            self.reset(self.dones)
+
+        columns = np.asarray(columns)
+        envs, players = self._envs, self.players
+        legal = (columns >= 0) & (columns < self.columns)
+        columns = np.where(legal, columns, 0)
+        heights = self.heights[envs, columns]
+        legal &= heights < self.rows
+
+        bits = columns.astype(np.uint64) * np.uint64(self.rows + 1) + heights
+        moved = self.masks[envs, players] | np.where(legal, ONE << bits, np.uint64(0))
+        self.masks[envs, players] = moved
+        self.heights[envs, columns] += legal
+        self.turns += 1
+
+        won = self.connected(moved)
+        rewards = np.where(legal, won, -1).astype(np.float32)
+        self.dones = ~legal | won | (self.turns == self.columns * self.rows)
+        return self.boards(), rewards, self.dones.copy()
+
+    def connected(self, masks):
+        """
+        :param masks: Bitboard per game
+        :return: Boolean array of the bitboards holding win_length discs in a line
+        :rtype: numpy.ndarray
+        """
+
+        won = np.zeros(len(masks), dtype=bool)
+        for shift in self.shifts:
+            line = masks
+            for length in range(1, self.win_length):
+                line = line & (masks >> (shift * np.uint64(length)))
+            won |= line != 0
+        return won
+
+    def boards(self):
+        """
+        :return: int8 (num_envs, rows, columns) array, 0 for empty, 1 and 2 for the players' discs, row 0 at the bottom
+        :rtype: numpy.ndarray
+        """
+
+        masks = self.masks.astype('<u8', copy=False).view(np.uint8).reshape(self.num_envs, 2, 8)
+        bits = np.unpackbits(masks, axis=2, bitorder='little').view(np.int8)
+        cells = bits[:, 0] + 2 * bits[:, 1]
+        return cells[:, self.bit_positions]
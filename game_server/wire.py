@@ -0,0 +1,20 @@
+"""
+Server side of the binary encoding. The codec itself is in common/wire.py so the client can run without the server.
+"""
+from common.wire import MIMETYPE, STATES, decode_drop_request, decode_id, encode_id, pack_game_state
+
+
+def encode_game_state(game_session):
+    """
+    Pack game state.
+
+    :param game_session: Game session to encode
+    :type game_session: game_server.game_session.GameSession
+    :return: Packed game state
+    :rtype: bytes
+    """
+
+    board = game_session.board
+    player_turn = None if game_session.waiting_for_players else game_session.next_player_turn()
+    return pack_game_state(board.turns, game_session.state, board.columns, board.rows, board.win_length,
+                           game_session.game_uuid, player_turn, game_session.winner, board.masks)